@@ -0,0 +1,269 @@
+"""Microbenchmarks for the per-event parser and adapter hot paths.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_hot_paths.py                  # compare against baseline.json
+    PYTHONPATH=. python benchmarks/bench_hot_paths.py --save-baseline  # record a new baseline
+    PYTHONPATH=. python benchmarks/bench_hot_paths.py -k extract       # only matching benchmarks
+
+Times are normalized by a pure-Python calibration loop so a baseline
+recorded on one machine is usable on another. The run fails (exit code 1)
+when a benchmark is slower or allocates more than `--threshold` times its
+baseline, or when a scaling check shows worse than linear growth per call.
+A slowdown only counts if it holds over repeated timings and adds at least
+MIN_REGRESSION_NS per call, so microsecond-scale cases don't fail on noise.
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import timeit
+import tracemalloc
+
+from bharatgen_openai.adapters.gradio_adapter import estimate_tokens, format_messages_for_gradio
+from bharatgen_openai.backends import OpenAICompatibleBackend
+from bharatgen_openai.parser import GradioHTMLParser, GradioResponseParser
+from bharatgen_openai.sse import SSEDecoder
+
+from fixtures import (
+    INDIC_ANSWER,
+    LONG_ANSWER,
+    LONG_THINKING,
+    SHORT_ANSWER,
+    FakeResponse,
+    conversation,
+    cumulative_stream,
+    gradio_data,
+    openai_stream,
+    paragraphs,
+    queue_diff_messages,
+    queue_job,
+    render_html,
+    repeat_to,
+    sse_line,
+)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# Per-call growth when the input grows SCALING_FACTOR times. Linear work gives
+# an exponent of ~1; quadratic work gives ~2.
+SCALING_FACTOR = 4
+MAX_SCALING_EXPONENT = 1.5
+
+# A slower result is timed this many more times; the best run is compared
+CONFIRM_RUNS = 3
+# Slowdowns smaller than this (per call, in baseline-machine time) are noise
+MIN_REGRESSION_NS = 1000
+
+
+def html_parse(html: str):
+    parser = GradioHTMLParser()
+    parser.feed(html)
+    return parser.get_text()
+
+
+def sse_decode(body: bytes, chunk_size: int):
+    decoder = SSEDecoder()
+    events = []
+    for i in range(0, len(body), chunk_size):
+        events += decoder.feed(body[i:i + chunk_size])
+    return events
+
+
+def build_benchmarks() -> dict:
+    """Build the benchmark table: name -> zero-argument callable."""
+    parser = GradioResponseParser()
+    backend = OpenAICompatibleBackend("http://localhost:8000/v1", "bharatgen-param-17b")
+
+    short_html = render_html(SHORT_ANSWER)
+    long_html = render_html(LONG_ANSWER, LONG_THINKING, debug=True, latency=True)
+    indic_html = render_html(INDIC_ANSWER, LONG_THINKING)
+    snapshot_8k = gradio_data(render_html(repeat_to(LONG_ANSWER, 8192), LONG_THINKING))
+    short_line = sse_line(short_html)
+    snapshot_line = "data: " + json.dumps(snapshot_8k)
+    long_stream = cumulative_stream(LONG_ANSWER, LONG_THINKING)
+    indic_stream = cumulative_stream(INDIC_ANSWER, LONG_THINKING)
+    indic_body = FakeResponse(indic_stream).body
+    long_diffs = queue_diff_messages(LONG_ANSWER, LONG_THINKING)
+    long_openai = openai_stream(LONG_ANSWER)
+    short_chat = conversation(1)
+    long_chat = conversation(40)
+
+    return {
+        "html_parser/short": lambda: html_parse(short_html),
+        "html_parser/long_thought_debug": lambda: html_parse(long_html),
+        "html_parser/indic": lambda: html_parse(indic_html),
+        "extract_content/short": lambda: parser.extract_content(gradio_data(short_html)),
+        "extract_content/indic": lambda: parser.extract_content(gradio_data(indic_html)),
+        "extract_content/snapshot_8k": lambda: parser.extract_content(snapshot_8k),
+        "parse_sse_line/short": lambda: parser.parse_sse_line(short_line),
+        "parse_sse_line/snapshot_8k": lambda: parser.parse_sse_line(snapshot_line),
+        "parse_sse_line/event": lambda: parser.parse_sse_line("event: generating"),
+        "sse_decoder/indic_1400b_reads": lambda: sse_decode(indic_body, 1400),
+        "sse_decoder/indic_64k_reads": lambda: sse_decode(indic_body, 65536),
+        "stream/long_cumulative": lambda: list(
+            parser.parse_streaming_response(FakeResponse(long_stream))
+        ),
+        "stream/indic_cumulative": lambda: list(
+            parser.parse_streaming_response(FakeResponse(indic_stream))
+        ),
+        "stream/long_queue_diffs": lambda: list(
+            parser.parse_streaming_response(queue_job(long_diffs))
+        ),
+        "stream/long_openai_deltas": lambda: list(
+            backend._iter_deltas(FakeResponse(long_openai), {})
+        ),
+        "complete/long_cumulative": lambda: parser.parse_complete_response(
+            FakeResponse(long_stream)
+        ),
+        "format_messages/short_chat": lambda: format_messages_for_gradio(short_chat),
+        "format_messages/long_chat": lambda: format_messages_for_gradio(long_chat),
+        "estimate_tokens/short": lambda: estimate_tokens(SHORT_ANSWER),
+        "estimate_tokens/long": lambda: estimate_tokens(LONG_ANSWER),
+    }
+
+
+def build_scaling_checks() -> dict:
+    """Build per-call scaling checks: name -> function of input size."""
+    parser = GradioResponseParser()
+
+    def snapshot(size):
+        return gradio_data(render_html(paragraphs(repeat_to(LONG_ANSWER, size)), LONG_THINKING[:size // 4]))
+
+    return {
+        "html_parser": lambda size: (
+            lambda html=render_html(paragraphs(repeat_to(INDIC_ANSWER, size))): html_parse(html)
+        ),
+        "extract_content": lambda size: (lambda data=snapshot(size): parser.extract_content(data)),
+        "parse_sse_line": lambda size: (
+            lambda line="data: " + json.dumps(snapshot(size)): parser.parse_sse_line(line)
+        ),
+        "sse_decoder": lambda size: (
+            lambda body=FakeResponse([sse_line(paragraphs(repeat_to(INDIC_ANSWER, size)))]).body: sse_decode(body, 1400)
+        ),
+        "format_messages": lambda size: (
+            lambda messages=conversation(size // 256): format_messages_for_gradio(messages)
+        ),
+    }
+
+
+def time_per_call(fn, repeat: int = 15) -> float:
+    """Best-of-`repeat` time per call in nanoseconds.
+
+    Many short runs (~50 ms each) make the minimum robust to noisy neighbours.
+    """
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    number = max(1, number // 4)
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def peak_bytes_per_call(fn) -> int:
+    """Peak memory allocated during a single call."""
+    fn()  # Warm caches so one-time allocations don't count
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before, _ = tracemalloc.get_traced_memory()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return max(0, peak - before)
+
+
+def calibrate() -> float:
+    """Time a fixed pure-Python workload used to normalize results."""
+    def work():
+        total = 0
+        for i in range(1000):
+            total += i * i
+        return "".join(str(total) for _ in range(20))
+    return time_per_call(work)
+
+
+def format_ns(ns: float) -> str:
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} us"
+    return f"{ns:.0f} ns"
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("--save-baseline", action="store_true", help="Write results to baseline.json")
+    arg_parser.add_argument("--baseline", default=BASELINE_PATH, help="Baseline file path")
+    arg_parser.add_argument("--threshold", type=float, default=1.5, help="Max allowed ratio vs baseline")
+    arg_parser.add_argument("-k", dest="keyword", default="", help="Only run benchmarks containing this")
+    args = arg_parser.parse_args()
+    if args.save_baseline and args.keyword:
+        arg_parser.error("--save-baseline records every benchmark; don't combine it with -k")
+
+    calibration = calibrate()
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    base_calibration = baseline.get("calibration_ns", calibration)
+    speed = calibration / base_calibration
+
+    failures = []
+    results = {}
+    print(f"calibration: {format_ns(calibration)} (x{speed:.2f} vs baseline machine)")
+    print(f"{'benchmark':<34} {'time/call':>12} {'peak alloc':>12} {'vs baseline':>12}")
+
+    for name, fn in build_benchmarks().items():
+        if args.keyword not in name:
+            continue
+        ns = time_per_call(fn)
+        base = baseline.get("benchmarks", {}).get(name)
+        if base:
+            expected = base["ns_per_call"] * speed
+            for _ in range(CONFIRM_RUNS):
+                if ns <= expected * args.threshold:
+                    break
+                ns = min(ns, time_per_call(fn))
+        peak = peak_bytes_per_call(fn)
+        results[name] = {"ns_per_call": round(ns, 1), "peak_bytes": peak}
+
+        ratio_text = "-"
+        if base:
+            ratio = ns / expected
+            ratio_text = f"x{ratio:.2f}"
+            if ratio > args.threshold and (ns - expected) / speed > MIN_REGRESSION_NS:
+                failures.append(f"{name}: {ratio:.2f}x slower than baseline")
+            if peak > max(base["peak_bytes"] * args.threshold, base["peak_bytes"] + 4096):
+                failures.append(f"{name}: peak allocation {peak} B vs baseline {base['peak_bytes']} B")
+        print(f"{name:<34} {format_ns(ns):>12} {peak / 1024:>9.1f} KiB {ratio_text:>12}")
+
+    print(f"\n{'scaling check':<34} {'small':>12} {'large':>12} {'exponent':>12}")
+    for name, make in build_scaling_checks().items():
+        if args.keyword not in name:
+            continue
+        small = time_per_call(make(2048))
+        large = time_per_call(make(2048 * SCALING_FACTOR))
+        exponent = math.log(large / small) / math.log(SCALING_FACTOR)
+        print(f"{name:<34} {format_ns(small):>12} {format_ns(large):>12} {exponent:>12.2f}")
+        if exponent > MAX_SCALING_EXPONENT:
+            failures.append(f"{name}: per-call cost grows as n^{exponent:.2f}")
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"calibration_ns": round(calibration, 1), "benchmarks": results}, f, indent=2)
+            f.write("\n")
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if failures:
+        print("\nRegressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
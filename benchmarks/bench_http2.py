@@ -0,0 +1,229 @@
+"""Connection count and tail latency of many parallel streams, HTTP/1.1 vs h2c.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_http2.py                        # 128 parallel streams, both modes
+    PYTHONPATH=. python benchmarks/bench_http2.py -c 256 -n 1024         # more streams
+    PYTHONPATH=. python benchmarks/bench_http2.py --modes http1          # one mode only
+
+Starts a fake OpenAI-compatible upstream that streams a fixed answer, then
+the API server once per mode (uvicorn for ``http1``, Hypercorn with
+``BHARATGEN_HTTP=h2`` for ``h2c``). A batch client keeps ``-c`` streams
+open at a time; HTTP/1.1 needs a connection per open stream, h2c
+multiplexes them over one. Reports TCP connections opened, time to first
+chunk and stream duration percentiles. The h2c mode needs the
+``hypercorn`` and ``h2`` packages and is skipped without them.
+"""
+
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+MODEL = "bench-model"
+API_KEY = "sk-bench"
+
+
+class FakeUpstreamHandler(BaseHTTPRequestHandler):
+    """Streams ``chunks`` deltas ``delay`` seconds apart for every completion."""
+
+    protocol_version = "HTTP/1.1"
+    chunks = 32
+    delay = 0.01
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        # Health probes and model listings
+        body = json.dumps({"object": "list", "data": [{"id": MODEL, "object": "model"}]}).encode()
+        self.send_response(200)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        self.end_headers()
+        for i in range(self.chunks):
+            delta = {"content": f" token{i}"} if i else {"role": "assistant", "content": ""}
+            event = {"id": "cmpl-bench", "choices": [{"index": 0, "delta": delta, "finish_reason": None}]}
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+            self.wfile.flush()
+            time.sleep(self.delay)
+        event = {"id": "cmpl-bench", "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode())
+        self.wfile.flush()
+
+
+class FakeUpstream(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024  # Parallel streams would overflow the default backlog of 5
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(mode: str, upstream: str, concurrency: int) -> tuple:
+    """Start the API server in a subprocess and wait until it answers."""
+    port = free_port()
+    env = dict(
+        os.environ,
+        BHARATGEN_HTTP="h2" if mode == "h2c" else "http1",
+        BHARATGEN_HOST="127.0.0.1",
+        BHARATGEN_PORT=str(port),
+        BHARATGEN_BACKEND="openai",
+        BHARATGEN_BASE_URL=upstream,
+        BHARATGEN_MODEL_NAME=MODEL,
+        BHARATGEN_API_KEYS=API_KEY,
+        BHARATGEN_USAGE_DB=":memory:",
+        BHARATGEN_ADAPTIVE_LIMIT="false",
+        BHARATGEN_POOL_SIZE=str(concurrency),
+        BHARATGEN_MAX_QUEUE=str(concurrency * 4),
+        BHARATGEN_H2_MAX_STREAMS=str(concurrency),
+        BHARATGEN_RATE_LIMIT_RPS="0",
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "bharatgen_openai.server"],
+        cwd=root,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/health", timeout=1)
+            return server, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError(f"{mode} server didn't start")
+
+
+async def run_load(mode: str, url: str, concurrency: int, requests: int) -> dict:
+    """Send ``requests`` streamed completions, ``concurrency`` at a time."""
+    connections = 0
+    first_chunk, durations, failures = [], [], 0
+
+    async def trace(event: str, info: dict):
+        nonlocal connections
+        if event == "connection.connect_tcp.complete":
+            connections += 1
+
+    body = {"model": MODEL, "messages": [{"role": "user", "content": "hi"}], "stream": True}
+    headers = {"Authorization": f"Bearer {API_KEY}"}
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    pending = iter(range(requests))
+
+    async with httpx.AsyncClient(
+        http1=mode == "http1", http2=mode == "h2c", limits=limits, timeout=120
+    ) as client:
+
+        async def worker():
+            nonlocal failures
+            for _ in pending:
+                start = time.perf_counter()
+                first = None
+                try:
+                    async with client.stream(
+                        "POST", f"{url}/v1/chat/completions", json=body, headers=headers,
+                        extensions={"trace": trace},
+                    ) as response:
+                        async for line in response.aiter_lines():
+                            if first is None and line.startswith("data: {"):
+                                first = time.perf_counter() - start
+                    if response.status_code != 200 or first is None:
+                        failures += 1
+                        continue
+                except httpx.HTTPError:
+                    failures += 1
+                    continue
+                first_chunk.append(first)
+                durations.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        "connections": connections,
+        "failures": failures,
+        "streams_per_second": len(durations) / elapsed,
+        "first_chunk_ms": percentiles(first_chunk),
+        "duration_ms": percentiles(durations),
+    }
+
+
+def percentiles(values: list) -> dict:
+    """p50, p95 and p99 in milliseconds (nearest rank)."""
+    ordered = sorted(values)
+    if not ordered:
+        return {"p50": None, "p95": None, "p99": None}
+    return {
+        name: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+        for name, q in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))
+    }
+
+
+def missing_packages(mode: str) -> list:
+    needed = ["hypercorn", "h2"] if mode == "h2c" else []
+    return [name for name in needed if importlib.util.find_spec(name) is None]
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("-c", "--concurrency", type=int, default=128, help="Streams open at a time")
+    arg_parser.add_argument("-n", "--requests", type=int, default=512, help="Streams in total")
+    arg_parser.add_argument("--chunks", type=int, default=32, help="Chunks per streamed answer")
+    arg_parser.add_argument("--delay", type=float, default=0.01, help="Seconds between upstream chunks")
+    arg_parser.add_argument("--modes", default="http1,h2c", help="Comma-separated: http1, h2c")
+    args = arg_parser.parse_args()
+
+    FakeUpstreamHandler.chunks = args.chunks
+    FakeUpstreamHandler.delay = args.delay
+    upstream = FakeUpstream(("127.0.0.1", 0), FakeUpstreamHandler)
+    threading.Thread(target=upstream.serve_forever, daemon=True).start()
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}/v1"
+
+    print(f"{args.requests} streams, {args.concurrency} at a time, {args.chunks} chunks each\n")
+    print(f"{'mode':<8} {'conns':>6} {'fail':>5} {'streams/s':>10} "
+          f"{'first p50':>10} {'p95':>8} {'p99':>8} {'total p50':>10} {'p95':>8} {'p99':>8}")
+    for mode in args.modes.split(","):
+        missing = missing_packages(mode)
+        if missing:
+            print(f"{mode:<8} skipped: needs {', '.join(missing)}")
+            continue
+        server, url = start_server(mode, upstream_url, args.concurrency)
+        try:
+            result = asyncio.run(run_load(mode, url, args.concurrency, args.requests))
+        finally:
+            server.terminate()
+            server.wait()
+        first, total = result["first_chunk_ms"], result["duration_ms"]
+        print(
+            f"{mode:<8} {result['connections']:>6} {result['failures']:>5} {result['streams_per_second']:>10.1f} "
+            f"{first['p50']:>10} {first['p95']:>8} {first['p99']:>8} {total['p50']:>10} {total['p95']:>8} {total['p99']:>8}"
+        )
+    upstream.shutdown()
+
+
+if __name__ == "__main__":
+    main()
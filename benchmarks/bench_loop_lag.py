@@ -0,0 +1,101 @@
+"""Event loop lag while many Gradio streams are parsed, per parse pool mode.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_loop_lag.py                     # 32 streams, all modes
+    PYTHONPATH=. python benchmarks/bench_loop_lag.py -c 64 --workers 4   # more streams, 4 pool slots
+    PYTHONPATH=. python benchmarks/bench_loop_lag.py --modes off,process
+
+Runs ``-c`` streamed completions at once the way the server does: each is
+read and parsed on a worker thread while the event loop stays free for I/O.
+A timer on the loop measures how late it fires, which is what every other
+connection waits when parsing holds the GIL. ``off`` parses on the reading
+threads, ``thread`` and ``process`` on a ParsePool (BHARATGEN_PARSE_POOL).
+Upstream reads return at most ``--read-size`` bytes, like a network socket.
+"""
+
+import argparse
+import asyncio
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bharatgen_openai.parse_pool import ParsePool
+from bharatgen_openai.parser import GradioResponseParser
+
+from fixtures import LONG_ANSWER, LONG_THINKING, FakeResponse, cumulative_stream
+
+
+class SocketLikeResponse(FakeResponse):
+    """FakeResponse whose reads return at most ``read_size`` bytes."""
+
+    def __init__(self, lines: list, read_size: int):
+        super().__init__(lines)
+        raw = self.raw
+        raw.read1 = lambda size=-1: io.BytesIO.read1(raw, min(size, read_size))
+
+
+def run_streams(lines: list, concurrency: int, read_size: int, pool) -> dict:
+    """Parse ``concurrency`` streams on worker threads while timing the loop."""
+    parser = GradioResponseParser(pool)
+
+    def consume():
+        response = SocketLikeResponse(lines, read_size)
+        return sum(len(delta) for delta in parser.parse_streaming_response(response, reasoning=True))
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        lags = []
+        done = asyncio.Event()
+
+        async def measure(interval=0.005):
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(interval)
+                lags.append(max(0.0, time.perf_counter() - start - interval))
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            monitor = asyncio.create_task(measure())
+            start = time.perf_counter()
+            sizes = await asyncio.gather(*(loop.run_in_executor(executor, consume) for _ in range(concurrency)))
+            elapsed = time.perf_counter() - start
+            done.set()
+            await monitor
+        assert len(set(sizes)) == 1, "streams parsed differently"
+        return {"elapsed": elapsed, "lag_ms": percentiles(lags)}
+
+    return asyncio.run(main())
+
+
+def percentiles(values: list) -> dict:
+    """p50, p99 and max in milliseconds (nearest rank)."""
+    ordered = sorted(values) or [0.0]
+    rank = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"p50": rank(0.5) * 1000, "p99": rank(0.99) * 1000, "max": ordered[-1] * 1000}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("-c", "--concurrency", type=int, default=32, help="Streams parsed at once")
+    arg_parser.add_argument("--workers", type=int, default=None, help="Parse pool slots (default: CPU count)")
+    arg_parser.add_argument("--read-size", type=int, default=4096, help="Max bytes per upstream read")
+    arg_parser.add_argument("--modes", default="off,thread,process", help="Comma-separated: off, thread, process")
+    args = arg_parser.parse_args()
+
+    lines = cumulative_stream(LONG_ANSWER, LONG_THINKING)
+    print(f"{args.concurrency} streams of {len(lines) // 3} events, reads of up to {args.read_size} bytes\n")
+    print(f"{'mode':<8} {'seconds':>8} {'lag p50':>9} {'p99':>8} {'max':>8}  (ms)")
+    for mode in args.modes.split(","):
+        pool = None if mode == "off" else ParsePool(mode, args.workers)
+        if pool is not None:
+            pool.start()
+        try:
+            result = run_streams(lines, args.concurrency, args.read_size, pool)
+        finally:
+            if pool is not None:
+                pool.close()
+        lag = result["lag_ms"]
+        print(f"{mode:<8} {result['elapsed']:>8.2f} {lag['p50']:>9.1f} {lag['p99']:>8.1f} {lag['max']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
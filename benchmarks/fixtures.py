@@ -0,0 +1,194 @@
+"""Realistic Gradio payload fixtures for the hot-path benchmarks.
+
+The HTML mirrors what the Param-17B Gradio app sends: a collapsible thought
+section, the visible answer, a debug section and a latency footer.
+"""
+
+import io
+import json
+import queue
+
+from bharatgen_openai.transport import QueueJob
+
+THINKING = (
+    "The user is asking a question. Let me think step-by-step about what they need, "
+    "recall the relevant facts, and check the answer before writing it down. "
+)
+
+ENGLISH = (
+    "India is a country in South Asia. It is the seventh-largest country by area "
+    "and the most populous country in the world. New Delhi is its capital. "
+)
+
+HINDI = (
+    "भारत दक्षिण एशिया में स्थित एक देश है। यह क्षेत्रफल की दृष्टि से सातवाँ सबसे बड़ा देश है "
+    "और दुनिया का सबसे अधिक आबादी वाला देश है। नई दिल्ली इसकी राजधानी है। "
+)
+
+TAMIL = (
+    "இந்தியா தெற்காசியாவில் உள்ள ஒரு நாடு. இது பரப்பளவில் ஏழாவது பெரிய நாடு ஆகும். "
+    "புது தில்லி அதன் தலைநகரம். "
+)
+
+
+def repeat_to(text: str, size: int) -> str:
+    """Repeat text until it is at least `size` characters long."""
+    return (text * (size // len(text) + 1))[:size]
+
+
+def render_html(answer: str, thinking: str = "", debug: bool = False, latency: bool = False) -> str:
+    """Render an assistant message the way the Gradio app does."""
+    parts = []
+    if thinking:
+        parts.append(
+            '<details class="thought" open><summary>🧠 Thinking...</summary>'
+            f"<div>{thinking}</div></details>"
+        )
+    parts.append(answer)
+    if debug:
+        parts.append(
+            '<details style="opacity:0.7;font-size:0.85em"><summary>🔍 Debug: Raw Response</summary>'
+            f"<pre>{thinking}{answer}</pre></details>"
+        )
+    if latency:
+        parts.append('<div style="color:#666;border-top:1px solid #eee">Latency: 3.21 s</div>')
+    return "".join(parts)
+
+
+def paragraphs(text: str) -> str:
+    """Wrap blank-line separated paragraphs in <p> tags."""
+    return "".join(f"<p>{para}</p>" for para in text.split("\n\n"))
+
+
+def gradio_data(html: str, user: str = "What is India?") -> list:
+    """Wrap assistant HTML in Gradio's chat output structure."""
+    return [
+        [
+            {"role": "user", "content": [{"type": "text", "text": user}]},
+            {"role": "assistant", "content": [{"type": "text", "text": html}]},
+        ],
+        "",
+    ]
+
+
+def sse_line(html: str) -> str:
+    """Render a single `data:` SSE line."""
+    return "data: " + json.dumps(gradio_data(html))
+
+
+def cumulative_stream(answer: str, thinking: str = "", step: int = 40) -> list:
+    """Build the SSE lines of a stream of cumulative snapshots.
+
+    Thinking arrives first (the app re-renders the closed thought block each
+    time), then the answer text grows `step` characters per event, mirroring
+    how the upstream re-sends the whole message each time.
+    """
+    lines = []
+    for end in range(step, len(thinking) + step, step):
+        html = (
+            '<details class="thought" open><summary>🧠 Thinking...</summary>'
+            f"<div>{thinking[:end]}</div></details>"
+        )
+        lines += ["event: generating", "data: " + json.dumps(gradio_data(html)), ""]
+    for end in range(step, len(answer) + step, step):
+        html = render_html(answer[:end], thinking)
+        lines += ["event: generating", "data: " + json.dumps(gradio_data(html)), ""]
+    html = render_html(answer, thinking, debug=True, latency=True)
+    lines += ["event: complete", "data: " + json.dumps(gradio_data(html)), ""]
+    return lines
+
+
+def queue_diff_messages(answer: str, thinking: str = "", step: int = 40) -> list:
+    """Build the queue-protocol messages for one job, as (message, size) pairs.
+
+    Same snapshots as `cumulative_stream`, but after the first generation
+    each one is sent as a diff: append when it extends the previous
+    snapshot, replace otherwise, like Gradio's streaming-diff mode.
+    """
+    snapshots = [
+        '<details class="thought" open><summary>🧠 Thinking...</summary>'
+        f"<div>{thinking[:end]}</div></details>"
+        for end in range(step, len(thinking) + step, step)
+    ]
+    snapshots += [render_html(answer[:end], thinking) for end in range(step, len(answer) + step, step)]
+
+    messages = []
+    previous = None
+    for html in snapshots:
+        if previous is None:
+            output = gradio_data(html)
+        elif html.startswith(previous):
+            output = [[["append", [1, "content", 0, "text"], html[len(previous):]]], []]
+        else:
+            output = [[["replace", [1, "content", 0, "text"], html]], []]
+        message = {"msg": "process_generating", "event_id": "e", "success": True, "output": {"data": output}}
+        messages.append((message, len(json.dumps(message)) + 7))
+        previous = html
+    final = {"msg": "process_completed", "event_id": "e", "success": True,
+             "output": {"data": gradio_data(render_html(answer, thinking, debug=True, latency=True))}}
+    messages.append((final, len(json.dumps(final)) + 7))
+    return messages
+
+
+def openai_stream(answer: str, step: int = 4) -> list:
+    """Build the SSE lines of an OpenAI-compatible server's chunk stream.
+
+    One chunk per ~token (`step` characters), then the finish reason, the
+    usage chunk and `[DONE]`, like vLLM with `include_usage`.
+    """
+    def chunk(delta: dict, finish_reason=None) -> str:
+        return "data: " + json.dumps({
+            "id": "cmpl-1", "object": "chat.completion.chunk", "created": 0, "model": "param-17b",
+            "choices": [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish_reason}],
+        })
+
+    lines = [chunk({"role": "assistant", "content": ""}), ""]
+    for start in range(0, len(answer), step):
+        lines += [chunk({"content": answer[start:start + step]}), ""]
+    lines += [chunk({}, "stop"), ""]
+    usage = {"prompt_tokens": 12, "completion_tokens": len(answer) // step, "total_tokens": 12 + len(answer) // step}
+    lines += ["data: " + json.dumps({"id": "cmpl-1", "choices": [], "usage": usage}), "", "data: [DONE]", ""]
+    return lines
+
+
+def queue_job(messages: list) -> QueueJob:
+    """Build a QueueJob whose messages have all arrived already."""
+    pending = queue.Queue()
+    for item in messages:
+        pending.put(item)
+    return QueueJob("e", pending)
+
+
+class FakeResponse:
+    """Stand-in for a streaming requests.Response over pre-rendered SSE lines."""
+
+    def __init__(self, lines: list):
+        self.lines = lines
+        self.body = "\n".join(lines).encode("utf-8") + b"\n"
+        self.raw = io.BytesIO(self.body)
+
+    def iter_lines(self, decode_unicode: bool = False, **kwargs):
+        return iter(self.lines)
+
+    def iter_content(self, chunk_size: int = 1, decode_unicode: bool = False):
+        for i in range(0, len(self.body), chunk_size):
+            yield self.body[i:i + chunk_size]
+
+    def close(self):
+        pass
+
+
+def conversation(turns: int) -> list:
+    """Build an OpenAI-style multi-turn conversation."""
+    messages = [{"role": "system", "content": "You are a helpful assistant."}]
+    for i in range(turns):
+        messages.append({"role": "user", "content": f"Question {i}: " + ENGLISH})
+        messages.append({"role": "assistant", "content": HINDI})
+    messages.append({"role": "user", "content": "And finally, summarize everything."})
+    return messages
+
+
+SHORT_ANSWER = "The capital of India is New Delhi."
+LONG_ANSWER = repeat_to(ENGLISH + "\n\n", 6000)
+INDIC_ANSWER = repeat_to(HINDI + TAMIL + "\n\n", 6000)
+LONG_THINKING = repeat_to(THINKING, 3000)
@@ -0,0 +1,57 @@
+"""Chat completion backends.
+
+``gradio`` drives a Gradio chat app; ``openai`` streams from an
+OpenAI-compatible inference server (vLLM, TGI) serving the model directly.
+"""
+
+from typing import Optional
+
+import requests
+
+from .base import CONNECT_TIMEOUT, DEFAULT_PARAMS, REASONING_EFFORTS, ChatBackend, ReasoningProfile, create_session
+from .gradio import GradioBackend
+from .openai_compat import OpenAICompatibleBackend
+
+BACKENDS = {backend.name: backend for backend in (GradioBackend, OpenAICompatibleBackend)}
+
+
+def create_backend(
+    kind: str,
+    base_url: str,
+    model: str,
+    session: Optional[requests.Session] = None,
+    **options,
+) -> ChatBackend:
+    """Create a backend by name.
+
+    Args:
+        kind: Backend name ('gradio' or 'openai')
+        base_url: Base URL of the upstream API
+        model: Model name reported in responses
+        session: Pooled HTTP session (created if not provided)
+        **options: Backend-specific constructor arguments
+
+    Returns:
+        Backend instance
+
+    Raises:
+        ValueError: If the backend name is unknown
+    """
+    backend = BACKENDS.get(kind)
+    if backend is None:
+        raise ValueError(f"Unknown backend: {kind}")
+    return backend(base_url, model, session, **options)
+
+
+__all__ = [
+    "BACKENDS",
+    "CONNECT_TIMEOUT",
+    "DEFAULT_PARAMS",
+    "REASONING_EFFORTS",
+    "ChatBackend",
+    "GradioBackend",
+    "OpenAICompatibleBackend",
+    "ReasoningProfile",
+    "create_backend",
+    "create_session",
+]
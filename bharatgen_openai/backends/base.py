@@ -0,0 +1,182 @@
+"""Base class and shared settings of chat completion backends."""
+
+import uuid
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..models import ChatCompletion, ChatCompletionChunk
+
+
+def create_session(pool_size: int = 64, hosts: int = 4) -> requests.Session:
+    """Create a session with a connection pool sized for concurrent streams.
+
+    Args:
+        pool_size: Max pooled connections per host
+        hosts: Number of upstream hosts to keep connection pools for
+
+    Returns:
+        Session object
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=max(4, hosts), pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+# Seconds to wait for an upstream connection to open
+CONNECT_TIMEOUT = 10.0
+
+BASE_SYSTEM_PROMPT = "You are a helpful AI assistant."
+
+# Generation parameters used when neither the request nor the model sets them
+DEFAULT_PARAMS = {
+    "system_prompt": f"{BASE_SYSTEM_PROMPT} You think step-by-step.",
+    "temperature": 0.7,
+    "max_tokens": 2048,
+    "top_p": 1.0,
+    "top_k": 50,
+}
+
+
+class ReasoningProfile(NamedTuple):
+    """How much a ``reasoning_effort`` lets the model think."""
+
+    instruction: Optional[str]  # Added to the system prompt
+    max_tokens: Optional[int]  # Cap on the default max_tokens
+    thinking_budget: Optional[int]  # Thinking tokens before the generation is ended
+
+
+# "high" is the model's own behaviour
+REASONING_EFFORTS = {
+    "minimal": ReasoningProfile("Answer directly and concisely, without thinking step-by-step.", 512, 128),
+    "low": ReasoningProfile("Think briefly, then answer concisely.", 1024, 512),
+    "medium": ReasoningProfile("You think step-by-step, but keep your reasoning short.", 2048, 1536),
+    "high": ReasoningProfile(None, None, None),
+}
+
+
+def new_completion_id() -> str:
+    """Generate a unique completion ID."""
+    return f"chatcmpl-{uuid.uuid4().hex[:24]}"
+
+
+class ChatBackend:
+    """Chat completions against one kind of upstream.
+
+    Subclasses implement ``create`` with the signature of the OpenAI SDK's
+    ``chat.completions.create``. Streaming completions yield
+    ChatCompletionChunk objects; the last one carries the finish reason and
+    the usage.
+    """
+
+    # Value of the ``backend`` setting that selects the class
+    name = ""
+    # Cheap GET (relative to the base URL) used to probe the upstream
+    health_path = "/"
+    # Gradio queue status endpoint, for backends whose upstream has one
+    queue_status_path: Optional[str] = None
+    # Multiplexed Gradio queue transport, for backends that use one
+    queue_transport = None
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        session: Optional[requests.Session] = None,
+        idle_timeout: Optional[float] = 45.0,
+        defaults: Optional[Dict[str, Any]] = None,
+    ):
+        """Initialize backend.
+
+        Args:
+            base_url: Base URL of the upstream API
+            model: Model name reported in responses
+            session: Pooled HTTP session (created if not provided)
+            idle_timeout: Seconds an upstream stream may stay silent before
+                the completion fails; None waits forever
+            defaults: Generation parameters overriding DEFAULT_PARAMS
+                (system_prompt, temperature, max_tokens, top_p, top_k)
+        """
+        self.base_url = base_url
+        self.model = model
+        self.session = session or create_session()
+        self.defaults = {**DEFAULT_PARAMS, **(defaults or {})}
+        self.timeout = (CONNECT_TIMEOUT, idle_timeout)
+
+    def _apply_effort(
+        self, effort: Optional[str], system_prompt: Optional[str], max_tokens: Optional[int]
+    ) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+        """Adjust a request's system prompt and max_tokens to a reasoning effort.
+
+        The effort's instruction is added to the request's system prompt,
+        or to the model's default one; the stock default's "You think
+        step-by-step" is replaced rather than contradicted. An explicit
+        max_tokens is kept, otherwise the default is capped.
+
+        Args:
+            effort: Reasoning effort (None keeps the model's defaults)
+            system_prompt: System prompt of the request, if any
+            max_tokens: max_tokens of the request, if set
+
+        Returns:
+            Tuple of (system_prompt, max_tokens, thinking_budget); None
+            values mean the model's defaults and no budget
+
+        Raises:
+            ValueError: If the effort is unknown
+        """
+        if effort is None:
+            return system_prompt, max_tokens, None
+        profile = REASONING_EFFORTS.get(effort)
+        if profile is None:
+            raise ValueError(f"Unknown reasoning_effort: {effort}")
+        if profile.instruction is not None:
+            if system_prompt is None and self.defaults["system_prompt"] == DEFAULT_PARAMS["system_prompt"]:
+                system_prompt = f"{BASE_SYSTEM_PROMPT} {profile.instruction}"
+            else:
+                base = self.defaults["system_prompt"] if system_prompt is None else system_prompt
+                system_prompt = f"{base}\n\n{profile.instruction}" if base else profile.instruction
+        if max_tokens is None and profile.max_tokens is not None:
+            max_tokens = min(self.defaults["max_tokens"], profile.max_tokens)
+        return system_prompt, max_tokens, profile.thinking_budget
+
+    def create(
+        self,
+        messages: List[dict],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        top_p: Optional[float] = None,
+        stream: Optional[bool] = False,
+        trace=None,
+        queue_updates: bool = False,
+        include_reasoning: bool = False,
+        reasoning_effort: Optional[str] = None,
+        **kwargs,
+    ) -> Union[ChatCompletion, Iterator[ChatCompletionChunk]]:
+        """Create a chat completion.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            model: Model name (uses instance model if not provided)
+            temperature: Sampling temperature (0-2, model default if not provided)
+            max_tokens: Max tokens in response (model default if not provided)
+            top_p: Nucleus sampling (0-1, model default if not provided)
+            stream: Whether to stream response
+            trace: Optional RequestTrace that receives phase timings
+            queue_updates: Also yield upstream queue positions while
+                streaming, if the backend knows them
+            include_reasoning: When streaming, also send the model's
+                thinking as ``reasoning_content`` deltas, if the upstream
+                shows it
+            reasoning_effort: 'minimal', 'low', 'medium' or 'high' (see
+                REASONING_EFFORTS); None keeps the model's defaults
+            **kwargs: Additional parameters (ignored)
+
+        Returns:
+            ChatCompletion for non-streaming, Iterator[ChatCompletionChunk] for streaming
+        """
+        raise NotImplementedError
@@ -0,0 +1,360 @@
+"""Backend driving a Gradio chat app."""
+
+from typing import Optional, Iterator, Union, List, Any, Dict
+import requests
+
+from ..metrics import THINKING_BUDGET_EXCEEDED
+from ..models import (
+    ChatCompletion,
+    ChatCompletionChunk,
+    create_chat_completion,
+    create_chat_completion_chunk,
+    create_usage,
+)
+from ..parser import GradioResponseParser, Reasoning
+from ..tracing import NULL_TRACE, UPSTREAM_POST
+from ..transport import Estimation, GradioQueueTransport, QueueJob, UpstreamError
+from ..adapters.gradio_adapter import estimate_tokens, format_messages_for_gradio
+from .base import ChatBackend, new_completion_id
+
+
+class GradioBackend(ChatBackend):
+    """Chat completions through a Gradio app's chat function.
+
+    Messages are flattened into Gradio's (message, history, system prompt)
+    arguments, and the assistant HTML the app streams back is cleaned into
+    text deltas.
+    """
+
+    name = "gradio"
+    health_path = "/info"
+    queue_status_path = "/queue/status"
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        session: Optional[requests.Session] = None,
+        idle_timeout: Optional[float] = 45.0,
+        defaults: Optional[Dict[str, Any]] = None,
+        transport: str = "call",
+        api_name: str = "chat_fn_1",
+        parse_pool=None,
+    ):
+        """Initialize chat completions.
+
+        Args:
+            base_url: Base URL of Gradio API
+            model: Model name
+            session: Pooled HTTP session (created if not provided)
+            idle_timeout: Seconds an upstream stream may stay silent before
+                the completion fails (Gradio heartbeats keep it alive);
+                None waits forever
+            defaults: Generation parameters overriding DEFAULT_PARAMS
+                (system_prompt, temperature, max_tokens, top_p, top_k)
+            transport: 'call' for one /call/ stream per completion, 'queue'
+                to multiplex all completions over one queue data stream
+            api_name: Gradio API name of the chat function
+            parse_pool: ParsePool that streamed responses are parsed on
+                (None parses on the thread reading the response)
+        """
+        if transport not in ("call", "queue"):
+            raise ValueError(f"Unknown transport: {transport}")
+        super().__init__(base_url, model, session, idle_timeout, defaults)
+        self.transport = transport
+        self.api_name = api_name
+        self.queue_transport = (
+            GradioQueueTransport(base_url, self.session, api_name=api_name, timeout=self.timeout)
+            if transport == "queue"
+            else None
+        )
+        self.parser = GradioResponseParser(parse_pool)
+
+    def _call_gradio_api(
+        self,
+        message: str,
+        chat_history: list,
+        system_prompt: Optional[str],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        top_p: Optional[float],
+        stream: bool,
+        trace=NULL_TRACE,
+    ) -> Union[requests.Response, QueueJob]:
+        """Call the Gradio API.
+
+        Args:
+            message: Current user message
+            chat_history: Previous conversation history
+            system_prompt: System prompt
+            temperature: Sampling temperature
+            max_tokens: Max tokens in response
+            top_p: Nucleus sampling parameter
+            stream: Whether to stream response
+            trace: Request trace for phase timings
+
+        Returns:
+            Streaming response object, or a QueueJob with the queue transport
+        """
+        # Default values
+        if system_prompt is None:
+            system_prompt = self.defaults["system_prompt"]
+        if temperature is None:
+            temperature = self.defaults["temperature"]
+        if max_tokens is None:
+            max_tokens = self.defaults["max_tokens"]
+        if top_p is None:
+            top_p = self.defaults["top_p"]
+
+        # Step 1: Get event ID
+        payload = {
+            "data": [
+                message,
+                chat_history,
+                system_prompt,
+                temperature,
+                max_tokens,
+                top_p,
+                self.defaults["top_k"],
+            ]
+        }
+
+        if self.queue_transport is not None:
+            with trace.span(UPSTREAM_POST):
+                return self.queue_transport.submit(payload["data"])
+
+        with trace.span(UPSTREAM_POST):
+            response = self.session.post(
+                f"{self.base_url}/call/{self.api_name}", json=payload, timeout=self.timeout
+            )
+            if not response.ok:
+                raise UpstreamError(f"Upstream returned HTTP {response.status_code}")
+            event_id = response.json().get("event_id")
+
+        # Step 2: Get streaming response
+        # Note: Always use stream=True for HTTP request because Gradio returns SSE format.
+        # The read timeout applies per socket read, so heartbeats keep it alive.
+        stream_url = f"{self.base_url}/call/{self.api_name}/{event_id}"
+        response = self.session.get(stream_url, stream=True, timeout=self.timeout)
+        if not response.ok:
+            response.close()
+            raise UpstreamError(f"Upstream returned HTTP {response.status_code}")
+
+        return response
+
+    def create(
+        self,
+        messages: List[dict],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        top_p: Optional[float] = None,
+        stream: Optional[bool] = False,
+        trace=None,
+        queue_updates: bool = False,
+        include_reasoning: bool = False,
+        reasoning_effort: Optional[str] = None,
+        **kwargs,
+    ) -> Union[ChatCompletion, Iterator[ChatCompletionChunk]]:
+        """Create a chat completion.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            model: Model name (uses instance model if not provided)
+            temperature: Sampling temperature (0-2, model default if not provided)
+            max_tokens: Max tokens in response (model default if not provided)
+            top_p: Nucleus sampling (0-1, model default if not provided)
+            stream: Whether to stream response
+            trace: Optional RequestTrace that receives phase timings
+            queue_updates: When streaming over the queue transport, also yield
+                an Estimation whenever the upstream queue position changes
+            include_reasoning: When streaming, also send the thought
+                section as ``reasoning_content`` deltas as it arrives
+            reasoning_effort: 'minimal', 'low', 'medium' or 'high'; picks
+                the system prompt, caps the default max_tokens and ends the
+                generation once thinking uses up the effort's budget
+            **kwargs: Additional parameters (ignored)
+
+        Returns:
+            ChatCompletion for non-streaming, Iterator[ChatCompletionChunk] for streaming
+
+        Raises:
+            ValueError: If the reasoning effort is unknown
+        """
+        if model is None:
+            model = self.model
+        if trace is None:
+            trace = NULL_TRACE
+
+        # Convert OpenAI message format to Gradio format
+        current_message, chat_history, system_prompt = format_messages_for_gradio(messages)
+        system_prompt, max_tokens, budget = self._apply_effort(reasoning_effort, system_prompt, max_tokens)
+
+        # Generate unique completion ID
+        completion_id = new_completion_id()
+
+        # Call Gradio API
+        response = self._call_gradio_api(
+            message=current_message,
+            chat_history=chat_history,
+            system_prompt=system_prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            stream=stream,
+            trace=trace,
+        )
+
+        # Calculate prompt tokens
+        prompt_text = system_prompt or ""
+        for msg in messages:
+            prompt_text += msg.get("content", "")
+        prompt_tokens = estimate_tokens(prompt_text)
+
+        if stream:
+            return self._create_streaming_completion(
+                response,
+                completion_id,
+                model,
+                prompt_tokens,
+                trace,
+                queue_updates,
+                include_reasoning,
+                budget,
+                reasoning_effort,
+            )
+        else:
+            return self._create_completion(
+                response, completion_id, model, prompt_tokens, trace, budget, reasoning_effort
+            )
+
+    def _create_completion(
+        self,
+        response: Union[requests.Response, QueueJob],
+        completion_id: str,
+        model: str,
+        prompt_tokens: int,
+        trace=NULL_TRACE,
+        thinking_budget: Optional[int] = None,
+        effort: Optional[str] = None,
+    ) -> ChatCompletion:
+        """Create a non-streaming completion.
+
+        Args:
+            response: Gradio API response
+            completion_id: Unique completion ID
+            model: Model name
+            prompt_tokens: Number of prompt tokens
+            trace: Request trace for phase timings
+            thinking_budget: Estimated thinking tokens before the generation is ended
+            effort: Reasoning effort the budget comes from
+
+        Returns:
+            ChatCompletion object
+        """
+        # Parse complete response
+        result = {}
+        content = self.parser.parse_complete_response(response, trace, result, thinking_budget)
+        if result.get("truncated"):
+            THINKING_BUDGET_EXCEEDED.inc(effort=effort)
+
+        if content is None:
+            content = ""
+
+        # Estimate completion tokens; the thought section counts as reasoning
+        # (and is billed) only when a reasoning effort budgets it
+        reasoning_tokens = estimate_tokens(result.get("reasoning", "")) if effort is not None else None
+        completion_tokens = estimate_tokens(content) + (reasoning_tokens or 0)
+
+        return create_chat_completion(
+            completion_id=completion_id,
+            model=model,
+            content=content,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            finish_reason="length" if result.get("truncated") else "stop",
+            reasoning_tokens=reasoning_tokens,
+        )
+
+    def _create_streaming_completion(
+        self,
+        response: Union[requests.Response, QueueJob],
+        completion_id: str,
+        model: str,
+        prompt_tokens: int,
+        trace=NULL_TRACE,
+        queue_updates: bool = False,
+        include_reasoning: bool = False,
+        thinking_budget: Optional[int] = None,
+        effort: Optional[str] = None,
+    ) -> Iterator[Union[ChatCompletionChunk, Estimation]]:
+        """Create a streaming completion.
+
+        Args:
+            response: Gradio API response
+            completion_id: Unique completion ID
+            model: Model name
+            prompt_tokens: Number of prompt tokens
+            trace: Request trace for phase timings
+            queue_updates: Pass upstream queue positions through
+            include_reasoning: Send the thought section as reasoning deltas
+            thinking_budget: Estimated thinking tokens before the generation
+                is ended (finish_reason ``length``)
+            effort: Reasoning effort the budget comes from
+
+        Yields:
+            ChatCompletionChunk objects (the last one carries the usage), and
+            Estimation items while queued if ``queue_updates`` is set
+        """
+        # First chunk with role
+        yield create_chat_completion_chunk(
+            completion_id=completion_id,
+            model=model,
+            role="assistant",
+        )
+
+        # Stream content deltas; the thought section is always parsed, so
+        # thinking counts towards the budget (and usage, with an effort)
+        deltas = []
+        reasoning = ""
+        truncated = False
+        items = self.parser.parse_streaming_response(response, trace, queue_updates, reasoning=True)
+        try:
+            for delta in items:
+                if isinstance(delta, Estimation):
+                    yield delta
+                    continue
+                if isinstance(delta, Reasoning):
+                    reasoning += delta.text
+                    if include_reasoning:
+                        yield create_chat_completion_chunk(
+                            completion_id=completion_id,
+                            model=model,
+                            reasoning_content=delta.text,
+                        )
+                    if thinking_budget is not None and not deltas and estimate_tokens(reasoning) > thinking_budget:
+                        truncated = True
+                        THINKING_BUDGET_EXCEEDED.inc(effort=effort)
+                        break
+                    continue
+                deltas.append(delta)
+                yield create_chat_completion_chunk(
+                    completion_id=completion_id,
+                    model=model,
+                    content=delta,
+                )
+        finally:
+            # Closes the upstream stream, or cancels the queue job, also when
+            # the budget ran out or the client went away
+            items.close()
+
+        # Final chunk with finish_reason and usage
+        reasoning_tokens = estimate_tokens(reasoning) if effort is not None else None
+        yield create_chat_completion_chunk(
+            completion_id=completion_id,
+            model=model,
+            finish_reason="length" if truncated else "stop",
+            usage=create_usage(
+                prompt_tokens, estimate_tokens("".join(deltas)) + (reasoning_tokens or 0), reasoning_tokens
+            ),
+        )
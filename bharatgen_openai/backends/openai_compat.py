@@ -0,0 +1,375 @@
+"""Backend streaming from an OpenAI-compatible inference server.
+
+Inference servers such as vLLM and TGI serve ``/v1/chat/completions``
+themselves. Messages go upstream as they are and the structured deltas
+are passed through as they arrive, with no message flattening, no
+two-step call and no HTML cleaning.
+"""
+
+import json
+import time
+from typing import Any, Dict, Iterator, List, Optional, Union
+
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+from ..adapters.gradio_adapter import estimate_tokens
+from ..metrics import THINKING_BUDGET_EXCEEDED, UPSTREAM_BYTES, UPSTREAM_BYTES_PER_TOKEN, UPSTREAM_TOKENS
+from ..models import (
+    ChatCompletion,
+    ChatCompletionChunk,
+    Usage,
+    create_chat_completion,
+    create_chat_completion_chunk,
+    create_usage,
+)
+from ..parser import Reasoning
+from ..sse import iter_sse_events
+from ..tracing import NULL_TRACE, FIRST_BYTE, FIRST_EVENT, FIRST_TOKEN, PARSE, UPSTREAM_POST
+from ..transport import UpstreamError, UpstreamTimeoutError
+from .base import ChatBackend, new_completion_id
+
+# Finish reasons the response models accept; others (e.g. "abort") map to "stop"
+_FINISH_REASONS = ("stop", "length", "content_filter")
+
+
+def _error_message(response: requests.Response) -> str:
+    """Error text of a failed upstream response."""
+    try:
+        error = response.json().get("error")
+    except (ValueError, AttributeError):
+        error = None
+    if isinstance(error, dict):
+        error = error.get("message")
+    return f"Upstream returned HTTP {response.status_code}" + (f": {error}" if error else "")
+
+
+class OpenAICompatibleBackend(ChatBackend):
+    """Chat completions from an OpenAI-compatible server (vLLM, TGI)."""
+
+    name = "openai"
+    health_path = "/models"
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str,
+        session: Optional[requests.Session] = None,
+        idle_timeout: Optional[float] = 45.0,
+        defaults: Optional[Dict[str, Any]] = None,
+        upstream_model: Optional[str] = None,
+        api_key: Optional[str] = None,
+    ):
+        """Initialize backend.
+
+        Args:
+            base_url: Base URL of the server's OpenAI API (e.g. ``http://vllm:8000/v1``)
+            model: Model name reported in responses
+            session: Pooled HTTP session (created if not provided)
+            idle_timeout: Seconds the upstream stream may stay silent before
+                the completion fails; None waits forever
+            defaults: Generation parameters overriding DEFAULT_PARAMS; top_k
+                is only sent when set here, since not every server takes it
+            upstream_model: Model name the server serves (default: ``model``)
+            api_key: Bearer token the server expects, if any
+        """
+        super().__init__(base_url.rstrip("/"), model, session, idle_timeout, defaults)
+        self.upstream_model = upstream_model or model
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self._send_top_k = "top_k" in (defaults or {})
+
+    def _payload(
+        self,
+        messages: List[dict],
+        temperature: Optional[float],
+        max_tokens: Optional[int],
+        top_p: Optional[float],
+        system_prompt: Optional[str] = None,
+    ) -> dict:
+        """Build the upstream request, filling in the model's defaults.
+
+        ``system_prompt`` replaces the request's first system message, or
+        the default one added when there is none.
+        """
+        messages = [{"role": msg["role"], "content": msg.get("content") or ""} for msg in messages]
+        system = next((msg for msg in messages if msg["role"] == "system"), None)
+        if system is not None:
+            if system_prompt is not None:
+                system["content"] = system_prompt
+        elif system_prompt or self.defaults["system_prompt"]:
+            messages.insert(0, {"role": "system", "content": system_prompt or self.defaults["system_prompt"]})
+        payload = {
+            "model": self.upstream_model,
+            "messages": messages,
+            "temperature": self.defaults["temperature"] if temperature is None else temperature,
+            "max_tokens": self.defaults["max_tokens"] if max_tokens is None else max_tokens,
+            "top_p": self.defaults["top_p"] if top_p is None else top_p,
+            # Always stream: heartbeat-free servers only keep the idle timeout
+            # alive while tokens flow, and usage arrives in the last chunk
+            "stream": True,
+            "stream_options": {"include_usage": True},
+        }
+        if self._send_top_k:
+            payload["top_k"] = self.defaults["top_k"]
+        return payload
+
+    def _post(self, payload: dict, trace) -> requests.Response:
+        """Start the upstream completion stream."""
+        try:
+            with trace.span(UPSTREAM_POST):
+                response = self.session.post(
+                    f"{self.base_url}/chat/completions",
+                    json=payload,
+                    headers=self.headers,
+                    stream=True,
+                    timeout=self.timeout,
+                )
+        except requests.Timeout as e:
+            raise UpstreamTimeoutError(f"Upstream didn't answer in time: {e}") from e
+        except requests.RequestException as e:
+            raise UpstreamError(f"Upstream request failed: {e}") from e
+        if not response.ok:
+            message = _error_message(response)
+            response.close()
+            raise UpstreamError(message)
+        return response
+
+    def _iter_deltas(
+        self, response: requests.Response, result: dict, trace=NULL_TRACE, reasoning: bool = False
+    ) -> Iterator[Union[str, Reasoning]]:
+        """Yield the content deltas of an upstream stream.
+
+        Args:
+            response: Streaming response from ``/chat/completions``
+            result: Receives ``finish_reason`` and upstream ``usage`` (if sent)
+            trace: Request trace for phase timings
+            reasoning: Also yield reasoning deltas as Reasoning
+
+        Yields:
+            Content deltas of the first choice
+
+        Raises:
+            UpstreamError: If the upstream reports an error or the stream ends early
+            UpstreamTimeoutError: If the stream stays silent past the idle timeout
+        """
+        upstream_bytes = 0
+        emitted = []
+        try:
+            for event in iter_sse_events(response):
+                trace.mark(FIRST_BYTE)
+                trace.mark(FIRST_EVENT)
+                upstream_bytes += event.size
+                if event.data == "[DONE]":
+                    break
+
+                start = time.perf_counter()
+                try:
+                    data = json.loads(event.data)
+                except json.JSONDecodeError:
+                    data = None
+                trace.add(PARSE, time.perf_counter() - start)
+                if not isinstance(data, dict):
+                    continue
+                if "error" in data:
+                    error = data["error"]
+                    raise UpstreamError(error.get("message") if isinstance(error, dict) else str(error))
+
+                if data.get("usage"):
+                    result["usage"] = data["usage"]
+                for choice in data.get("choices") or []:
+                    if choice.get("index", 0) != 0:
+                        continue
+                    delta = choice.get("delta") or {}
+                    if reasoning:
+                        # vLLM's reasoning parsers send reasoning_content; some servers name it reasoning
+                        thought = delta.get("reasoning_content") or delta.get("reasoning")
+                        if thought:
+                            yield Reasoning(thought)
+                    content = delta.get("content")
+                    if content:
+                        trace.mark(FIRST_TOKEN)
+                        emitted.append(content)
+                        yield content
+                    if choice.get("finish_reason"):
+                        result["finish_reason"] = choice["finish_reason"]
+        except (requests.Timeout, ReadTimeoutError, TimeoutError) as e:
+            raise UpstreamTimeoutError(f"Upstream stream idle for too long: {e}") from e
+        except requests.RequestException as e:
+            raise UpstreamError(f"Upstream stream failed: {e}") from e
+        finally:
+            response.close()
+
+        if "finish_reason" not in result:
+            raise UpstreamError("Upstream stream ended before completing")
+        tokens = estimate_tokens("".join(emitted))
+        UPSTREAM_BYTES.inc(upstream_bytes, transport=self.name)
+        UPSTREAM_TOKENS.inc(tokens, transport=self.name)
+        if tokens:
+            UPSTREAM_BYTES_PER_TOKEN.observe(upstream_bytes / tokens, transport=self.name)
+
+    def _usage(
+        self, result: dict, prompt_tokens: int, content: str, reasoning: str, effort: Optional[str] = None
+    ) -> Usage:
+        """Usage reported upstream, or estimated like the Gradio backend does.
+
+        Estimates count thinking as reasoning tokens only with a reasoning effort.
+        """
+        usage = result.get("usage") or {}
+        reasoning_tokens = (usage.get("completion_tokens_details") or {}).get("reasoning_tokens")
+        if reasoning_tokens is None and effort is not None:
+            reasoning_tokens = estimate_tokens(reasoning)
+        prompt = usage.get("prompt_tokens", prompt_tokens)
+        completion = usage.get("completion_tokens", estimate_tokens(content) + (reasoning_tokens or 0))
+        return create_usage(prompt, completion, reasoning_tokens)
+
+    def _iter_budgeted(
+        self,
+        response: requests.Response,
+        result: dict,
+        trace,
+        thinking_budget: Optional[int],
+        effort: Optional[str],
+    ) -> Iterator[Union[str, Reasoning]]:
+        """Like _iter_deltas with reasoning, but end the stream once thinking uses up the budget.
+
+        Sets ``finish_reason`` to ``length`` when the budget runs out.
+        """
+        deltas = self._iter_deltas(response, result, trace, reasoning=True)
+        thought = ""
+        answering = False
+        try:
+            for delta in deltas:
+                if isinstance(delta, Reasoning):
+                    thought += delta.text
+                    yield delta
+                    if thinking_budget is not None and not answering and estimate_tokens(thought) > thinking_budget:
+                        result["finish_reason"] = "length"
+                        THINKING_BUDGET_EXCEEDED.inc(effort=effort)
+                        return
+                    continue
+                answering = True
+                yield delta
+        finally:
+            deltas.close()
+
+    def create(
+        self,
+        messages: List[dict],
+        model: Optional[str] = None,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        top_p: Optional[float] = None,
+        stream: Optional[bool] = False,
+        trace=None,
+        queue_updates: bool = False,
+        include_reasoning: bool = False,
+        reasoning_effort: Optional[str] = None,
+        **kwargs,
+    ) -> Union[ChatCompletion, Iterator[ChatCompletionChunk]]:
+        """Create a chat completion.
+
+        Args:
+            messages: List of message dicts with 'role' and 'content'
+            model: Model name (uses instance model if not provided)
+            temperature: Sampling temperature (0-2, model default if not provided)
+            max_tokens: Max tokens in response (model default if not provided)
+            top_p: Nucleus sampling (0-1, model default if not provided)
+            stream: Whether to stream response
+            trace: Optional RequestTrace that receives phase timings
+            queue_updates: Ignored; the server has no Gradio queue
+            include_reasoning: When streaming, pass the server's reasoning
+                deltas (vLLM's ``reasoning_content``) through
+            reasoning_effort: 'minimal', 'low', 'medium' or 'high'; picks
+                the system prompt, caps the default max_tokens and ends the
+                generation once the server's reasoning deltas use up the
+                effort's budget
+            **kwargs: Additional parameters (ignored)
+
+        Returns:
+            ChatCompletion for non-streaming, Iterator[ChatCompletionChunk] for streaming
+
+        Raises:
+            UpstreamError: If the upstream rejects the request
+            ValueError: If the reasoning effort is unknown
+        """
+        if model is None:
+            model = self.model
+        if trace is None:
+            trace = NULL_TRACE
+
+        system = next((msg.get("content") for msg in messages if msg["role"] == "system"), None)
+        system_prompt, max_tokens, budget = self._apply_effort(reasoning_effort, system, max_tokens)
+        payload = self._payload(messages, temperature, max_tokens, top_p, system_prompt)
+        prompt_tokens = estimate_tokens("".join(msg["content"] for msg in payload["messages"]))
+        completion_id = new_completion_id()
+        response = self._post(payload, trace)
+
+        if stream:
+            return self._create_streaming_completion(
+                response, completion_id, model, prompt_tokens, trace, include_reasoning, budget, reasoning_effort
+            )
+
+        result = {}
+        deltas = []
+        reasoning = []
+        for delta in self._iter_budgeted(response, result, trace, budget, reasoning_effort):
+            if isinstance(delta, Reasoning):
+                reasoning.append(delta.text)
+            else:
+                deltas.append(delta)
+        content = "".join(deltas)
+        usage = self._usage(result, prompt_tokens, content, "".join(reasoning), reasoning_effort)
+        details = usage.completion_tokens_details
+        return create_chat_completion(
+            completion_id=completion_id,
+            model=model,
+            content=content,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            finish_reason=self._finish_reason(result),
+            reasoning_tokens=details.reasoning_tokens if details else None,
+        )
+
+    def _create_streaming_completion(
+        self,
+        response: requests.Response,
+        completion_id: str,
+        model: str,
+        prompt_tokens: int,
+        trace=NULL_TRACE,
+        include_reasoning: bool = False,
+        thinking_budget: Optional[int] = None,
+        effort: Optional[str] = None,
+    ) -> Iterator[ChatCompletionChunk]:
+        """Pass the upstream deltas through as chunks of this completion.
+
+        Yields:
+            ChatCompletionChunk objects (the last one carries the usage)
+        """
+        yield create_chat_completion_chunk(completion_id=completion_id, model=model, role="assistant")
+
+        result = {}
+        deltas = []
+        reasoning = []
+        for delta in self._iter_budgeted(response, result, trace, thinking_budget, effort):
+            if isinstance(delta, Reasoning):
+                reasoning.append(delta.text)
+                if include_reasoning:
+                    yield create_chat_completion_chunk(
+                        completion_id=completion_id, model=model, reasoning_content=delta.text
+                    )
+                continue
+            deltas.append(delta)
+            yield create_chat_completion_chunk(completion_id=completion_id, model=model, content=delta)
+
+        yield create_chat_completion_chunk(
+            completion_id=completion_id,
+            model=model,
+            finish_reason=self._finish_reason(result),
+            usage=self._usage(result, prompt_tokens, "".join(deltas), "".join(reasoning), effort),
+        )
+
+    @staticmethod
+    def _finish_reason(result: dict) -> str:
+        reason = result.get("finish_reason")
+        return reason if reason in _FINISH_REASONS else "stop"
@@ -1,224 +1,52 @@
 """OpenAI-compatible client SDK for BharatGen."""
 
 import os
-import uuid
-from typing import Optional, Iterator, Union, List
-import requests
-
-from .models import (
-    ChatCompletion,
-    ChatCompletionChunk,
-    ChatCompletionMessage,
-    create_chat_completion,
-    create_chat_completion_chunk,
-)
-from .parser import GradioResponseParser
-from .adapters.gradio_adapter import estimate_tokens, format_messages_for_gradio
-
-
-class ChatCompletions:
-    """Chat completions API."""
-
-    def __init__(self, base_url: str, model: str):
-        """Initialize chat completions.
-
-        Args:
-            base_url: Base URL of Gradio API
-            model: Model name
-        """
-        self.base_url = base_url
-        self.model = model
-        self.parser = GradioResponseParser()
-
-    def _call_gradio_api(
-        self,
-        message: str,
-        chat_history: list,
-        system_prompt: Optional[str],
-        temperature: float,
-        max_tokens: Optional[int],
-        top_p: float,
-        stream: bool,
-    ) -> requests.Response:
-        """Call the Gradio API.
-
-        Args:
-            message: Current user message
-            chat_history: Previous conversation history
-            system_prompt: System prompt
-            temperature: Sampling temperature
-            max_tokens: Max tokens in response
-            top_p: Nucleus sampling parameter
-            stream: Whether to stream response
+import warnings
+from typing import Any, Dict, Optional, Union
 
-        Returns:
-            Response object
-        """
-        # Default values
-        if system_prompt is None:
-            system_prompt = "You are a helpful AI assistant. You think step-by-step."
-        if max_tokens is None:
-            max_tokens = 2048
+import requests
 
-        # Step 1: Get event ID
-        payload = {
-            "data": [
-                message,
-                chat_history,
-                system_prompt,
-                temperature,
-                max_tokens,
-                top_p,
-                50,  # top_k parameter
-            ]
-        }
+from .backends import ChatBackend, GradioBackend, create_backend, create_session
 
-        response = requests.post(f"{self.base_url}/call/chat_fn_1", json=payload)
-        event_id = response.json().get("event_id")
+# Earlier name of the Gradio backend
+ChatCompletions = GradioBackend
 
-        # Step 2: Get streaming response
-        # Note: Always use stream=True for HTTP request because Gradio returns SSE format
-        stream_url = f"{self.base_url}/call/chat_fn_1/{event_id}"
-        response = requests.get(stream_url, stream=True)
 
-        return response
+class Chat:
+    """Chat API."""
 
-    def create(
+    def __init__(
         self,
-        messages: List[dict],
+        completions: Union[ChatBackend, str],
         model: Optional[str] = None,
-        temperature: Optional[float] = 0.7,
-        max_tokens: Optional[int] = None,
-        top_p: Optional[float] = 1.0,
-        stream: Optional[bool] = False,
-        **kwargs,
-    ) -> Union[ChatCompletion, Iterator[ChatCompletionChunk]]:
-        """Create a chat completion.
-
-        Args:
-            messages: List of message dicts with 'role' and 'content'
-            model: Model name (uses instance model if not provided)
-            temperature: Sampling temperature (0-2)
-            max_tokens: Max tokens in response
-            top_p: Nucleus sampling (0-1)
-            stream: Whether to stream response
-            **kwargs: Additional parameters (ignored)
-
-        Returns:
-            ChatCompletion for non-streaming, Iterator[ChatCompletionChunk] for streaming
-        """
-        if model is None:
-            model = self.model
-
-        # Convert OpenAI message format to Gradio format
-        current_message, chat_history, system_prompt = format_messages_for_gradio(messages)
-
-        # Generate unique completion ID
-        completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
-
-        # Call Gradio API
-        response = self._call_gradio_api(
-            message=current_message,
-            chat_history=chat_history,
-            system_prompt=system_prompt,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            top_p=top_p,
-            stream=stream,
-        )
-
-        # Calculate prompt tokens
-        prompt_text = system_prompt or ""
-        for msg in messages:
-            prompt_text += msg.get("content", "")
-        prompt_tokens = estimate_tokens(prompt_text)
-
-        if stream:
-            return self._create_streaming_completion(
-                response, completion_id, model, prompt_tokens
-            )
-        else:
-            return self._create_completion(response, completion_id, model, prompt_tokens)
-
-    def _create_completion(
-        self, response: requests.Response, completion_id: str, model: str, prompt_tokens: int
-    ) -> ChatCompletion:
-        """Create a non-streaming completion.
-
-        Args:
-            response: Gradio API response
-            completion_id: Unique completion ID
-            model: Model name
-            prompt_tokens: Number of prompt tokens
-
-        Returns:
-            ChatCompletion object
-        """
-        # Parse complete response
-        content = self.parser.parse_complete_response(response)
-
-        if content is None:
-            content = ""
-
-        # Estimate completion tokens
-        completion_tokens = estimate_tokens(content)
-
-        return create_chat_completion(
-            completion_id=completion_id,
-            model=model,
-            content=content,
-            prompt_tokens=prompt_tokens,
-            completion_tokens=completion_tokens,
-        )
+        session: Optional[requests.Session] = None,
+        transport: str = "call",
+        idle_timeout: Optional[float] = 45.0,
+    ):
+        """Initialize chat API.
 
-    def _create_streaming_completion(
-        self, response: requests.Response, completion_id: str, model: str, prompt_tokens: int
-    ) -> Iterator[ChatCompletionChunk]:
-        """Create a streaming completion.
+        ``Chat(base_url, model, session, transport, idle_timeout)``, the
+        signature before backends existed, still builds a GradioBackend but
+        is deprecated.
 
         Args:
-            response: Gradio API response
-            completion_id: Unique completion ID
-            model: Model name
-            prompt_tokens: Number of prompt tokens
-
-        Yields:
-            ChatCompletionChunk objects
+            completions: Backend serving chat completions (or, deprecated,
+                the base URL of a Gradio API)
+            model: Model name (deprecated form only)
+            session: Pooled HTTP session (deprecated form only)
+            transport: Upstream transport (deprecated form only)
+            idle_timeout: Max seconds of upstream silence (deprecated form only)
         """
-        # First chunk with role
-        yield create_chat_completion_chunk(
-            completion_id=completion_id,
-            model=model,
-            role="assistant",
-        )
-
-        # Stream content deltas
-        for delta in self.parser.parse_streaming_response(response):
-            yield create_chat_completion_chunk(
-                completion_id=completion_id,
-                model=model,
-                content=delta,
+        if isinstance(completions, str):
+            warnings.warn(
+                "Chat(base_url, model, ...) is deprecated; pass a backend, e.g. Chat(GradioBackend(base_url, model))",
+                DeprecationWarning,
+                stacklevel=2,
             )
-
-        # Final chunk with finish_reason
-        yield create_chat_completion_chunk(
-            completion_id=completion_id,
-            model=model,
-            finish_reason="stop",
-        )
-
-
-class Chat:
-    """Chat API."""
-
-    def __init__(self, base_url: str, model: str):
-        """Initialize chat API.
-
-        Args:
-            base_url: Base URL of Gradio API
-            model: Model name
-        """
-        self.completions = ChatCompletions(base_url, model)
+            completions = GradioBackend(
+                completions, model, session, idle_timeout=idle_timeout, transport=transport
+            )
+        self.completions = completions
 
 
 class BharatGenOpenAI:
@@ -229,21 +57,46 @@ class BharatGenOpenAI:
         base_url: Optional[str] = None,
         model: str = "bharatgen-param-17b",
         api_key: Optional[str] = None,
+        pool_size: int = 64,
+        transport: str = "call",
+        idle_timeout: Optional[float] = 45.0,
+        backend: Optional[str] = None,
+        upstream_model: Optional[str] = None,
     ):
         """Initialize BharatGen OpenAI client.
 
         Args:
-            base_url: Base URL of Gradio API (defaults to env var BHARATGEN_BASE_URL)
+            base_url: Base URL of the upstream API (defaults to env var BHARATGEN_BASE_URL)
             model: Model name
-            api_key: API key (not currently used, for compatibility)
+            api_key: API key sent to an OpenAI-compatible upstream (unused
+                by the Gradio backend)
+            pool_size: Max pooled upstream connections per host
+            transport: Gradio transport: 'call' (one SSE connection per
+                completion) or 'queue' (one shared queue stream)
+            idle_timeout: Max seconds of upstream silence before a
+                completion fails
+            backend: 'gradio' for a Gradio chat app, or 'openai' for an
+                OpenAI-compatible inference server such as vLLM or TGI
+                (defaults to env var BHARATGEN_BACKEND, then 'gradio')
+            upstream_model: Model name an OpenAI-compatible upstream serves
+                (default: ``model``)
         """
         if base_url is None:
             base_url = os.getenv(
                 "BHARATGEN_BASE_URL",
                 "https://1df79b03590242911b.gradio.live/gradio_api"
             )
+        if backend is None:
+            backend = os.getenv("BHARATGEN_BACKEND", "gradio")
 
         self.base_url = base_url
         self.model = model
         self.api_key = api_key
-        self.chat = Chat(base_url, model)
+        self.session = create_session(pool_size)
+        if backend == "gradio":
+            options: Dict[str, Any] = {"transport": transport}
+        else:
+            options = {"upstream_model": upstream_model, "api_key": api_key}
+        self.chat = Chat(
+            create_backend(backend, base_url, model, self.session, idle_timeout=idle_timeout, **options)
+        )
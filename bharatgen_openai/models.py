@@ -1,7 +1,7 @@
 """OpenAI-compatible data models."""
 
 from typing import Optional, List, Literal
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_serializer
 import time
 
 
@@ -11,11 +11,17 @@ class ChatCompletionMessage(BaseModel):
     content: Optional[str] = None
 
 
+class CompletionTokensDetails(BaseModel):
+    """Breakdown of completion tokens."""
+    reasoning_tokens: int = 0
+
+
 class Usage(BaseModel):
     """Token usage information."""
     prompt_tokens: int
-    completion_tokens: int
+    completion_tokens: int  # Including reasoning tokens
     total_tokens: int
+    completion_tokens_details: Optional[CompletionTokensDetails] = None
 
 
 class Choice(BaseModel):
@@ -39,6 +45,15 @@ class DeltaMessage(BaseModel):
     """A delta message for streaming."""
     role: Optional[Literal["system", "user", "assistant"]] = None
     content: Optional[str] = None
+    # The model's thinking, only sent when the request asks for it
+    reasoning_content: Optional[str] = None
+
+    @model_serializer(mode="wrap")
+    def _omit_reasoning(self, handler):
+        data = handler(self)
+        if data.get("reasoning_content") is None:
+            data.pop("reasoning_content", None)
+        return data
 
 
 class ChoiceDelta(BaseModel):
@@ -55,6 +70,7 @@ class ChatCompletionChunk(BaseModel):
     created: int
     model: str
     choices: List[ChoiceDelta]
+    usage: Optional[Usage] = None
 
 
 class Model(BaseModel):
@@ -81,6 +97,12 @@ class ChatCompletionRequest(BaseModel):
     top_p: Optional[float] = Field(default=1.0, ge=0.0, le=1.0)
     n: Optional[int] = Field(default=1, ge=1)
     stop: Optional[List[str]] = None
+    # Stream the model's thinking as reasoning_content deltas (server default if unset)
+    include_reasoning: Optional[bool] = None
+    # Shrinks or skips the thinking phase (per-key default if unset)
+    reasoning_effort: Optional[Literal["minimal", "low", "medium", "high"]] = None
+    # Return a job id right away and run the completion in the background
+    background: Optional[bool] = False
 
 
 class ErrorResponse(BaseModel):
@@ -105,6 +127,8 @@ def create_chat_completion(
     content: str,
     prompt_tokens: int,
     completion_tokens: int,
+    finish_reason: Literal["stop", "length", "content_filter"] = "stop",
+    reasoning_tokens: Optional[int] = None,
 ) -> ChatCompletion:
     """Create a ChatCompletion object.
 
@@ -113,7 +137,9 @@ def create_chat_completion(
         model: Model name
         content: Assistant's response content
         prompt_tokens: Number of tokens in prompt
-        completion_tokens: Number of tokens in completion
+        completion_tokens: Number of tokens in completion (including reasoning)
+        finish_reason: Why generation stopped
+        reasoning_tokens: How many of the completion tokens were thinking
 
     Returns:
         ChatCompletion object
@@ -126,13 +152,31 @@ def create_chat_completion(
             Choice(
                 index=0,
                 message=ChatCompletionMessage(role="assistant", content=content),
-                finish_reason="stop",
+                finish_reason=finish_reason,
             )
         ],
-        usage=Usage(
-            prompt_tokens=prompt_tokens,
-            completion_tokens=completion_tokens,
-            total_tokens=prompt_tokens + completion_tokens,
+        usage=create_usage(prompt_tokens, completion_tokens, reasoning_tokens),
+    )
+
+
+def create_usage(prompt_tokens: int, completion_tokens: int, reasoning_tokens: Optional[int] = None) -> Usage:
+    """Create a Usage object.
+
+    Args:
+        prompt_tokens: Number of tokens in prompt
+        completion_tokens: Number of tokens in completion (including reasoning)
+        reasoning_tokens: How many of the completion tokens were thinking,
+            if known
+
+    Returns:
+        Usage object
+    """
+    return Usage(
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+        completion_tokens_details=(
+            None if reasoning_tokens is None else CompletionTokensDetails(reasoning_tokens=reasoning_tokens)
         ),
     )
 
@@ -143,6 +187,8 @@ def create_chat_completion_chunk(
     content: Optional[str] = None,
     role: Optional[Literal["assistant"]] = None,
     finish_reason: Optional[Literal["stop", "length", "content_filter"]] = None,
+    usage: Optional[Usage] = None,
+    reasoning_content: Optional[str] = None,
 ) -> ChatCompletionChunk:
     """Create a ChatCompletionChunk object.
 
@@ -152,6 +198,8 @@ def create_chat_completion_chunk(
         content: Delta content (new text since last chunk)
         role: Role (only in first chunk)
         finish_reason: Finish reason (only in last chunk)
+        usage: Token usage of the whole completion (only in last chunk)
+        reasoning_content: Delta of the model's thinking
 
     Returns:
         ChatCompletionChunk object
@@ -163,8 +211,9 @@ def create_chat_completion_chunk(
         choices=[
             ChoiceDelta(
                 index=0,
-                delta=DeltaMessage(role=role, content=content),
+                delta=DeltaMessage(role=role, content=content, reasoning_content=reasoning_content),
                 finish_reason=finish_reason,
             )
         ],
+        usage=usage,
     )
@@ -0,0 +1,255 @@
+"""Gradio response parsing on a bounded worker pool.
+
+Decoding cumulative Gradio snapshots and cleaning their HTML is CPU-bound
+Python. Completions read their upstream on worker threads, but those still
+hold the GIL while they parse, which every other connection feels as event
+loop lag. A ``ParsePool`` runs that work on a fixed number of slots: threads
+(bounding how many streams parse at once) or processes (taking the work off
+the server's GIL entirely).
+
+Each stream is pinned to one slot, which keeps the stream's incremental
+extractor, so its snapshots are parsed in order and in linear time. A
+stream hands over everything one network read delivered as a batch and
+waits for the result before reading again. While the pool is busy,
+snapshots pile up in the socket and the next batch covers all of them
+(snapshots are cumulative, so no delta is lost), and a full socket buffer
+slows the upstream down.
+"""
+
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Union
+
+from .metrics import REGISTRY
+from .parser import GradioResponseParser, HtmlUpdate, StreamingContentExtractor
+
+PARSE_BATCH_EVENTS = REGISTRY.histogram(
+    "bharatgen_parse_batch_events",
+    "Upstream events parsed per parse pool batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+PARSE_POOL_SECONDS = REGISTRY.histogram(
+    "bharatgen_parse_pool_seconds",
+    "Seconds a stream waited for a parse pool batch, queueing included",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+PARSE_POOL_STREAMS = REGISTRY.gauge(
+    "bharatgen_parse_pool_streams",
+    "Streams parsed by each parse pool slot",
+    ["slot"],
+)
+
+PARSE_POOL_KINDS = ("thread", "process")
+
+
+class BatchResult(NamedTuple):
+    """State of a stream after a batch."""
+
+    content: Optional[str]  # Clean text so far, None if the batch had none
+    thoughts: str  # Thought text so far (empty unless requested)
+    seconds: float  # Time spent parsing in the slot
+
+
+# Stream id -> incremental extractor, in whichever process runs the slot
+_extractors: Dict[str, StreamingContentExtractor] = {}
+_get_html = GradioResponseParser().get_html
+
+
+def parse_batch(stream_id: str, items: List[Union[str, list, HtmlUpdate]], reasoning: bool) -> BatchResult:
+    """Feed a batch of upstream events to a stream's extractor.
+
+    Args:
+        stream_id: Stream the events belong to
+        items: Raw SSE data (JSON text), already decoded output data, or
+            the HTML of queue job events, in arrival order
+        reasoning: Keep the thought section
+
+    Returns:
+        The stream's content and thoughts after the batch
+    """
+    start = time.perf_counter()
+    extractor = _extractors.get(stream_id)
+    if extractor is None:
+        extractor = _extractors[stream_id] = StreamingContentExtractor(keep_thoughts=reasoning)
+    content = None
+    for item in items:
+        if isinstance(item, HtmlUpdate):
+            content = extractor.append(item.text) if item.appended else extractor.update(item.text)
+            continue
+        if isinstance(item, str):
+            try:
+                item = json.loads(item)
+            except json.JSONDecodeError:
+                continue
+        html = _get_html(item)
+        if isinstance(html, str):
+            content = extractor.update(html)
+    thoughts = extractor.thoughts() if reasoning else ""
+    return BatchResult(content, thoughts, time.perf_counter() - start)
+
+
+def release_stream(stream_id: str):
+    """Forget a finished stream's extractor."""
+    _extractors.pop(stream_id, None)
+
+
+def _serve_slot(connection):
+    """Run a process slot: answer parse requests until the pipe closes."""
+    # Ctrl+C and reloads reach the whole process group, but they're the
+    # server's business; SIGTERM still works, multiprocessing relies on it
+    for name in ("SIGINT", "SIGHUP"):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), signal.SIG_IGN)
+    while True:
+        try:
+            request = connection.recv()
+        except EOFError:
+            return
+        if request is None:
+            return
+        stream_id, items, reasoning = request
+        if items is None:
+            release_stream(stream_id)
+            continue
+        try:
+            connection.send(parse_batch(stream_id, items, reasoning))
+        except Exception as e:
+            connection.send(RuntimeError(f"Parse worker failed: {e!r}"))
+
+
+class _ProcessSlot:
+    """One worker process; callers take turns on its pipe."""
+
+    def __init__(self, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_serve_slot, args=(child,), daemon=True, name="parse")
+        self.process.start()
+        child.close()
+        self.lock = threading.Lock()
+
+    def parse(self, stream_id: str, items: list, reasoning: bool) -> BatchResult:
+        with self.lock:
+            try:
+                self.connection.send((stream_id, items, reasoning))
+                result = self.connection.recv()
+            except (EOFError, OSError) as e:
+                raise RuntimeError("Parse worker exited") from e
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def release(self, stream_id: str):
+        with self.lock:
+            try:
+                self.connection.send((stream_id, None, False))
+            except OSError:
+                pass
+
+    def close(self):
+        with self.lock:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+            self.connection.close()
+        self.process.join(timeout=1)
+
+
+class _ThreadSlot:
+    """One worker thread."""
+
+    def __init__(self):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="parse")
+
+    def parse(self, stream_id: str, items: list, reasoning: bool) -> BatchResult:
+        return self.executor.submit(parse_batch, stream_id, items, reasoning).result()
+
+    def release(self, stream_id: str):
+        self.executor.submit(release_stream, stream_id)
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ParsePool:
+    """Fixed set of parse slots that streams are spread across."""
+
+    def __init__(self, kind: str = "thread", workers: Optional[int] = None):
+        """Initialize pool (slots start with ``start``).
+
+        Args:
+            kind: 'thread' or 'process'
+            workers: Number of slots (default: CPU count)
+
+        Raises:
+            ValueError: If the kind is unknown
+        """
+        if kind not in PARSE_POOL_KINDS:
+            raise ValueError(f"Unknown parse pool {kind!r} (expected one of {', '.join(PARSE_POOL_KINDS)})")
+        self.kind = kind
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self._slots: list = []
+        self._streams: List[int] = [0] * self.workers
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the slots.
+
+        Process slots are forked, so start the pool before the server
+        starts other threads (and without re-importing the app, which
+        spawning would do).
+        """
+        with self._lock:
+            if self._slots:
+                return
+            if self.kind == "process":
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context("fork" if "fork" in methods else None)
+                self._slots = [_ProcessSlot(context) for _ in range(self.workers)]
+            else:
+                self._slots = [_ThreadSlot() for _ in range(self.workers)]
+
+    def open(self) -> int:
+        """Pin a new stream to the slot with the fewest streams; returns the slot."""
+        self.start()
+        with self._lock:
+            slot = min(range(self.workers), key=self._streams.__getitem__)
+            self._streams[slot] += 1
+            PARSE_POOL_STREAMS.set(self._streams[slot], slot=str(slot))
+        return slot
+
+    def parse(self, slot: int, stream_id: str, items: list, reasoning: bool) -> BatchResult:
+        """Parse a batch of a stream on its slot (blocks until done).
+
+        Args:
+            slot: Slot returned by open
+            stream_id: Id of the stream, unique while it's open
+            items: Raw SSE data, decoded output data or HtmlUpdates, in arrival order
+            reasoning: Keep the thought section
+
+        Returns:
+            The stream's content and thoughts after the batch
+        """
+        start = time.perf_counter()
+        result = self._slots[slot].parse(stream_id, items, reasoning)
+        PARSE_BATCH_EVENTS.observe(len(items))
+        PARSE_POOL_SECONDS.observe(time.perf_counter() - start)
+        return result
+
+    def close_stream(self, slot: int, stream_id: str):
+        """Free a finished stream's state on its slot."""
+        self._slots[slot].release(stream_id)
+        with self._lock:
+            self._streams[slot] -= 1
+            PARSE_POOL_STREAMS.set(self._streams[slot], slot=str(slot))
+
+    def close(self):
+        """Stop the slots."""
+        for slot in self._slots:
+            slot.close()
+        self._slots = []
@@ -2,22 +2,94 @@
 
 import json
 import re
+import time
+import uuid
 from html.parser import HTMLParser
-from typing import Optional, Iterator
+from typing import NamedTuple, Optional, Iterator, Union
+
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+from .adapters.gradio_adapter import estimate_tokens
+from .metrics import UPSTREAM_BYTES, UPSTREAM_BYTES_PER_TOKEN, UPSTREAM_TOKENS
+from .sse import iter_sse_batches, iter_sse_events
+from .tracing import NULL_TRACE, FIRST_BYTE, FIRST_EVENT, FIRST_TOKEN, PARSE
+from .transport import Estimation, UpstreamError, UpstreamTimeoutError
+
+
+_LABELS = ('🧠 Thinking...', '🔍 Debug: Raw Response')
+
+
+class Reasoning(NamedTuple):
+    """Text of the model's thinking, passed along next to the answer."""
+
+    text: str
+
+
+class HtmlUpdate(NamedTuple):
+    """Assistant HTML of one queue job event, as handed to a parse pool slot."""
+
+    text: str  # HTML appended since the stream's previous event, or all of it
+    appended: bool
+
+
+def _join_text(parts: list, pending: list) -> str:
+    """Join committed text nodes and the one still being received."""
+    if pending:
+        text = "".join(pending).strip()
+        if text and text not in _LABELS:
+            parts = parts + [text]
+    # Remove the � character that appears in responses
+    return " ".join(parts).replace('\ufffd', '').strip()
+
+
+def _error_message(data) -> str:
+    """Message of an upstream ``error`` event's decoded data."""
+    return data if isinstance(data, str) and data else "Upstream generation failed"
 
 
 class GradioHTMLParser(HTMLParser):
-    """Custom HTML parser to filter out thought process and debug info."""
+    """Custom HTML parser to filter out thought process and debug info.
+
+    The parser can be fed incrementally: text between two tags is buffered
+    until the next tag, so feeding HTML in pieces gives the same result as
+    feeding it at once.
+    """
 
-    def __init__(self):
+    def __init__(self, keep_thoughts: bool = False):
+        """Initialize parser.
+
+        Args:
+            keep_thoughts: Collect the thought section's text (see
+                get_thoughts) instead of only dropping it
+        """
         super().__init__()
         self.result = []
+        self.pending = []
+        self.keep_thoughts = keep_thoughts
+        self.thoughts = []
+        self.thought_pending = []
+        self.in_thought = False
         self.skip_section = False
         self.in_details = False
         self.details_class = None
 
+    def flush_text(self):
+        """Commit the buffered text node to the result."""
+        if self.pending:
+            text = "".join(self.pending).strip()
+            self.pending = []
+            if text and text not in _LABELS:
+                self.result.append(text)
+        if self.thought_pending:
+            text = "".join(self.thought_pending).strip()
+            self.thought_pending = []
+            if text and text not in _LABELS:
+                self.thoughts.append(text)
+
     def handle_starttag(self, tag, attrs):
         """Track opening tags and filter thought/debug sections."""
+        self.flush_text()
         attrs_dict = dict(attrs)
 
         # Check for details tags
@@ -29,6 +101,7 @@ class GradioHTMLParser(HTMLParser):
             # Skip thought process details
             if "thought" in self.details_class:
                 self.skip_section = True
+                self.in_thought = True
             # Skip debug details (check for opacity or font-size in style)
             elif "opacity" in self.details_style or ("font-size" in self.details_style and "0.85em" in self.details_style):
                 self.skip_section = True
@@ -42,8 +115,10 @@ class GradioHTMLParser(HTMLParser):
 
     def handle_endtag(self, tag):
         """Track closing tags and reset filters."""
+        self.flush_text()
         if tag == "details":
             self.in_details = False
+            self.in_thought = False
             self.skip_section = False
             self.details_class = None
             self.details_style = None
@@ -55,25 +130,81 @@ class GradioHTMLParser(HTMLParser):
     def handle_data(self, data):
         """Collect data that's not in filtered sections."""
         if not self.skip_section:
-            # Only add non-empty, non-whitespace-only data
-            text = data.strip()
-            if text and text not in ['🧠 Thinking...', '🔍 Debug: Raw Response']:
-                self.result.append(text)
+            self.pending.append(data)
+        elif self.in_thought and self.keep_thoughts:
+            self.thought_pending.append(data)
 
     def get_text(self) -> str:
         """Get the cleaned text result."""
-        # Join and clean up any duplicate text or special characters
-        text = " ".join(self.result)
-        # Remove the � character that appears in responses
-        text = text.replace('\ufffd', '')
-        return text.strip()
+        # Include the text node still being received, without committing it
+        return _join_text(self.result, self.pending)
+
+    def get_thoughts(self) -> str:
+        """Get the thought section's text (empty unless keep_thoughts is set)."""
+        return _join_text(self.thoughts, self.thought_pending)
+
+
+class StreamingContentExtractor:
+    """Extract clean text from successive snapshots of one assistant message.
+
+    When a snapshot extends the previous one (the usual case for both
+    cumulative /call/ events and applied queue diffs) only the new HTML is
+    fed to the parser, so parsing a whole stream is linear in its length.
+    """
+
+    def __init__(self, keep_thoughts: bool = False):
+        self.html = ""
+        self.keep_thoughts = keep_thoughts
+        self.html_parser = GradioHTMLParser(keep_thoughts)
+
+    def update(self, html: str) -> Optional[str]:
+        """Feed the latest snapshot of the assistant HTML.
+
+        Args:
+            html: Full assistant HTML so far
+
+        Returns:
+            Clean text content so far, or None if there is none yet
+        """
+        if len(html) >= len(self.html) and html.startswith(self.html):
+            return self.append(html[len(self.html):])
+        # Upstream rewrote earlier content: start over
+        self.html = ""
+        self.html_parser = GradioHTMLParser(self.keep_thoughts)
+        return self.append(html)
+
+    def append(self, new_html: str) -> Optional[str]:
+        """Feed HTML that extends the previous snapshot.
+
+        Args:
+            new_html: Assistant HTML received since the previous snapshot
+
+        Returns:
+            Clean text content so far, or None if there is none yet
+        """
+        self.html += new_html
+        if new_html:
+            self.html_parser.feed(new_html)
+        text = self.html_parser.get_text()
+        return text if text else None
+
+    def thoughts(self) -> str:
+        """Thought text so far (empty unless keep_thoughts is set)."""
+        return self.html_parser.get_thoughts()
 
 
 class GradioResponseParser:
     """Parser for Gradio SSE responses."""
 
-    def __init__(self):
+    def __init__(self, pool=None):
+        """Initialize parser.
+
+        Args:
+            pool: ParsePool that streamed content is parsed on (None parses
+                on the reading thread)
+        """
         self.html_parser = GradioHTMLParser()
+        self.pool = pool
 
     def parse_sse_line(self, line: str) -> Optional[dict]:
         """Parse a single SSE line.
@@ -105,8 +236,8 @@ class GradioResponseParser:
 
         return None
 
-    def extract_content(self, data: dict) -> Optional[str]:
-        """Extract clean text content from Gradio response data.
+    def get_html(self, data: list) -> Optional[str]:
+        """Get the raw assistant HTML from Gradio response data.
 
         Gradio structure: [[{user_msg}, {assistant_msg}], ""]
         We want: data[0][1]['content'][0]['text']
@@ -115,7 +246,7 @@ class GradioResponseParser:
             data: Parsed JSON data from Gradio SSE response
 
         Returns:
-            Clean text content, or None if no content found
+            Assistant HTML, or None if the structure doesn't match
         """
         try:
             # Check if data is a list with at least one element
@@ -145,54 +276,311 @@ class GradioResponseParser:
             if not isinstance(text_item, dict) or "text" not in text_item:
                 return None
 
-            html_text = text_item["text"]
+            return text_item["text"]
+
+        except (KeyError, IndexError, TypeError):
+            return None
 
-            # Parse HTML to remove thought process and debug info
-            self.html_parser = GradioHTMLParser()  # Reset parser
-            self.html_parser.feed(html_text)
-            clean_text = self.html_parser.get_text()
+    def extract_content(self, data: dict) -> Optional[str]:
+        """Extract clean text content from Gradio response data.
 
-            return clean_text if clean_text else None
+        Args:
+            data: Parsed JSON data from Gradio SSE response
 
-        except (KeyError, IndexError, TypeError):
+        Returns:
+            Clean text content, or None if no content found
+        """
+        html_text = self.get_html(data)
+        if not isinstance(html_text, str):
             return None
 
-    def parse_streaming_response(self, response) -> Iterator[str]:
+        # Parse HTML to remove thought process and debug info.
+        # Use a fresh local parser so concurrent requests sharing this
+        # instance (server worker threads) don't feed the same parser.
+        html_parser = GradioHTMLParser()
+        html_parser.feed(html_text)
+        clean_text = html_parser.get_text()
+
+        return clean_text if clean_text else None
+
+    def iter_data(self, response, trace=NULL_TRACE) -> Iterator[list]:
+        """Yield parsed Gradio output data from an upstream stream.
+
+        Args:
+            response: requests.Response with SSE content from /call/, or a
+                QueueJob from the queue transport
+            trace: Request trace for phase timings
+
+        Yields:
+            Output data payloads (``[[user, assistant], ""]``)
+        """
+        for data, _ in self._iter_sized_data(response, trace):
+            yield data
+
+    def _iter_sized_data(self, response, trace=NULL_TRACE, estimations: bool = False) -> Iterator[tuple]:
+        """Like iter_data, but also yields the upstream bytes each payload took.
+
+        With ``estimations``, queue position updates of a QueueJob are passed
+        through as ``(Estimation, 0)``.
+        """
+        if hasattr(response, "iter_data"):
+            received = 0
+            try:
+                for data in response.iter_data(estimations):
+                    if isinstance(data, Estimation):
+                        yield data, 0
+                        continue
+                    trace.mark(FIRST_BYTE)
+                    trace.mark(FIRST_EVENT)
+                    yield data, response.bytes_received - received
+                    received = response.bytes_received
+            finally:
+                # Cancels the job upstream if it was abandoned
+                response.close()
+            return
+
+        try:
+            for event in iter_sse_events(response):
+                trace.mark(FIRST_BYTE)
+                if event.event == "heartbeat":
+                    continue  # Liveness only; it resets the read timeout
+                trace.mark(FIRST_EVENT)
+
+                start = time.perf_counter()
+                try:
+                    data = json.loads(event.data)
+                except json.JSONDecodeError:
+                    data = None
+                trace.add(PARSE, time.perf_counter() - start)
+
+                if event.event == "error":
+                    raise UpstreamError(_error_message(data))
+                if data is not None:
+                    yield data, event.size
+                if event.event == "complete":
+                    return  # Don't wait for upstream to close the stream
+        except (requests.Timeout, ReadTimeoutError, TimeoutError) as e:
+            raise UpstreamTimeoutError(f"Upstream stream idle for too long: {e}") from e
+        finally:
+            response.close()
+
+        raise UpstreamError("Upstream stream ended before completing")
+
+    def _iter_batches(self, response, trace=NULL_TRACE) -> Iterator[tuple]:
+        """Yield the undecoded data of the events each network read completed.
+
+        Yields:
+            ``(data, size)``: the JSON text of the read's data events, in
+            order, and the upstream bytes they took
+        """
+        try:
+            for events in iter_sse_batches(response):
+                trace.mark(FIRST_BYTE)
+                batch, size = [], 0
+                for event in events:
+                    if event.event == "heartbeat":
+                        continue
+                    if event.event == "error":
+                        if batch:
+                            yield batch, size  # Content before the error still counts
+                        try:
+                            data = json.loads(event.data)
+                        except json.JSONDecodeError:
+                            data = None
+                        raise UpstreamError(_error_message(data))
+                    trace.mark(FIRST_EVENT)
+                    batch.append(event.data)
+                    size += event.size
+                    if event.event == "complete":
+                        yield batch, size
+                        return
+                if batch:
+                    yield batch, size
+        except (requests.Timeout, ReadTimeoutError, TimeoutError) as e:
+            raise UpstreamTimeoutError(f"Upstream stream idle for too long: {e}") from e
+        finally:
+            response.close()
+
+        raise UpstreamError("Upstream stream ended before completing")
+
+    def _iter_pooled_content(
+        self, response, trace=NULL_TRACE, totals: Optional[list] = None, estimations: bool = False, reasoning: bool = False
+    ) -> Iterator[Union[str, Estimation, Reasoning]]:
+        """_iter_content on the parse pool, one batch per network read."""
+        if hasattr(response, "iter_data"):
+            batches = self._iter_html_updates(response, trace, estimations)
+        else:
+            batches = self._iter_batches(response, trace)
+
+        slot = self.pool.open()
+        stream_id = uuid.uuid4().hex
+        upstream_bytes = 0
+        try:
+            for batch, size in batches:
+                if isinstance(batch, Estimation):
+                    yield batch
+                    continue
+                upstream_bytes += size
+                if totals is not None:
+                    totals[0] = upstream_bytes
+
+                result = self.pool.parse(slot, stream_id, batch, reasoning)
+                trace.add(PARSE, result.seconds)
+                if result.thoughts:
+                    yield Reasoning(result.thoughts)
+                if result.content is not None:
+                    yield result.content
+        finally:
+            batches.close()
+            self.pool.close_stream(slot, stream_id)
+
+    def _iter_html_updates(self, response, trace=NULL_TRACE, estimations: bool = False) -> Iterator[tuple]:
+        """Batches of a queue job for the parse pool, one per event.
+
+        The queue transport rebuilds each event's output in this process,
+        so a slot only gets the HTML appended since the previous event.
+        Sending the whole output every time would pickle a process slot
+        the answer once per event, quadratic in its length.
+
+        Yields:
+            ``([HtmlUpdate], size)``, or ``(Estimation, 0)``
+        """
+        html = ""
+        data_items = self._iter_sized_data(response, trace, estimations)
+        try:
+            for data, size in data_items:
+                if isinstance(data, Estimation):
+                    yield data, 0
+                    continue
+                current = self.get_html(data)
+                if not isinstance(current, str):
+                    yield [], size
+                    continue
+                if len(current) >= len(html) and current.startswith(html):
+                    update = HtmlUpdate(current[len(html):], appended=True)
+                else:
+                    update = HtmlUpdate(current, appended=False)
+                html = current
+                yield [update], size
+        finally:
+            data_items.close()
+
+    def _record_transfer(self, response, upstream_bytes: int, content: Optional[str]):
+        """Record upstream bytes per emitted token for a finished stream."""
+        transport = "queue" if hasattr(response, "iter_data") else "call"
+        tokens = estimate_tokens(content or "")
+        UPSTREAM_BYTES.inc(upstream_bytes, transport=transport)
+        UPSTREAM_TOKENS.inc(tokens, transport=transport)
+        if tokens:
+            UPSTREAM_BYTES_PER_TOKEN.observe(upstream_bytes / tokens, transport=transport)
+
+    def _iter_content(
+        self,
+        response,
+        trace=NULL_TRACE,
+        totals: Optional[list] = None,
+        estimations: bool = False,
+        reasoning: bool = False,
+    ) -> Iterator[Union[str, Estimation, Reasoning]]:
+        """Yield the clean content so far after each upstream event.
+
+        Args:
+            response: requests.Response or QueueJob
+            trace: Request trace for phase timings
+            totals: Single-element list receiving the upstream byte count
+            estimations: Pass queue position updates through as Estimation
+            reasoning: Also yield the thought text so far as Reasoning,
+                before the content of the same event
+
+        Yields:
+            Clean text content so far (only when there is some)
+        """
+        if self.pool is not None:
+            yield from self._iter_pooled_content(response, trace, totals, estimations, reasoning)
+            return
+
+        extractor = StreamingContentExtractor(keep_thoughts=reasoning)
+        upstream_bytes = 0
+
+        data_items = self._iter_sized_data(response, trace, estimations)
+        try:
+            for data, size in data_items:
+                if isinstance(data, Estimation):
+                    yield data
+                    continue
+                upstream_bytes += size
+                if totals is not None:
+                    totals[0] = upstream_bytes
+
+                start = time.perf_counter()
+                html_text = self.get_html(data)
+                content = extractor.update(html_text) if isinstance(html_text, str) else None
+                thoughts = extractor.thoughts() if reasoning else ""
+                trace.add(PARSE, time.perf_counter() - start)
+                if thoughts:
+                    yield Reasoning(thoughts)
+                if content is not None:
+                    yield content
+        finally:
+            # Stopping early closes the upstream stream (or cancels the queue job)
+            data_items.close()
+
+    def parse_streaming_response(
+        self, response, trace=NULL_TRACE, estimations: bool = False, reasoning: bool = False
+    ) -> Iterator[Union[str, Estimation, Reasoning]]:
         """Parse streaming SSE response from Gradio.
 
         Args:
-            response: requests.Response object with streaming content
+            response: requests.Response object with streaming content, or a
+                QueueJob
+            trace: Request trace for phase timings
+            estimations: Also yield queue position updates (QueueJob only)
+            reasoning: Also yield the thought section's deltas as Reasoning
 
         Yields:
-            Clean text deltas (incremental content)
+            Clean text deltas (incremental content), Reasoning deltas if
+            requested, and Estimation items while the job waits in the
+            upstream queue if requested
         """
         previous_content = ""
+        previous_reasoning = ""
+        totals = [0]
 
-        for line in response.iter_lines(decode_unicode=True):
-            if not line:
-                continue
-
-            # Parse SSE line
-            data = self.parse_sse_line(line)
-            if data is None:
+        for current_content in self._iter_content(response, trace, totals, estimations, reasoning):
+            if isinstance(current_content, Estimation):
+                yield current_content
                 continue
-
-            # Extract content
-            current_content = self.extract_content(data)
-            if current_content is None:
+            if isinstance(current_content, Reasoning):
+                if len(current_content.text) > len(previous_reasoning):
+                    delta = current_content.text[len(previous_reasoning):]
+                    previous_reasoning = current_content.text
+                    yield Reasoning(delta)
                 continue
-
             # Calculate delta (new content since last update)
             if len(current_content) > len(previous_content):
                 delta = current_content[len(previous_content):]
                 previous_content = current_content
+                trace.mark(FIRST_TOKEN)
                 yield delta
 
-    def parse_complete_response(self, response) -> Optional[str]:
+        self._record_transfer(response, totals[0], previous_content)
+
+    def parse_complete_response(
+        self,
+        response,
+        trace=NULL_TRACE,
+        result: Optional[dict] = None,
+        thinking_budget: Optional[int] = None,
+    ) -> Optional[str]:
         """Parse complete (non-streaming) response from Gradio.
 
         Args:
-            response: requests.Response object
+            response: requests.Response object, or a QueueJob
+            trace: Request trace for phase timings
+            result: Receives the thought text as ``reasoning``, and
+                ``truncated`` if the thinking budget ran out
+            thinking_budget: Max estimated thinking tokens before the
+                upstream stream is closed (needs ``result``)
 
         Returns:
             Complete clean text content
@@ -200,17 +588,25 @@ class GradioResponseParser:
         # For non-streaming, we still need to parse SSE format
         # Just get the final content
         final_content = None
+        totals = [0]
 
-        for line in response.iter_lines(decode_unicode=True):
-            if not line:
-                continue
-
-            data = self.parse_sse_line(line)
-            if data is None:
-                continue
-
-            content = self.extract_content(data)
-            if content is not None:
+        items = self._iter_content(response, trace, totals, reasoning=result is not None)
+        try:
+            for content in items:
+                if isinstance(content, Reasoning):
+                    result["reasoning"] = content.text
+                    if (
+                        thinking_budget is not None
+                        and final_content is None
+                        and estimate_tokens(content.text) > thinking_budget
+                    ):
+                        result["truncated"] = True
+                        return None
+                    continue
+                trace.mark(FIRST_TOKEN)
                 final_content = content
+        finally:
+            items.close()
 
+        self._record_transfer(response, totals[0], final_content)
         return final_content
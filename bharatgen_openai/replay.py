@@ -0,0 +1,225 @@
+"""Replay captured traffic against a server.
+
+Usage:
+    python -m bharatgen_openai.replay capture.jsonl --url http://localhost:8000
+    python -m bharatgen_openai.replay capture.jsonl --speed 4      # 4x the captured rate
+    python -m bharatgen_openai.replay capture.jsonl --speed max    # everything at once
+
+Reads a capture written with ``BHARATGEN_CAPTURE_FILE`` and sends each
+request at its captured arrival time, scaled by ``--speed``. Arrivals are
+open-loop: a request is sent on schedule whether or not earlier ones have
+finished, so a slow server sees the load pile up as it would in
+production. Latency is measured from the scheduled arrival, so time spent
+waiting for a free client worker counts against the server rather than
+hiding it. Reports latency, time to first token and error rates, next to
+what the capture recorded.
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple, Optional
+
+import requests
+
+
+class Result(NamedTuple):
+    """Outcome of one replayed request (times in seconds)."""
+
+    lag: float  # From the scheduled arrival until the request was sent
+    status: Optional[int]  # None when no response arrived
+    ttft: Optional[float]  # Streams only, from the scheduled arrival
+    latency: float  # From the scheduled arrival until the answer ended
+    error: Optional[str]
+
+
+def load_capture(path: str) -> List[dict]:
+    """Read capture records, oldest arrival first."""
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    return sorted(records, key=lambda record: record["timestamp"])
+
+
+def arrival_offsets(records: List[dict], speed: Optional[float]) -> List[float]:
+    """Seconds after the start at which each record is sent (None speed: all at once)."""
+    if not records or speed is None:
+        return [0.0] * len(records)
+    first = records[0]["timestamp"]
+    return [(record["timestamp"] - first) / speed for record in records]
+
+
+_local = threading.local()
+
+
+def _session() -> requests.Session:
+    # Sessions aren't thread-safe, so each worker keeps its own
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def send(url: str, api_key: str, body: dict, scheduled: float, timeout: float) -> Result:
+    """Send one request and read its answer to the end.
+
+    Args:
+        url: Chat completions URL
+        api_key: Bearer key
+        body: Request body
+        scheduled: perf_counter time the request was due
+        timeout: Seconds to wait for the response and between chunks
+
+    Returns:
+        Result of the request
+    """
+    lag = time.perf_counter() - scheduled
+    ttft = None
+    try:
+        response = _session().post(
+            url,
+            json=body,
+            headers={"Authorization": f"Bearer {api_key}"},
+            stream=bool(body.get("stream")),
+            timeout=timeout,
+        )
+        error = None
+        if response.status_code >= 400:
+            error = f"HTTP {response.status_code}"
+            response.close()
+        elif body.get("stream"):
+            for line in response.iter_lines(decode_unicode=True):
+                if not line or not line.startswith("data: {"):
+                    continue
+                event = json.loads(line[6:])
+                if "error" in event:
+                    error = event["error"].get("code") or event["error"].get("type") or "stream error"
+                elif ttft is None and event["choices"] and event["choices"][0]["delta"].get("content"):
+                    ttft = time.perf_counter() - scheduled
+        else:
+            response.content  # Read the whole answer
+        return Result(lag, response.status_code, ttft, time.perf_counter() - scheduled, error)
+    except requests.RequestException as e:
+        return Result(lag, None, ttft, time.perf_counter() - scheduled, type(e).__name__)
+
+
+def replay(
+    records: List[dict],
+    url: str,
+    api_key: str,
+    speed: Optional[float] = 1.0,
+    max_inflight: int = 256,
+    timeout: float = 300.0,
+    model: Optional[str] = None,
+) -> List[Result]:
+    """Send captured requests at their (scaled) arrival times.
+
+    Args:
+        records: Capture records, oldest first
+        url: Server base URL
+        api_key: Bearer key used for every request
+        speed: Multiple of the captured rate (None sends everything at once)
+        max_inflight: Max requests in flight; later arrivals wait for a
+            worker, and the wait counts towards their latency
+        timeout: Seconds to wait for a response and between chunks
+        model: Send every request to this model instead of the captured one
+
+    Returns:
+        Results in arrival order
+    """
+    endpoint = url.rstrip("/") + "/v1/chat/completions"
+    offsets = arrival_offsets(records, speed)
+    futures = []
+    with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix="replay") as executor:
+        start = time.perf_counter()
+        for record, offset in zip(records, offsets):
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            body = dict(record["request"])
+            if model is not None:
+                body["model"] = model
+            futures.append(executor.submit(send, endpoint, api_key, body, scheduled, timeout))
+    return [future.result() for future in futures]
+
+
+def _percentiles(values: List[float]) -> str:
+    """p50, p90, p99 and max in milliseconds (nearest rank)."""
+    ordered = sorted(values)
+    if not ordered:
+        return f"{'-':>9}{'-':>9}{'-':>9}{'-':>9}"
+
+    def rank(q):
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return "".join(f"{value * 1000:>9.1f}" for value in (rank(0.5), rank(0.9), rank(0.99), ordered[-1]))
+
+
+def report(records: List[dict], results: List[Result], elapsed: float, speed: Optional[float]) -> dict:
+    """Print latency distributions and error rates; return them as a dict."""
+    errors = Counter(result.error for result in results if result.error is not None)
+    ok = [result for result in results if result.error is None]
+    captured_ok = [record for record in records if not record.get("error") and record.get("latency_ms") is not None]
+    span = records[-1]["timestamp"] - records[0]["timestamp"] if records else 0.0
+
+    print(f"Replayed {len(results)} requests in {elapsed:.1f} s at {'max speed' if speed is None else f'{speed:g}x'}")
+    if span > 0:
+        print(f"Captured rate {len(records) / span:.2f} req/s, replayed {len(results) / max(elapsed, 1e-9):.2f} req/s")
+    print(f"Errors: {sum(errors.values())} ({sum(errors.values()) / max(len(results), 1):.1%})")
+    for error, count in errors.most_common():
+        print(f"  {error}: {count}")
+    print(f"\n{'ms':<22}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    print(f"{'latency':<22}{_percentiles([r.latency for r in ok])}")
+    print(f"{'latency (captured)':<22}{_percentiles([r['latency_ms'] / 1000 for r in captured_ok])}")
+    print(f"{'ttft':<22}{_percentiles([r.ttft for r in ok if r.ttft is not None])}")
+    print(f"{'ttft (captured)':<22}{_percentiles([r['ttft_ms'] / 1000 for r in captured_ok if r.get('ttft_ms') is not None])}")
+    print(f"{'send lag':<22}{_percentiles([r.lag for r in results])}")
+
+    return {
+        "requests": len(results),
+        "elapsed_s": round(elapsed, 3),
+        "speed": speed,
+        "errors": dict(errors),
+        "results": [result._asdict() for result in results],
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    arg_parser.add_argument("capture", help="Capture JSONL file (BHARATGEN_CAPTURE_FILE)")
+    arg_parser.add_argument("--url", default="http://localhost:8000", help="Server base URL")
+    arg_parser.add_argument(
+        "--api-key",
+        default=os.getenv("BHARATGEN_API_KEY", "sk-test-key"),
+        help="Bearer key for every request (default: BHARATGEN_API_KEY)",
+    )
+    arg_parser.add_argument("--speed", default="1", help="Multiple of the captured rate, or 'max'")
+    arg_parser.add_argument("--max-inflight", type=int, default=256, help="Max requests in flight")
+    arg_parser.add_argument("--timeout", type=float, default=300.0, help="Seconds to wait for a response")
+    arg_parser.add_argument("--model", help="Send every request to this model")
+    arg_parser.add_argument("--limit", type=int, help="Only replay the first N requests")
+    arg_parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = arg_parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    if speed is not None and speed <= 0:
+        arg_parser.error("--speed must be positive or 'max'")
+    records = load_capture(args.capture)[: args.limit]
+    if not records:
+        print(f"No requests in {args.capture}")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    results = replay(records, args.url, args.api_key, speed, args.max_inflight, args.timeout, args.model)
+    summary = report(records, results, time.perf_counter() - start, speed)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
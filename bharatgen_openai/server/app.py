@@ -1,12 +1,19 @@
 """FastAPI server for OpenAI-compatible API."""
 
+import asyncio
 import os
 import json
-from typing import Optional
-from fastapi import FastAPI, HTTPException, Security, Depends
+import math
+import signal
+import time
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Callable, Dict, Optional, Sequence, Tuple
+from fastapi import FastAPI, HTTPException, Security, Depends, Request, WebSocket, WebSocketDisconnect
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
 
 from ..models import (
     ChatCompletionRequest,
@@ -15,34 +22,241 @@ from ..models import (
     Model,
     ErrorResponse,
 )
-from ..client import BharatGenOpenAI
+from ..backends import REASONING_EFFORTS, create_backend, create_session
+from ..transport import Estimation, UpstreamError, UpstreamTimeoutError
+from ..metrics import REGISTRY
+from ..parse_pool import ParsePool
+from .lifecycle import DrainController, LoopLagMonitor, ServerDrainingError, install_reload_handler, read_env_file
+from .profiling import MemoryTracer, ProfilerBusyError, SamplingProfiler
+from .capture import TrafficCapture, load_redactor
+from .jobs import Job, JobNotFoundError, JobStore, JobStoreFullError
+from .resume import StreamExpiredError, StreamStore
+from .routing import (
+    Lease,
+    ModelNotFoundError,
+    ModelOverloadedError,
+    ModelRegistry,
+    load_model_configs,
+)
+from .upstream import UpstreamProber
+from .ratelimit import RateLimiter, RateLimitExceeded, create_rate_limit_backend_from_env
+from .shadow import Outcome, ShadowMirror
+from .usage import UsageLedger, api_key_id
+from .websocket import ChatSocket
+from ..adapters.gradio_adapter import estimate_tokens
+from ..tracing import (
+    RequestTrace,
+    create_exporter_from_env,
+    ADMISSION,
+    AUTH,
+    FIRST_EVENT,
+    FIRST_TOKEN,
+    SERIALIZE,
+    VALIDATION,
+)
+
+
+# Env file whose values override the environment and are re-read on reload
+CONFIG_FILE = os.getenv("BHARATGEN_CONFIG_FILE")
+
+
+def parse_reasoning_efforts(spec: str) -> Dict[str, str]:
+    """Parse per-key reasoning efforts (``key=effort,key=effort``).
+
+    Raises:
+        ValueError: If an entry is malformed or an effort is unknown
+    """
+    efforts = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        key, sep, effort = entry.rpartition("=")
+        if not sep or not key or effort not in REASONING_EFFORTS:
+            raise ValueError(f"Invalid reasoning effort entry: {entry!r}")
+        efforts[key] = effort
+    return efforts
+
+
+def load_reloadable_config() -> dict:
+    """Read the settings that can change without a restart.
+
+    Keys, upstreams and per-model limits come from the environment,
+    overridden by CONFIG_FILE; the models file is re-read as well.
+
+    Returns:
+        Dict with api_keys, admin_keys, metrics_keys, base_url, model_name, models_file,
+        model_configs, rate_limits, shadow_sample_rate, reasoning_effort
+        and key_reasoning_efforts
+
+    Raises:
+        OSError, ValueError: If a config file can't be read or is invalid
+    """
+    env = {**os.environ, **read_env_file(CONFIG_FILE)}
+    config = {
+        "api_keys": set(env.get("BHARATGEN_API_KEYS", "sk-test-key").split(",")),
+        # Admin endpoints (profiling) use their own keys; unset disables them
+        "admin_keys": {key for key in env.get("BHARATGEN_ADMIN_KEYS", "").split(",") if key},
+        # Scrape-only keys for /metrics (admin keys work too); none set disables it
+        "metrics_keys": {key for key in env.get("BHARATGEN_METRICS_KEYS", "").split(",") if key},
+        "base_url": env.get(
+            "BHARATGEN_BASE_URL",
+            "https://1df79b03590242911b.gradio.live/gradio_api"
+        ),
+        "model_name": env.get("BHARATGEN_MODEL_NAME", "bharatgen-param-17b"),
+        # JSON routing table of served models; unset serves model_name from base_url
+        "models_file": env.get("BHARATGEN_MODELS_FILE"),
+        # Per-key limits; 0 disables a limit
+        "rate_limits": {
+            "requests_per_second": float(env.get("BHARATGEN_RATE_LIMIT_RPS", "0")),
+            "burst": float(env["BHARATGEN_RATE_LIMIT_BURST"]) if env.get("BHARATGEN_RATE_LIMIT_BURST") else None,
+            "tokens_per_minute": float(env.get("BHARATGEN_RATE_LIMIT_TPM", "0")),
+        },
+        # Fraction of completions mirrored to BHARATGEN_SHADOW_URL
+        "shadow_sample_rate": min(max(float(env.get("BHARATGEN_SHADOW_SAMPLE_RATE", "0.05")), 0.0), 1.0),
+        # reasoning_effort of requests that don't set one; unset keeps the model's defaults
+        "reasoning_effort": env.get("BHARATGEN_REASONING_EFFORT") or None,
+        "key_reasoning_efforts": parse_reasoning_efforts(env.get("BHARATGEN_KEY_REASONING_EFFORTS", "")),
+    }
+    if config["reasoning_effort"] not in (None, *REASONING_EFFORTS):
+        raise ValueError(f"Unknown BHARATGEN_REASONING_EFFORT: {config['reasoning_effort']}")
+    config["model_configs"] = load_model_configs(
+        config["models_file"], config["model_name"], config["base_url"]
+    )
+    return config
 
 
 # Configuration
-API_KEYS = set(
-    os.getenv("BHARATGEN_API_KEYS", "sk-test-key").split(",")
-)
-BASE_URL = os.getenv(
-    "BHARATGEN_BASE_URL",
-    "https://1df79b03590242911b.gradio.live/gradio_api"
-)
-MODEL_NAME = "bharatgen-param-17b"
+_config = load_reloadable_config()
+API_KEYS = _config["api_keys"]
+BASE_URL = _config["base_url"]
+ADMIN_KEYS = _config["admin_keys"]
+METRICS_KEYS = _config["metrics_keys"]
+MODEL_NAME = _config["model_name"]
+MODELS_FILE = _config["models_file"]
+REASONING_EFFORT = _config["reasoning_effort"]
+KEY_REASONING_EFFORTS = _config["key_reasoning_efforts"]
+DRAIN_TIMEOUT = float(os.getenv("BHARATGEN_DRAIN_TIMEOUT", "300"))
+ADAPTIVE_LIMIT = os.getenv("BHARATGEN_ADAPTIVE_LIMIT", "false").lower() in ("1", "true", "yes")
+QUEUE_TIMEOUT = float(os.getenv("BHARATGEN_QUEUE_TIMEOUT", "30"))
+MAX_QUEUE = int(os.getenv("BHARATGEN_MAX_QUEUE", "256"))
+TRACE_EXPORTER = create_exporter_from_env()
+POOL_SIZE = int(os.getenv("BHARATGEN_POOL_SIZE", "64"))
+TRANSPORT = os.getenv("BHARATGEN_TRANSPORT", "call")
+BACKEND = os.getenv("BHARATGEN_BACKEND", "gradio")
+UPSTREAM_API_KEY = os.getenv("BHARATGEN_UPSTREAM_API_KEY") or None
+# Route conversations to the replica that cached their prefix ('prefix_affinity')
+ROUTING = os.getenv("BHARATGEN_ROUTING", "least_loaded")
+AFFINITY_LOAD_FACTOR = float(os.getenv("BHARATGEN_AFFINITY_LOAD_FACTOR", "1.25"))
+UPSTREAM_IDLE_TIMEOUT = float(os.getenv("BHARATGEN_UPSTREAM_IDLE_TIMEOUT", "45"))
+PROBE_INTERVAL = float(os.getenv("BHARATGEN_PROBE_INTERVAL", "15"))
+PROBE_TIMEOUT = float(os.getenv("BHARATGEN_PROBE_TIMEOUT", "5"))
+WARM_CONNECTIONS = int(os.getenv("BHARATGEN_WARM_CONNECTIONS", "4"))
+WS_MAX_TURNS = int(os.getenv("BHARATGEN_WS_MAX_TURNS", "8"))
+WS_AUTH_TIMEOUT = float(os.getenv("BHARATGEN_WS_AUTH_TIMEOUT", "10"))
+RATE_LIMIT_SYNC_INTERVAL = float(os.getenv("BHARATGEN_RATE_LIMIT_SYNC_INTERVAL", "1"))
+USAGE_DB = os.getenv("BHARATGEN_USAGE_DB", "usage.db")
+USAGE_FLUSH_INTERVAL = float(os.getenv("BHARATGEN_USAGE_FLUSH_INTERVAL", "5"))
+SHADOW_URL = os.getenv("BHARATGEN_SHADOW_URL") or None
+SHADOW_BACKEND = os.getenv("BHARATGEN_SHADOW_BACKEND", BACKEND)
+SHADOW_UPSTREAM_MODEL = os.getenv("BHARATGEN_SHADOW_UPSTREAM_MODEL") or None
+SHADOW_MAX_CONCURRENCY = int(os.getenv("BHARATGEN_SHADOW_MAX_CONCURRENCY", "4"))
+QUEUE_COMMENTS = os.getenv("BHARATGEN_QUEUE_COMMENTS", "false").lower() in ("1", "true", "yes")
+# Stream the model's thinking unless the request says otherwise
+STREAM_REASONING = os.getenv("BHARATGEN_STREAM_REASONING", "false").lower() in ("1", "true", "yes")
+# Seconds of upstream silence before a stream gets an SSE comment (0 disables)
+SSE_HEARTBEAT = float(os.getenv("BHARATGEN_SSE_HEARTBEAT", "10"))
+JOB_MAX_JOBS = int(os.getenv("BHARATGEN_JOB_MAX_JOBS", "1000"))
+JOB_TTL = float(os.getenv("BHARATGEN_JOB_TTL", "3600"))
+# Sampled requests and their outcomes, for replay (see bharatgen_openai.replay)
+CAPTURE_FILE = os.getenv("BHARATGEN_CAPTURE_FILE") or None
+CAPTURE_SAMPLE_RATE = min(max(float(os.getenv("BHARATGEN_CAPTURE_SAMPLE_RATE", "0.1")), 0.0), 1.0)
+CAPTURE_REDACT = os.getenv("BHARATGEN_CAPTURE_REDACT", "default")
+RESUME_GRACE = float(os.getenv("BHARATGEN_RESUME_GRACE", "30"))
+RESUME_BUFFER = int(os.getenv("BHARATGEN_RESUME_BUFFER", "4096"))
+# Where Gradio responses are parsed: 'off' (the reading thread), 'thread' or 'process'
+PARSE_POOL = os.getenv("BHARATGEN_PARSE_POOL", "off")
+PARSE_WORKERS = int(os.getenv("BHARATGEN_PARSE_WORKERS", "0")) or None
+LOOP_LAG_INTERVAL = float(os.getenv("BHARATGEN_LOOP_LAG_INTERVAL", "0.1"))
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Warm up upstream connections and keep probing while the server runs.
+
+    SIGHUP reloads the config; SIGTERM drains active requests before the
+    server shuts down.
+    """
+    if parse_pool is not None:
+        # Forks process workers, so before this module's background threads
+        # (trace and capture writers, prober, ledger) start
+        parse_pool.start()
+    if TRACE_EXPORTER is not None:
+        TRACE_EXPORTER.start()
+    prober.start()
+    ledger.start()
+    rate_limiter.start()
+    drainer.install(signal.SIGTERM)
+    remove_reload_handler = install_reload_handler(reload_on_signal)
+    loop_lag.start()
+    yield
+    await loop_lag.stop()
+    remove_reload_handler()
+    await jobs.close()
+    await streams.close()
+    prober.stop()
+    rate_limiter.stop()
+    ledger.close()
+    if shadow is not None:
+        shadow.close()
+    if parse_pool is not None:
+        parse_pool.close()
+    if TRACE_EXPORTER is not None:
+        TRACE_EXPORTER.close()
+
 
 # Initialize FastAPI app
 app = FastAPI(
     title="BharatGen OpenAI-Compatible API",
     description="OpenAI-compatible API wrapper for BharatGen",
     version="0.1.0",
+    lifespan=lifespan,
 )
 
 # Security
 security = HTTPBearer()
 
 
-def verify_api_key(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Attach a RequestTrace to each request and report its timings.
+
+    The summary is returned in the ``Server-Timing`` header along with the
+    ``x-request-id``. Streaming responses are exported when the stream ends,
+    everything else as soon as the response is ready.
+    """
+    trace = RequestTrace(
+        request_id=request.headers.get("x-request-id"),
+        exporter=TRACE_EXPORTER,
+    )
+    trace.attributes["path"] = request.url.path
+    request.state.trace = trace
+
+    response = await call_next(request)
+
+    trace.attributes["status"] = response.status_code
+    response.headers["x-request-id"] = trace.request_id
+    response.headers["Server-Timing"] = trace.server_timing()
+    if not trace.attributes.get("stream"):
+        trace.finish()
+    return response
+
+
+def verify_api_key(
+    request: Request,
+    credentials: HTTPAuthorizationCredentials = Security(security),
+) -> str:
     """Verify API key.
 
     Args:
+        request: Incoming request (carries the trace)
         credentials: HTTP authorization credentials
 
     Returns:
@@ -51,25 +265,223 @@ def verify_api_key(credentials: HTTPAuthorizationCredentials = Security(security
     Raises:
         HTTPException: If API key is invalid
     """
-    api_key = credentials.credentials
-    if api_key not in API_KEYS:
+    with request.state.trace.span(AUTH):
+        api_key = credentials.credentials
+        if api_key not in API_KEYS:
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid API key",
+            )
+    # Body validation runs after dependencies, so it starts here
+    request.state.auth_done = time.perf_counter()
+    return api_key
+
+
+def verify_admin_key(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
+    """Verify admin API key.
+
+    Args:
+        credentials: HTTP authorization credentials
+
+    Returns:
+        Admin key if valid
+
+    Raises:
+        HTTPException: If admin endpoints are disabled or the key is invalid
+    """
+    if not ADMIN_KEYS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if credentials.credentials not in ADMIN_KEYS:
         raise HTTPException(
             status_code=401,
-            detail="Invalid API key",
+            detail="Invalid admin key",
         )
-    return api_key
+    return credentials.credentials
+
+
+def verify_metrics_key(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
+    """Verify a metrics or admin key.
+
+    Args:
+        credentials: HTTP authorization credentials
+
+    Returns:
+        Key if valid
+
+    Raises:
+        HTTPException: If metrics are disabled or the key is invalid
+    """
+    if not METRICS_KEYS and not ADMIN_KEYS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if credentials.credentials not in METRICS_KEYS and credentials.credentials not in ADMIN_KEYS:
+        raise HTTPException(
+            status_code=401,
+            detail="Invalid metrics key",
+        )
+    return credentials.credentials
+
+
+# Initialize model routing
+session = create_session(
+    POOL_SIZE, hosts=len({url for config in _config["model_configs"] for url in config.endpoints})
+)
+prober = UpstreamProber(
+    session,
+    [],
+    interval=PROBE_INTERVAL,
+    timeout=PROBE_TIMEOUT,
+    warm_connections=WARM_CONNECTIONS,
+)
+parse_pool = None if PARSE_POOL == "off" else ParsePool(PARSE_POOL, PARSE_WORKERS)
+loop_lag = LoopLagMonitor(LOOP_LAG_INTERVAL)
+registry = ModelRegistry(
+    _config["model_configs"],
+    session,
+    transport=TRANSPORT,
+    idle_timeout=UPSTREAM_IDLE_TIMEOUT or None,
+    adaptive=ADAPTIVE_LIMIT,
+    on_estimation=prober.record_queue,
+    backend=BACKEND,
+    upstream_api_key=UPSTREAM_API_KEY,
+    routing=ROUTING,
+    affinity_load_factor=AFFINITY_LOAD_FACTOR,
+    parse_pool=parse_pool,
+)
+prober.set_base_urls(registry.endpoint_urls(), registry.probe_paths())
+profiler = SamplingProfiler()
+memory_tracer = MemoryTracer()
+drainer = DrainController(grace_period=DRAIN_TIMEOUT)
+ledger = UsageLedger(USAGE_DB, flush_interval=USAGE_FLUSH_INTERVAL)
+rate_limiter = RateLimiter(
+    **_config["rate_limits"],
+    backend=create_rate_limit_backend_from_env(),
+    sync_interval=RATE_LIMIT_SYNC_INTERVAL,
+)
+
 
+def create_shadow_mirror() -> Optional[ShadowMirror]:
+    """Create the shadow mirror if BHARATGEN_SHADOW_URL is set.
 
-# Initialize client
-client = BharatGenOpenAI(base_url=BASE_URL, model=MODEL_NAME)
+    The shadow upstream gets its own connection pool, so mirrored requests
+    never hold connections the primary upstreams need.
+    """
+    if not SHADOW_URL:
+        return None
+    if SHADOW_BACKEND == "gradio":
+        options = {"transport": TRANSPORT}
+    else:
+        options = {"upstream_model": SHADOW_UPSTREAM_MODEL, "api_key": UPSTREAM_API_KEY}
+    backend = create_backend(
+        SHADOW_BACKEND,
+        SHADOW_URL,
+        MODEL_NAME,
+        create_session(SHADOW_MAX_CONCURRENCY, hosts=1),
+        idle_timeout=UPSTREAM_IDLE_TIMEOUT or None,
+        **options,
+    )
+    return ShadowMirror(
+        backend, sample_rate=_config["shadow_sample_rate"], max_concurrency=SHADOW_MAX_CONCURRENCY
+    )
+
+
+shadow = create_shadow_mirror()
+jobs = JobStore(JOB_MAX_JOBS, JOB_TTL)
+capture = (
+    TrafficCapture(CAPTURE_FILE, CAPTURE_SAMPLE_RATE, load_redactor(CAPTURE_REDACT)) if CAPTURE_FILE else None
+)
+if capture is not None:
+    # Sampled requests are written when their traces finish
+    TRACE_EXPORTER = capture.wrap(TRACE_EXPORTER)
+streams = StreamStore(RESUME_GRACE, RESUME_BUFFER)
+
+
+def reload_config() -> dict:
+    """Apply new keys, upstreams and limits without dropping connections.
+
+    In-flight requests finish on the endpoints they were routed to; the
+    pooled session (and its open connections) is kept.
+
+    Returns:
+        Summary of the reloaded config
+
+    Raises:
+        OSError, ValueError: If the new config is invalid (nothing changes)
+    """
+    global API_KEYS, ADMIN_KEYS, METRICS_KEYS, BASE_URL, MODEL_NAME, MODELS_FILE, REASONING_EFFORT, KEY_REASONING_EFFORTS
+
+    config = load_reloadable_config()
+    registry.update(config["model_configs"])
+    prober.set_base_urls(registry.endpoint_urls(), registry.probe_paths())
+    rate_limiter.configure(**config["rate_limits"])
+    if shadow is not None:
+        shadow.sample_rate = config["shadow_sample_rate"]
+    API_KEYS = config["api_keys"]
+    ADMIN_KEYS = config["admin_keys"]
+    METRICS_KEYS = config["metrics_keys"]
+    BASE_URL = config["base_url"]
+    MODEL_NAME = config["model_name"]
+    MODELS_FILE = config["models_file"]
+    REASONING_EFFORT = config["reasoning_effort"]
+    KEY_REASONING_EFFORTS = config["key_reasoning_efforts"]
+    return {
+        "status": "reloaded",
+        "api_keys": len(API_KEYS),
+        "models": [model.id for model in registry.configs()],
+        "upstreams": registry.endpoint_urls(),
+    }
+
+
+def reload_on_signal():
+    """SIGHUP handler: reload, keeping the old config on errors."""
+    try:
+        summary = reload_config()
+        print(f"Config reloaded: {summary['models']} via {summary['upstreams']}")
+    except (OSError, ValueError) as e:
+        print(f"Config reload failed, keeping the previous config: {e}")
 
 
 @app.get("/health")
 async def health_check():
-    """Health check endpoint."""
+    """Health check endpoint (liveness; doesn't touch the upstream)."""
     return {"status": "ok"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint.
+
+    Reports the prober's cached upstream state; it never probes per call.
+    It's unauthenticated, so it only gives counts; per-upstream detail is
+    on /admin/upstreams.
+
+    Returns:
+        200 if at least one upstream is healthy, 503 otherwise or while
+        draining for shutdown
+    """
+    ready = prober.is_ready() and not drainer.draining
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "ready" if ready else "draining" if drainer.draining else "not_ready",
+            "upstreams": len(prober.base_urls),
+            "healthy_upstreams": sum(prober.is_healthy(url) for url in prober.base_urls),
+            **drainer.status(),
+        },
+    )
+
+
+@app.get("/admin/upstreams")
+async def get_upstreams(admin_key: str = Depends(verify_admin_key)):
+    """Cached probe result and queue estimate per upstream URL."""
+    return prober.status()
+
+
+@app.get("/metrics")
+async def metrics(key: str = Depends(verify_metrics_key)):
+    """Prometheus metrics endpoint (labels include upstream URLs, so it needs a key)."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
 @app.get("/v1/models")
 async def list_models(api_key: str = Depends(verify_api_key)):
     """List available models.
@@ -80,10 +492,11 @@ async def list_models(api_key: str = Depends(verify_api_key)):
     return ModelList(
         data=[
             Model(
-                id=MODEL_NAME,
-                created=1706745600,
-                owned_by="bharatgen",
+                id=config.id,
+                created=config.created,
+                owned_by=config.owned_by,
             )
+            for config in registry.configs()
         ]
     )
 
@@ -91,77 +504,764 @@ async def list_models(api_key: str = Depends(verify_api_key)):
 @app.post("/v1/chat/completions")
 async def create_chat_completion(
     request: ChatCompletionRequest,
+    http_request: Request,
     api_key: str = Depends(verify_api_key),
 ):
     """Create a chat completion.
 
     Args:
         request: Chat completion request
+        http_request: Underlying HTTP request (carries the trace)
         api_key: Verified API key
 
     Returns:
         Chat completion response (JSON or SSE stream)
     """
+    trace = http_request.state.trace
+    trace.record(VALIDATION, http_request.state.auth_done, time.perf_counter())
+    trace.attributes["model"] = request.model
+    trace.attributes["stream"] = bool(request.stream)
+
+    last_event_id = http_request.headers.get("last-event-id")
+    if request.stream and last_event_id and RESUME_GRACE > 0:
+        # Reattach to the generation the client lost, even during a drain
+        try:
+            stream, after = streams.resume(last_event_id, api_key_id(api_key))
+        except StreamExpiredError as e:
+            return error_json(e)
+        trace.attributes.update(stream=False, resumed=True)
+        return StreamingResponse(stream.follow(after, SSE_HEARTBEAT or None), media_type="text/event-stream")
+
+    if capture is not None:
+        capture.sample(trace, api_key_id(api_key), request.model_dump(exclude_unset=True))
+
+    if drainer.draining:
+        return error_json(ServerDrainingError("Server is shutting down"))
+
+    drainer.begin()
+    streaming = False
     try:
-        # Convert Pydantic models to dicts for client
-        messages = [msg.model_dump() for msg in request.messages]
+        if request.background:
+            return submit_job(api_key, request)
 
-        # Call client
-        response = client.chat.completions.create(
-            messages=messages,
-            model=request.model,
-            temperature=request.temperature,
-            max_tokens=request.max_tokens,
-            top_p=request.top_p,
-            stream=request.stream,
-        )
+        lease, response = await open_completion(api_key, request, trace)
 
         # Handle streaming
         if request.stream:
-            return StreamingResponse(
-                stream_completion(response),
-                media_type="text/event-stream",
+            # The stream releases the endpoint and drain slot when it ends. The
+            # generator's finally only runs once it has started, so whatever
+            # runs it (the stream's task, or the response) finishes it as well.
+            finish = run_once(partial(finish_completion, api_key, lease, trace), drainer.end, trace.finish)
+            if RESUME_GRACE > 0:
+                # Generated on a task of its own, so a client that reconnects can pick it up
+                generation = streams.start(
+                    api_key_id(api_key),
+                    stream_completion(response, trace, on_finish=[finish], heartbeat=None),
+                )
+                generation.task.add_done_callback(lambda _: finish())
+                streaming = True
+                return StreamingResponse(
+                    generation.follow(heartbeat=SSE_HEARTBEAT or None), media_type="text/event-stream"
+                )
+            streaming = True
+            return FinishingStreamingResponse(
+                stream_completion(response, trace, on_finish=[finish]), finish, media_type="text/event-stream"
             )
         else:
             # Non-streaming response
-            return response
+            trace.attributes["prompt_tokens"] = response.usage.prompt_tokens
+            trace.attributes["completion_tokens"] = response.usage.completion_tokens
+            finish_completion(api_key, lease, trace)
+            with trace.span(SERIALIZE):
+                return JSONResponse(content=response.model_dump())
+
+    except Exception as e:
+        return error_json(e)
+    finally:
+        if not streaming:
+            drainer.end()
+
+
+async def open_completion(
+    api_key: str,
+    request: ChatCompletionRequest,
+    trace: RequestTrace,
+    queue_updates: bool = QUEUE_COMMENTS,
+    check_rate_limit: bool = True,
+):
+    """Admit a completion and start it on an upstream.
+
+    Checks the key's rate limits, waits for an endpoint slot and sends the
+    request upstream. If anything fails after the slot was claimed, the
+    slot is released before the error propagates.
+
+    Args:
+        api_key: Verified API key
+        request: Chat completion request
+        trace: Request trace
+        queue_updates: Pass upstream queue positions through the stream
+        check_rate_limit: Check the key's rate limits (off when they were
+            checked as a background job was submitted)
+
+    Returns:
+        Tuple of the endpoint lease (release it with finish_completion) and
+        the ChatCompletion or chunk iterator
+
+    Raises:
+        RateLimitExceeded, ModelNotFoundError, ModelOverloadedError,
+        UpstreamError: See completion_error
+    """
+    if check_rate_limit:
+        rate_limiter.check(api_key_id(api_key))
+    route = registry.get(request.model)
+    # Admission covers the wait for an endpoint slot and for a worker thread
+    submitted = time.perf_counter()
+    # Convert Pydantic models to dicts for client
+    messages = [msg.model_dump() for msg in request.messages]
+    lease = await route.acquire_waiting(
+        prober.is_healthy,
+        QUEUE_TIMEOUT,
+        MAX_QUEUE,
+        queue_depth=prober.queue_depth,
+        key=route.affinity_key(messages),
+    )
+    trace.attributes["upstream"] = lease.endpoint.url
+    # Parameters the client didn't set fall back to the model's defaults
+    params = {
+        name: getattr(request, name)
+        for name in ("temperature", "max_tokens", "top_p")
+        if name in request.model_fields_set
+    }
+    params["reasoning_effort"] = request.reasoning_effort or KEY_REASONING_EFFORTS.get(api_key, REASONING_EFFORT)
+    if params["reasoning_effort"] is not None:
+        trace.attributes["reasoning_effort"] = params["reasoning_effort"]
+
+    # Call client on a worker thread
+    def _create():
+        trace.record(ADMISSION, submitted, time.perf_counter())
+        return lease.client.create(
+            messages=messages,
+            model=route.config.id,
+            stream=request.stream,
+            trace=trace,
+            queue_updates=queue_updates,
+            include_reasoning=STREAM_REASONING if request.include_reasoning is None else request.include_reasoning,
+            **params,
+        )
+
+    if shadow is not None:
+        # Mirrored alongside the primary, not after it; the shadow is timed
+        # from its own dispatch. Same sampling parameters as the primary,
+        # including the model's defaults
+        shadow_params = {
+            name: value
+            for name, value in route.config.defaults.items()
+            if name in ("temperature", "max_tokens", "top_p")
+        }
+        shadow.mirror(trace, route.config.id, messages, {**shadow_params, **params})
+    try:
+        response = await run_in_threadpool(_create)
+    except BaseException as e:
+        if isinstance(e, UpstreamError):
+            trace.attributes["upstream_error"] = str(e)
+        finish_completion(api_key, lease, trace)
+        raise
+
+    return lease, response
+
+
+def completion_error(e: Exception) -> Tuple[int, ErrorResponse, Dict[str, str]]:
+    """Map a failed completion to its HTTP status, error body and headers."""
+    if isinstance(e, ServerDrainingError):
+        return 503, ErrorResponse.create(
+            message=str(e), type="server_unavailable", code="server_draining"
+        ), {"Retry-After": "1"}
+    if isinstance(e, RateLimitExceeded):
+        return 429, ErrorResponse.create(
+            message=str(e), type="rate_limit_error", code="rate_limit_exceeded"
+        ), {"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+    if isinstance(e, ModelNotFoundError):
+        return 404, ErrorResponse.create(
+            message=str(e), type="invalid_request_error", code="model_not_found"
+        ), {}
+    if isinstance(e, ModelOverloadedError):
+        return 429, ErrorResponse.create(
+            message=str(e), type="server_overloaded", code="model_overloaded"
+        ), {}
+    if isinstance(e, UpstreamTimeoutError):
+        return 504, ErrorResponse.create(
+            message=f"Upstream timeout: {str(e)}", type="upstream_error", code="upstream_timeout"
+        ), {}
+    if isinstance(e, UpstreamError):
+        return 502, ErrorResponse.create(message=f"Upstream error: {str(e)}", type="upstream_error"), {}
+    if isinstance(e, ValidationError):
+        return 400, ErrorResponse.create(
+            message=f"Validation error: {str(e)}", type="invalid_request_error"
+        ), {}
+    if isinstance(e, PermissionError):
+        return 401, ErrorResponse.create(
+            message=str(e), type="invalid_request_error", code="invalid_api_key"
+        ), {}
+    if isinstance(e, JobNotFoundError):
+        return 404, ErrorResponse.create(
+            message=str(e), type="invalid_request_error", code="job_not_found"
+        ), {}
+    if isinstance(e, StreamExpiredError):
+        return 410, ErrorResponse.create(
+            message=str(e), type="invalid_request_error", code="stream_expired"
+        ), {}
+    if isinstance(e, JobStoreFullError):
+        return 429, ErrorResponse.create(
+            message=str(e), type="server_overloaded", code="too_many_jobs"
+        ), {"Retry-After": "5"}
+    return 500, ErrorResponse.create(message=f"Internal server error: {str(e)}", type="internal_error"), {}
+
+
+def error_json(e: Exception) -> JSONResponse:
+    """JSON error response for a failed completion."""
+    status, error, headers = completion_error(e)
+    return JSONResponse(status_code=status, headers=headers, content=error.model_dump())
+
+
+@app.websocket("/v1/chat/ws")
+async def chat_socket(websocket: WebSocket):
+    """Chat over one WebSocket connection (see ``websocket.ChatSocket``).
+
+    The connection authenticates once, with an ``Authorization: Bearer``
+    header or an ``{"type": "auth", "api_key": ...}`` first frame, and then
+    carries many turns and concurrent generations.
+    """
+    await websocket.accept()
+    api_key = await authenticate_socket(websocket)
+    if api_key is None:
+        return
+    await websocket.send_text(json.dumps({"type": "ready"}))
+    socket = ChatSocket(
+        websocket,
+        partial(run_turn, api_key),
+        lambda e: completion_error(e)[1],
+        max_turns=WS_MAX_TURNS,
+    )
+    await socket.run()
+
+
+async def authenticate_socket(websocket: WebSocket) -> Optional[str]:
+    """Read the API key of a WebSocket connection; close it if invalid.
+
+    Returns:
+        Verified API key, or None (the connection is closed)
+    """
+    scheme, _, api_key = websocket.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer":
+        try:
+            frame = json.loads(await asyncio.wait_for(websocket.receive_text(), WS_AUTH_TIMEOUT))
+        except (asyncio.TimeoutError, json.JSONDecodeError, WebSocketDisconnect):
+            frame = None
+        api_key = frame.get("api_key") if isinstance(frame, dict) and frame.get("type") == "auth" else None
+    if api_key in API_KEYS:
+        return api_key
+    error = ErrorResponse.create(message="Invalid API key", type="invalid_request_error", code="invalid_api_key")
+    try:
+        await websocket.send_text(json.dumps({"type": "error", "turn": None, **error.model_dump()}))
+        await websocket.close(code=1008)
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    return None
+
+
+async def iterate_cancellable(iterator, heartbeat: Optional[float] = None):
+    """Like iterate_in_threadpool, but cancelling the consumer doesn't wait.
 
-    except ValidationError as e:
+    The item being fetched keeps its worker thread; once it arrives the
+    iterator is closed on a worker thread (a generator can't be closed
+    while another thread runs it), which closes the upstream stream. The
+    same happens when the consumer stops early.
+
+    Args:
+        iterator: Blocking iterator
+        heartbeat: Yield HEARTBEAT each time an item takes this many
+            seconds to arrive (None never does)
+    """
+    fetch = None
+    try:
+        while True:
+            fetch = asyncio.ensure_future(run_in_threadpool(next, iterator, _EXHAUSTED))
+            # Waiting doesn't cancel the fetch when the consumer is cancelled
+            while not (await asyncio.wait({fetch}, timeout=heartbeat))[0]:
+                yield HEARTBEAT
+            item = fetch.result()
+            if item is _EXHAUSTED:
+                fetch = None
+                return
+            yield item
+    finally:
+        if fetch is not None:
+            # A fetch cancelled at shutdown may still be running on its thread
+            fetch.add_done_callback(
+                lambda done: done.cancelled()
+                or asyncio.ensure_future(run_in_threadpool(getattr(iterator, "close", lambda: None)))
+            )
+
+
+_EXHAUSTED = object()
+HEARTBEAT = object()
+
+
+async def run_turn(
+    api_key: str,
+    request: ChatCompletionRequest,
+    send,
+    path: str = "/v1/chat/ws",
+    check_rate_limit: bool = True,
+) -> str:
+    """Stream one WebSocket turn or background job through the same admission path as HTTP.
+
+    Args:
+        api_key: API key the connection authenticated with
+        request: Validated chat request (always streaming)
+        send: Sends a frame (tagged with the turn id, or kept by the job)
+        path: Path recorded on the trace
+        check_rate_limit: See open_completion
+
+    Returns:
+        The assistant's full answer
+    """
+    if api_key not in API_KEYS:
+        raise PermissionError("API key is no longer valid")  # Revoked by a reload
+    trace = RequestTrace(exporter=TRACE_EXPORTER)
+    trace.attributes.update(path=path, model=request.model, stream=True)
+    if drainer.draining:
+        raise ServerDrainingError("Server is shutting down")
+
+    drainer.begin()
+    lease = None
+    content = []
+    try:
+        lease, chunks = await open_completion(
+            api_key, request, trace, queue_updates=True, check_rate_limit=check_rate_limit
+        )
+        async for chunk in iterate_cancellable(chunks):
+            if isinstance(chunk, Estimation):
+                await send({"type": "queue", **chunk._asdict()})
+                continue
+            if chunk.usage is not None:
+                trace.attributes["prompt_tokens"] = chunk.usage.prompt_tokens
+                trace.attributes["completion_tokens"] = chunk.usage.completion_tokens
+            if chunk.choices[0].delta.content:
+                content.append(chunk.choices[0].delta.content)
+            frame = chunk.model_dump()
+            if chunk.choices[0].finish_reason is not None:
+                frame["timings"] = trace.summary()
+            await send(frame)
+        return "".join(content)
+    except UpstreamError as e:
+        trace.attributes["upstream_error"] = str(e)
+        raise
+    finally:
+        if lease is not None:
+            if "completion_tokens" not in trace.attributes and content:
+                # Cancelled: bill what was generated so far
+                trace.attributes["prompt_tokens"] = estimate_tokens(
+                    "".join(message.content or "" for message in request.messages)
+                )
+                trace.attributes["completion_tokens"] = estimate_tokens("".join(content))
+            finish_completion(api_key, lease, trace)
+        drainer.end()
+        trace.finish()
+
+
+def submit_job(api_key: str, request: ChatCompletionRequest) -> JSONResponse:
+    """Start a background completion and return its job right away.
+
+    Rate limits and the model are checked here, so those errors come back
+    on the submitting request instead of as a failed job.
+
+    Args:
+        api_key: Verified API key
+        request: Chat completion request with ``background`` set
+
+    Returns:
+        202 response with the queued job
+
+    Raises:
+        RateLimitExceeded, ModelNotFoundError, JobStoreFullError: See completion_error
+    """
+    rate_limiter.check(api_key_id(api_key))
+    registry.get(request.model)
+    job = jobs.submit(
+        api_key_id(api_key),
+        request.model,
+        partial(
+            run_turn,
+            api_key,
+            request.model_copy(update={"stream": True, "background": False}),
+            path="/v1/chat/completions",
+            check_rate_limit=False,
+        ),
+        lambda e: completion_error(e)[1],
+    )
+    return JSONResponse(status_code=202, content=job.to_dict())
+
+
+@app.get("/v1/chat/completions/jobs/{job_id}")
+async def get_job(job_id: str, api_key: str = Depends(verify_api_key)):
+    """Status of a background completion, with its result once it completed."""
+    try:
+        return jobs.get(job_id, api_key_id(api_key)).to_dict()
+    except JobNotFoundError as e:
+        return error_json(e)
+
+
+@app.get("/v1/chat/completions/jobs/{job_id}/stream")
+async def stream_job(job_id: str, api_key: str = Depends(verify_api_key)):
+    """Follow a background completion as an SSE stream.
+
+    Replays the chunks produced so far, then streams the rest live.
+    Disconnecting doesn't affect the job.
+    """
+    try:
+        job = jobs.get(job_id, api_key_id(api_key))
+    except JobNotFoundError as e:
+        return error_json(e)
+    return StreamingResponse(follow_job(job), media_type="text/event-stream")
+
+
+async def follow_job(job: Job):
+    """SSE events of a background job: its chunks, then [DONE] or the error."""
+    async for frame in job.follow(heartbeat=SSE_HEARTBEAT or None):
+        if frame is None:
+            yield ": heartbeat\n\n"
+            continue
+        yield f"data: {json.dumps(frame)}\n\n"
+    if job.status == "completed":
+        yield "data: [DONE]\n\n"
+        return
+    error = job.error
+    if error is None:
+        error = ErrorResponse.create(
+            message="Background job was cancelled", type="invalid_request_error", code="job_cancelled"
+        ).model_dump()["error"]
+    yield f"data: {json.dumps({'error': error})}\n\n"
+
+
+@app.post("/v1/chat/completions/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str, api_key: str = Depends(verify_api_key)):
+    """Stop a background completion; tokens generated so far are billed."""
+    try:
+        job = jobs.cancel(job_id, api_key_id(api_key))
+    except JobNotFoundError as e:
+        return error_json(e)
+    if job.task is not None and not job.task.done():
+        await asyncio.wait({job.task})
+    return job.to_dict()
+
+
+@app.get("/admin/profile")
+async def profile_cpu(
+    seconds: float = 10.0,
+    interval_ms: float = 5.0,
+    admin_key: str = Depends(verify_admin_key),
+):
+    """Sample all threads for a while and return collapsed stacks.
+
+    The output can be fed straight into flamegraph.pl or speedscope.
+
+    Args:
+        seconds: Profile duration (max 120)
+        interval_ms: Sampling interval in milliseconds (min 1)
+        admin_key: Verified admin key
+
+    Returns:
+        Collapsed stack lines as plain text
+    """
+    seconds = min(max(seconds, 0.1), 120.0)
+    interval = max(interval_ms, 1.0) / 1000
+    try:
+        stacks = await run_in_threadpool(profiler.profile, seconds, interval)
+    except ProfilerBusyError as e:
+        return JSONResponse(
+            status_code=409,
+            content=ErrorResponse.create(message=str(e), type="conflict").model_dump(),
+        )
+    return PlainTextResponse(stacks)
+
+
+@app.post("/admin/memory/start")
+async def start_memory_tracing(frames: int = 1, admin_key: str = Depends(verify_admin_key)):
+    """Start tracemalloc and take the baseline snapshot."""
+    return memory_tracer.start(frames=min(max(frames, 1), 64))
+
+
+@app.get("/admin/memory/snapshot")
+async def memory_snapshot(
+    limit: int = 25,
+    key_type: str = "lineno",
+    admin_key: str = Depends(verify_admin_key),
+):
+    """Diff a new tracemalloc snapshot against the previous one."""
+    if key_type not in ("lineno", "filename", "traceback"):
+        return JSONResponse(
+            status_code=400,
+            content=ErrorResponse.create(message=f"Invalid key_type: {key_type}").model_dump(),
+        )
+    try:
+        return await run_in_threadpool(memory_tracer.snapshot_diff, limit, key_type)
+    except RuntimeError as e:
+        return JSONResponse(
+            status_code=409,
+            content=ErrorResponse.create(message=str(e), type="conflict").model_dump(),
+        )
+
+
+@app.post("/admin/memory/stop")
+async def stop_memory_tracing(admin_key: str = Depends(verify_admin_key)):
+    """Stop tracemalloc and drop stored snapshots."""
+    return memory_tracer.stop()
+
+
+@app.post("/admin/reload")
+async def reload_configuration(admin_key: str = Depends(verify_admin_key)):
+    """Reload keys, upstreams and limits (same as sending SIGHUP).
+
+    Returns:
+        Summary of the new config, or 400 (old config kept) if it's invalid
+    """
+    try:
+        return reload_config()
+    except (OSError, ValueError) as e:
         return JSONResponse(
             status_code=400,
             content=ErrorResponse.create(
-                message=f"Validation error: {str(e)}",
+                message=f"Reload failed, previous config kept: {str(e)}",
                 type="invalid_request_error",
             ).model_dump(),
         )
-    except Exception as e:
+
+
+@app.get("/v1/usage")
+async def get_usage(
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    model: Optional[str] = None,
+    group_by: Optional[str] = None,
+    api_key: str = Depends(verify_api_key),
+):
+    """Usage of the calling API key.
+
+    Args:
+        start: Unix time from which usage is included (whole hours)
+        end: Unix time before which usage is included
+        model: Only this model
+        group_by: Also split by ``hour`` or ``day``
+        api_key: Verified API key
+
+    Returns:
+        Usage rows per model
+    """
+    return await query_usage(api_key_id(api_key), model, start, end, group_by)
+
+
+@app.get("/admin/usage")
+async def get_all_usage(
+    key_id: Optional[str] = None,
+    start: Optional[float] = None,
+    end: Optional[float] = None,
+    model: Optional[str] = None,
+    group_by: Optional[str] = None,
+    admin_key: str = Depends(verify_admin_key),
+):
+    """Usage of every API key (or of one key id) for billing."""
+    return await query_usage(key_id, model, start, end, group_by)
+
+
+@app.get("/admin/shadow")
+async def get_shadow_report(recent: int = 20, admin_key: str = Depends(verify_admin_key)):
+    """Latency, time to first token and length of shadow vs primary completions."""
+    if shadow is None:
         return JSONResponse(
-            status_code=500,
+            status_code=404,
             content=ErrorResponse.create(
-                message=f"Internal server error: {str(e)}",
-                type="internal_error",
+                message="Shadow traffic is not configured (set BHARATGEN_SHADOW_URL)"
             ).model_dump(),
         )
+    return shadow.report(min(max(recent, 0), 100))
+
+
+async def query_usage(
+    key_id: Optional[str],
+    model: Optional[str],
+    start: Optional[float],
+    end: Optional[float],
+    group_by: Optional[str],
+):
+    """Query the usage ledger on a worker thread."""
+    try:
+        rows = await run_in_threadpool(ledger.query, key_id, model, start, end, group_by)
+    except ValueError as e:
+        return JSONResponse(
+            status_code=400,
+            content=ErrorResponse.create(message=str(e)).model_dump(),
+        )
+    return {"object": "list", "data": rows}
+
+
+def release_lease(lease: Lease, trace: RequestTrace):
+    """Free an endpoint slot, reporting queueing delay or failure to its limiter.
+
+    The delay is the time to the first upstream data event, which covers
+    the upstream queue and prefill. Time to the first visible token would
+    also count hidden thinking, which varies per prompt, not with load.
+    """
+    first_event = trace.marks.get(FIRST_EVENT)
+    lease.release(
+        first_event_at=None if first_event is None else trace.start + first_event,
+        failed="upstream_error" in trace.attributes,
+    )
+
+
+def finish_completion(api_key: str, lease: Lease, trace: RequestTrace):
+    """Release a completion's endpoint slot and account for its usage."""
+    release_lease(lease, trace)
+    record_usage(api_key, lease, trace)
+    if shadow is not None:
+        record_shadow_primary(lease, trace)
 
 
-async def stream_completion(completion_iterator):
+def record_shadow_primary(lease: Lease, trace: RequestTrace):
+    """Report a finished completion to the shadow mirror, timed from its dispatch."""
+    first_token = trace.marks.get(FIRST_TOKEN)
+    completion_tokens = trace.attributes.get("completion_tokens")
+    shadow.record_primary(
+        trace,
+        Outcome(
+            latency=time.perf_counter() - lease.acquired_at,
+            ttft=None if first_token is None else trace.start + first_token - lease.acquired_at,
+            completion_tokens=completion_tokens or 0,
+            failed=completion_tokens is None or "upstream_error" in trace.attributes,
+        ),
+    )
+
+
+def record_usage(api_key: str, lease: Lease, trace: RequestTrace):
+    """Add a finished completion to the usage ledger and the key's token limit.
+
+    Both only update memory. A completion that never reported its usage
+    counts as an error.
+    """
+    key = api_key_id(api_key)
+    prompt_tokens = trace.attributes.get("prompt_tokens", 0)
+    completion_tokens = trace.attributes.get("completion_tokens")
+    ledger.record(
+        key,
+        lease.route.config.id,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens or 0,
+        latency=time.perf_counter() - trace.start,
+        failed=completion_tokens is None,
+    )
+    rate_limiter.consume_tokens(key, prompt_tokens + (completion_tokens or 0))
+
+
+def format_estimation(estimation: Estimation) -> str:
+    """Format a queue estimate as ``key=value`` pairs for an SSE comment."""
+    fields = {"rank": estimation.rank, "size": estimation.queue_size, "eta": estimation.eta}
+    return " ".join(
+        f"{key}={value:.1f}" if isinstance(value, float) else f"{key}={value}"
+        for key, value in fields.items()
+        if value is not None
+    )
+
+
+def run_once(*callbacks: Callable[[], None]) -> Callable[[], None]:
+    """Combine callbacks into one that runs them on its first call only."""
+    pending = list(callbacks)
+
+    def run():
+        while pending:
+            pending.pop(0)()
+
+    return run
+
+
+class FinishingStreamingResponse(StreamingResponse):
+    """StreamingResponse that runs ``finish`` however it ends.
+
+    The client can disconnect before the body is iterated at all (the
+    response start fails, or the ASGI server cancels the request), in
+    which case the body generator's own cleanup never runs.
+    """
+
+    def __init__(self, content, finish: Callable[[], None], **kwargs):
+        super().__init__(content, **kwargs)
+        self.finish = finish
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.finish()
+
+
+async def stream_completion(
+    completion_iterator,
+    trace: Optional[RequestTrace] = None,
+    on_finish: Sequence[Callable[[], None]] = (),
+    heartbeat: Optional[float] = SSE_HEARTBEAT or None,
+):
     """Stream completion chunks in SSE format.
 
     Args:
-        completion_iterator: Iterator of ChatCompletionChunk objects
+        completion_iterator: Iterator of ChatCompletionChunk objects; queue
+            Estimation items in between are sent as SSE comments
+        trace: Request trace; its summary is added to the final chunk
+        on_finish: Callbacks run when the stream ends (releasing its slots)
+        heartbeat: Seconds without data before an SSE comment is sent
+            (None never sends one)
 
     Yields:
         SSE formatted data
     """
     try:
-        for chunk in completion_iterator:
+        # Upstream reads and parsing block, so pull chunks on worker threads.
+        # Comments during long silences (such as hidden thinking) keep
+        # proxies and clients from timing out and retrying.
+        async for chunk in iterate_cancellable(completion_iterator, heartbeat):
+            if chunk is HEARTBEAT:
+                yield ": heartbeat\n\n"
+                continue
+            if isinstance(chunk, Estimation):
+                # Comment lines are ignored by SSE clients that don't look for them
+                yield f": queue {format_estimation(chunk)}\n\n"
+                continue
+
+            if trace is not None and chunk.usage is not None:
+                trace.attributes["prompt_tokens"] = chunk.usage.prompt_tokens
+                trace.attributes["completion_tokens"] = chunk.usage.completion_tokens
+
             # Convert Pydantic model to dict, then to JSON
-            chunk_json = json.dumps(chunk.model_dump())
+            start = time.perf_counter()
+            chunk_dict = chunk.model_dump()
+            if trace is not None and chunk.choices[0].finish_reason is not None:
+                chunk_dict["timings"] = trace.summary()
+            chunk_json = json.dumps(chunk_dict)
+            if trace is not None:
+                trace.add(SERIALIZE, time.perf_counter() - start)
             yield f"data: {chunk_json}\n\n"
 
         # Send [DONE] message
         yield "data: [DONE]\n\n"
 
+    except UpstreamError as e:
+        # Headers are already sent, so the error goes in the stream
+        if trace is not None:
+            trace.attributes["upstream_error"] = str(e)
+        error = ErrorResponse.create(
+            message=f"Upstream error: {str(e)}",
+            type="upstream_error",
+            code="upstream_timeout" if isinstance(e, UpstreamTimeoutError) else None,
+        )
+        yield f"data: {json.dumps(error.model_dump())}\n\n"
+
     except Exception as e:
         # Send error in SSE format
         error = ErrorResponse.create(
@@ -171,24 +1271,56 @@ async def stream_completion(completion_iterator):
         error_json = json.dumps(error.model_dump())
         yield f"data: {error_json}\n\n"
 
+    finally:
+        for callback in on_finish:
+            callback()
+        if trace is not None:
+            trace.finish()
+
 
 def main():
     """Run the server."""
-    import uvicorn
-
     port = int(os.getenv("BHARATGEN_PORT", "8000"))
     host = os.getenv("BHARATGEN_HOST", "0.0.0.0")
+    # 'http1' (uvicorn) or 'h2' (Hypercorn: HTTP/2 over TLS, h2c in cleartext)
+    http = os.getenv("BHARATGEN_HTTP", "http1")
+    certfile = os.getenv("BHARATGEN_TLS_CERT") or None
+    keyfile = os.getenv("BHARATGEN_TLS_KEY") or None
+    if http not in ("http1", "h2"):
+        raise ValueError(f"Unknown BHARATGEN_HTTP: {http}")
+    scheme = "https" if certfile else "http"
 
     print(f"Starting BharatGen OpenAI-Compatible API server on {host}:{port}")
     print(f"Base URL: {BASE_URL}")
     print(f"Model: {MODEL_NAME}")
+    print(f"Backend: {BACKEND}")
+    print(f"Transport: {TRANSPORT}")
+    print(f"Parse pool: {PARSE_POOL}")
+    print(f"HTTP: {'h2' if certfile else 'h2c'} and HTTP/1.1" if http == "h2" else "HTTP: HTTP/1.1")
     print(f"API Keys: {len(API_KEYS)} configured")
     print("\nEndpoints:")
-    print(f"  POST http://{host}:{port}/v1/chat/completions")
-    print(f"  GET  http://{host}:{port}/v1/models")
-    print(f"  GET  http://{host}:{port}/health")
+    print(f"  POST {scheme}://{host}:{port}/v1/chat/completions")
+    print(f"  GET  {scheme}://{host}:{port}/v1/models")
+    print(f"  GET  {scheme}://{host}:{port}/health")
+    print(f"  GET  {scheme}://{host}:{port}/ready")
+    print(f"  GET  {scheme}://{host}:{port}/metrics")
+
+    if http == "h2":
+        from .http2 import serve
+
+        serve(
+            app,
+            host,
+            port,
+            certfile=certfile,
+            keyfile=keyfile,
+            max_streams=int(os.getenv("BHARATGEN_H2_MAX_STREAMS", "100")),
+        )
+        return
+
+    import uvicorn
 
-    uvicorn.run(app, host=host, port=port)
+    uvicorn.run(app, host=host, port=port, ssl_certfile=certfile, ssl_keyfile=keyfile)
 
 
 if __name__ == "__main__":
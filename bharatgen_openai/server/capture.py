@@ -0,0 +1,185 @@
+"""Traffic capture for replaying production load.
+
+Sampled chat completion requests are written to a JSONL file with their
+arrival time and how the server answered (status, time to first token,
+latency, token counts). Records are redacted before they're written; the
+built-in redactor masks common PII in message contents, and a custom hook
+can be named instead. A background thread appends the records, so the
+event loop never waits on the file. ``python -m bharatgen_openai.replay``
+re-issues a capture against any server.
+
+Capture rides on request traces: the request body is kept when a request
+is sampled, and the record is written when its trace finishes, which
+happens once on every path (JSON, streamed, failed or cancelled).
+"""
+
+import importlib
+import random
+import re
+import threading
+from typing import Callable, Dict, Optional
+
+from ..metrics import REGISTRY
+from ..tracing import FIRST_TOKEN, JSONLWriter, RequestTrace, SpanExporter
+
+CAPTURED = REGISTRY.counter(
+    "bharatgen_capture_records_total",
+    "Requests written to the traffic capture, by result",
+    ["result"],
+)
+
+# Record -> redacted record, or None to leave the request out
+Redactor = Callable[[dict], Optional[dict]]
+
+_PII_PATTERNS = [
+    (re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"), "<email>"),
+    (re.compile(r"\b[A-Z]{5}[0-9]{4}[A-Z]\b"), "<pan>"),
+    # Card, Aadhaar and phone numbers, with or without separators
+    (re.compile(r"(?<![\w+])\+?\d(?:[ -]?\d){9,18}\b"), "<number>"),
+]
+
+
+def redact_text(text: str) -> str:
+    """Mask email addresses, PAN numbers and long digit sequences."""
+    for pattern, replacement in _PII_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+def redact_pii(record: dict) -> dict:
+    """Built-in redactor: masks PII in message contents and drops ``user``."""
+    request = record["request"]
+    for message in request.get("messages", []):
+        if isinstance(message.get("content"), str):
+            message["content"] = redact_text(message["content"])
+    request.pop("user", None)
+    return record
+
+
+def load_redactor(spec: str) -> Optional[Redactor]:
+    """Resolve a redaction hook.
+
+    Args:
+        spec: ``default`` (redact_pii), ``none``, or ``module:function``
+
+    Returns:
+        Redactor, or None to write records unredacted
+
+    Raises:
+        ValueError: If the hook can't be imported
+    """
+    if spec == "default":
+        return redact_pii
+    if spec == "none":
+        return None
+    module_name, _, name = spec.partition(":")
+    try:
+        return getattr(importlib.import_module(module_name), name)
+    except (ImportError, AttributeError, ValueError) as e:
+        raise ValueError(f"Can't load capture redactor '{spec}': {e}") from e
+
+
+class TrafficCapture:
+    """Sample requests and append them, with their outcome, to a JSONL file."""
+
+    def __init__(self, path: str, sample_rate: float = 0.1, redactor: Optional[Redactor] = redact_pii):
+        """Initialize capture.
+
+        Args:
+            path: Path of the JSONL file
+            sample_rate: Fraction of requests captured
+            redactor: Applied to every record before it's written (None
+                writes records as they are)
+        """
+        self.path = path
+        self.sample_rate = sample_rate
+        self.redactor = redactor
+        # Trace id -> key id and request body of sampled requests in flight
+        self._pending: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._writer = JSONLWriter(path)
+
+    def sample(self, trace: RequestTrace, key_id: str, request: dict) -> bool:
+        """Maybe capture a request; it's written when its trace finishes.
+
+        Args:
+            trace: Request trace (its exporter must come from ``wrap``)
+            key_id: Id of the API key that sent the request
+            request: Request body as the client set it
+
+        Returns:
+            Whether the request was sampled
+        """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            self._pending[trace.trace_id] = {"key_id": key_id, "request": request}
+        return True
+
+    def wrap(self, exporter: Optional[SpanExporter]) -> SpanExporter:
+        """Trace exporter that writes sampled requests, then passes traces on to ``exporter``."""
+        return _CaptureExporter(self, exporter)
+
+    def start(self):
+        """Start the writer thread (the first record also does)."""
+        self._writer.start()
+
+    def close(self):
+        """Write the records still queued and stop the writer thread."""
+        self._writer.close()
+
+    def _record(self, trace: dict):
+        with self._lock:
+            pending = self._pending.pop(trace["trace_id"], None)
+        if pending is None:
+            return
+        attributes = trace["attributes"]
+        summary = trace["summary"]
+        status = attributes.get("status", 200)
+        error = attributes.get("upstream_error")
+        record = {
+            "timestamp": trace["start_time"],
+            "request_id": trace["request_id"],
+            "key_id": pending["key_id"],
+            "request": pending["request"],
+            "status": status,
+            "ttft_ms": summary.get(FIRST_TOKEN),
+            "latency_ms": summary.get("total"),
+            "prompt_tokens": attributes.get("prompt_tokens"),
+            "completion_tokens": attributes.get("completion_tokens"),
+            "error": error if error is not None or status < 400 else f"HTTP {status}",
+        }
+        try:
+            if self.redactor is not None:
+                record = self.redactor(record)
+            if record is None:
+                CAPTURED.inc(result="dropped")
+                return
+        except Exception as e:
+            # Capture never fails the request it records
+            print(f"Traffic capture failed: {e}")
+            CAPTURED.inc(result="error")
+            return
+        # A full queue means the disk can't keep up; counted, not printed per record
+        CAPTURED.inc(result="written" if self._writer.write(record) else "error")
+
+
+class _CaptureExporter(SpanExporter):
+    def __init__(self, capture: TrafficCapture, exporter: Optional[SpanExporter]):
+        self.capture = capture
+        self.exporter = exporter
+
+    def export(self, trace: dict):
+        self.capture._record(trace)
+        if self.exporter is not None:
+            self.exporter.export(trace)
+
+    def start(self):
+        self.capture.start()
+        if self.exporter is not None:
+            self.exporter.start()
+
+    def close(self):
+        self.capture.close()
+        if self.exporter is not None:
+            self.exporter.close()
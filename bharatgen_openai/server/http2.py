@@ -0,0 +1,71 @@
+"""HTTP/2 serving through Hypercorn.
+
+uvicorn only speaks HTTP/1.1, so every concurrent stream of a client needs
+a TCP connection of its own. Hypercorn multiplexes streams over one
+connection: with TLS it offers ``h2`` through ALPN, and in cleartext it
+accepts h2c (prior knowledge, or an ``Upgrade`` from HTTP/1.1). HTTP/1.1
+clients keep working in both cases.
+
+SSE responses are paced by HTTP/2 flow control: sending a chunk waits
+until the client grants window on that stream, so a slow reader holds up
+its own stream but never the other streams of its connection.
+"""
+
+import asyncio
+import signal
+from typing import Optional
+
+
+def serve(
+    app,
+    host: str,
+    port: int,
+    certfile: Optional[str] = None,
+    keyfile: Optional[str] = None,
+    max_streams: int = 100,
+    keep_alive: float = 75.0,
+):
+    """Serve an ASGI app over HTTP/2 until SIGINT or SIGTERM.
+
+    SIGTERM stops the server through the previously installed handler, so
+    the app's drain handler (installed at startup) runs first.
+
+    Args:
+        app: ASGI app
+        host: Interface to bind
+        port: Port to bind
+        certfile: TLS certificate; without it the server speaks h2c
+        keyfile: TLS private key
+        max_streams: Max concurrent streams per connection
+        keep_alive: Seconds an idle connection is kept open
+
+    Raises:
+        RuntimeError: If the hypercorn package isn't installed
+    """
+    try:
+        from hypercorn.asyncio import serve as hypercorn_serve
+        from hypercorn.config import Config
+    except ImportError as e:
+        raise RuntimeError("HTTP/2 serving needs the 'hypercorn' package (pip install 'bharatgen-openai[http2]')") from e
+
+    config = Config()
+    config.bind = [f"{host}:{port}"]
+    config.certfile = certfile
+    config.keyfile = keyfile
+    config.alpn_protocols = ["h2", "http/1.1"]
+    config.h2_max_concurrent_streams = max_streams
+    config.keep_alive_timeout = keep_alive
+    asyncio.run(_serve_until_signalled(app, config, hypercorn_serve))
+
+
+async def _serve_until_signalled(app, config, hypercorn_serve):
+    loop = asyncio.get_running_loop()
+    shutdown = asyncio.Event()
+
+    def stop(signum, frame):
+        loop.call_soon_threadsafe(shutdown.set)
+
+    # Plain handlers rather than loop ones, so the drain handler can wrap them
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, stop)
+    await hypercorn_serve(app, config, shutdown_trigger=shutdown.wait)
@@ -0,0 +1,275 @@
+"""Background completions that outlive the request that started them.
+
+A ``background`` request returns a job id right away. The completion runs
+on the event loop through the usual admission path, and its chunks are
+buffered in the job, so clients can poll for the result or follow the job
+as a stream from any connection. Finished jobs are kept for a TTL; the
+store holds a bounded number of jobs.
+"""
+
+import asyncio
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from ..metrics import REGISTRY
+from ..models import ChatCompletion, ChatCompletionMessage, Choice, ErrorResponse, Usage
+
+JOBS = REGISTRY.gauge(
+    "bharatgen_jobs",
+    "Background completions held in the job store",
+    ["status"],
+)
+JOBS_REJECTED = REGISTRY.counter(
+    "bharatgen_jobs_rejected_total",
+    "Background completions rejected because the job store was full",
+)
+
+STATUSES = ("queued", "in_progress", "completed", "failed", "cancelled")
+FINISHED = ("completed", "failed", "cancelled")
+
+# Runs a completion: gets a send function for its frames, returns the answer
+JobRunner = Callable[[Callable[[dict], Awaitable[None]]], Awaitable[str]]
+
+
+class JobNotFoundError(Exception):
+    """The job doesn't exist, expired, or belongs to another key."""
+
+
+class JobStoreFullError(Exception):
+    """Every slot of the job store holds an unfinished job."""
+
+
+class Job:
+    """One background completion and the chunks it produced so far."""
+
+    def __init__(self, key_id: str, model: str):
+        self.id = f"job-{uuid.uuid4().hex[:24]}"
+        self.key_id = key_id
+        self.model = model
+        self.created = int(time.time())
+        self.status = "queued"
+        # Chunk dicts, as streamed
+        self.frames: List[dict] = []
+        self.queue: Optional[dict] = None  # Latest upstream queue position
+        self.error: Optional[dict] = None
+        self.finished_at: Optional[float] = None
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    async def _add(self, frame: dict):
+        """Record a frame sent by the completion."""
+        if frame.get("type") == "queue":
+            self.queue = {name: value for name, value in frame.items() if name != "type"}
+        else:
+            self.status = "in_progress"
+            self.frames.append(frame)
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _finish(self, status: str, error: Optional[ErrorResponse] = None):
+        self.status = status
+        self.error = None if error is None else error.model_dump()["error"]
+        self.finished_at = time.monotonic()
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def follow(self, start: int = 0, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[dict]]:
+        """Yield the job's chunk frames from ``start`` on, live until it finishes.
+
+        Args:
+            start: Index of the first frame
+            heartbeat: Yield None after this many seconds without a frame
+
+        Yields:
+            Chunk dicts, or None as a heartbeat
+        """
+        index = start
+        while True:
+            while index < len(self.frames):
+                yield self.frames[index]
+                index += 1
+            if self.finished:
+                return
+            timed_out = False
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(
+                        self._changed.wait_for(lambda: index < len(self.frames) or self.finished),
+                        heartbeat,
+                    )
+                except asyncio.TimeoutError:
+                    timed_out = True
+            # Outside the lock, so a slow reader doesn't hold up the completion
+            if timed_out:
+                yield None
+
+    def result(self) -> Optional[ChatCompletion]:
+        """The completion assembled from its chunks, once it completed."""
+        if self.status != "completed" or not self.frames:
+            return None
+        last = self.frames[-1]
+        return ChatCompletion(
+            id=last["id"],
+            created=self.frames[0]["created"],
+            model=last["model"],
+            choices=[
+                Choice(
+                    index=0,
+                    message=ChatCompletionMessage(
+                        role="assistant",
+                        content="".join(frame["choices"][0]["delta"].get("content") or "" for frame in self.frames),
+                    ),
+                    finish_reason=last["choices"][0]["finish_reason"],
+                )
+            ],
+            usage=Usage(**last["usage"]),
+        )
+
+    def to_dict(self) -> dict:
+        """Job status, with the result or error once it finished."""
+        result = self.result()
+        return {
+            "id": self.id,
+            "object": "chat.completion.job",
+            "created": self.created,
+            "model": self.model,
+            "status": self.status,
+            "queue": None if self.finished or self.frames else self.queue,
+            "result": None if result is None else result.model_dump(),
+            "error": self.error,
+        }
+
+
+class JobStore:
+    """Bounded in-memory store of background completions."""
+
+    def __init__(self, max_jobs: int = 1000, ttl: float = 3600.0):
+        """Initialize store.
+
+        Args:
+            max_jobs: Max jobs held, finished or not; the oldest finished
+                jobs are evicted first
+            ttl: Seconds a finished job's result is kept
+        """
+        self.max_jobs = max_jobs
+        self.ttl = ttl
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+
+    def _evict(self):
+        """Drop expired jobs, then finished ones while the store is full."""
+        now = time.monotonic()
+        for job in list(self._jobs.values()):
+            if job.finished and now - job.finished_at > self.ttl:
+                del self._jobs[job.id]
+        if len(self._jobs) >= self.max_jobs:
+            for job in list(self._jobs.values()):
+                if job.finished:
+                    del self._jobs[job.id]
+                    if len(self._jobs) < self.max_jobs:
+                        break
+
+    def submit(
+        self,
+        key_id: str,
+        model: str,
+        run: JobRunner,
+        describe_error: Callable[[Exception], ErrorResponse],
+    ) -> Job:
+        """Create a job and start its completion.
+
+        Args:
+            key_id: Id of the API key that owns the job
+            model: Requested model
+            run: Runs the completion, sending its frames through the
+                function it gets
+            describe_error: Maps a failed completion's exception to an error body
+
+        Returns:
+            The new job
+
+        Raises:
+            JobStoreFullError: If every slot holds an unfinished job
+        """
+        self._evict()
+        if len(self._jobs) >= self.max_jobs:
+            JOBS_REJECTED.inc()
+            raise JobStoreFullError(f"Too many background jobs (max {self.max_jobs}); try again later")
+        job = Job(key_id, model)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job, run, describe_error))
+        job.task.add_done_callback(lambda task: self._cancelled_before_start(job))
+        self._update_metrics()
+        return job
+
+    def _cancelled_before_start(self, job: Job):
+        """Finish a job whose task was cancelled before _run started.
+
+        Otherwise it would stay queued, and hold its slot, for good.
+        """
+        if job.finished:
+            return
+        job.status = "cancelled"
+        job.finished_at = time.monotonic()
+        self._update_metrics()
+        asyncio.ensure_future(job._finish("cancelled"))  # Wakes its followers
+
+    async def _run(self, job: Job, run: JobRunner, describe_error: Callable[[Exception], ErrorResponse]):
+        async def send(frame: dict):
+            queued = job.status == "queued"
+            await job._add(frame)
+            if queued and job.status != "queued":
+                self._update_metrics()
+
+        try:
+            await run(send)
+            await job._finish("completed")
+        except asyncio.CancelledError:
+            await job._finish("cancelled")
+        except Exception as e:
+            await job._finish("failed", describe_error(e))
+        finally:
+            self._update_metrics()
+
+    def get(self, job_id: str, key_id: str) -> Job:
+        """Look up a job of a key.
+
+        Raises:
+            JobNotFoundError: If it doesn't exist, expired or belongs to another key
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.key_id != key_id or (
+            job.finished and time.monotonic() - job.finished_at > self.ttl
+        ):
+            raise JobNotFoundError(f"No background job '{job_id}'")
+        return job
+
+    def cancel(self, job_id: str, key_id: str) -> Job:
+        """Stop a job's completion (no effect once it finished).
+
+        Raises:
+            JobNotFoundError: See get
+        """
+        job = self.get(job_id, key_id)
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+        return job
+
+    def _update_metrics(self):
+        counts: Dict[str, int] = dict.fromkeys(STATUSES, 0)
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        for status, count in counts.items():
+            JOBS.set(count, status=status)
+
+    async def close(self):
+        """Cancel unfinished jobs and wait for them to stop."""
+        tasks = [job.task for job in self._jobs.values() if job.task is not None and not job.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,185 @@
+"""Config reload sources, graceful drain on shutdown and event loop health."""
+
+import asyncio
+import signal
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from ..metrics import REGISTRY
+
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    "bharatgen_event_loop_lag_seconds",
+    "How late the event loop ran a timer, i.e. how long it was blocked",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+
+
+class ServerDrainingError(RuntimeError):
+    """Raised when work is refused because the server is shutting down."""
+
+
+def read_env_file(path: Optional[str]) -> Dict[str, str]:
+    """Read ``KEY=VALUE`` lines from an env file.
+
+    Blank lines and ``#`` comments are skipped, an ``export`` prefix and
+    matching quotes around values are removed.
+
+    Args:
+        path: File path, or None
+
+    Returns:
+        Variables from the file (empty without a path)
+    """
+    if not path:
+        return {}
+    values = {}
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#") or "=" not in line:
+                continue
+            key, _, value = line.removeprefix("export ").partition("=")
+            value = value.strip()
+            if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+                value = value[1:-1]
+            values[key.strip()] = value
+    return values
+
+
+class DrainController:
+    """Track active requests and drain them before shutdown.
+
+    While draining, new work is refused and readiness reports down so load
+    balancers stop routing here; active streams get up to ``grace_period``
+    seconds to finish. All methods run on the event loop thread.
+    """
+
+    def __init__(self, grace_period: float = 300.0):
+        """Initialize drain controller.
+
+        Args:
+            grace_period: Max seconds to wait for active requests
+        """
+        self.grace_period = grace_period
+        self.draining = False
+        self.active = 0
+        self.drain_started: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self._signalled = False
+
+    def begin(self):
+        """Count a request as active."""
+        self.active += 1
+
+    def end(self):
+        """Mark an active request finished."""
+        self.active -= 1
+
+    async def drain(self) -> int:
+        """Stop admitting work and wait for active requests.
+
+        Returns:
+            Requests still active when the grace period ran out
+        """
+        self.draining = True
+        if self.drain_started is None:
+            self.drain_started = time.monotonic()
+        deadline = self.drain_started + self.grace_period
+        while self.active > 0 and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        return self.active
+
+    def install(self, sig: int = signal.SIGTERM):
+        """Drain on ``sig`` before running the previously installed handler.
+
+        The server's own handler (uvicorn's graceful exit) runs once active
+        requests finished or the grace period ran out; a second signal runs
+        it right away.
+
+        Args:
+            sig: Signal that starts the drain
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return  # Signal handlers can only be set from the main thread
+        previous = signal.getsignal(sig)
+        if not callable(previous):
+            return  # Nothing to hand over to
+        loop = asyncio.get_running_loop()
+
+        async def drain_then_exit(frame):
+            remaining = await self.drain()
+            if remaining:
+                print(f"Drain grace period over with {remaining} request(s) still active")
+            previous(sig, frame)
+
+        def start(frame):
+            if self._task is None:
+                print(f"Draining {self.active} active request(s) before shutdown")
+                self._task = loop.create_task(drain_then_exit(frame))
+
+        def handler(signum, frame):
+            if self._signalled:
+                previous(signum, frame)  # Second signal: don't wait any longer
+                return
+            self._signalled = True
+            self.draining = True
+            loop.call_soon_threadsafe(start, frame)
+
+        signal.signal(sig, handler)
+
+    def status(self) -> dict:
+        """Drain state for readiness responses."""
+        return {"draining": self.draining, "active_requests": self.active}
+
+
+def install_reload_handler(reload: Callable[[], None]) -> Callable[[], None]:
+    """Run ``reload`` on the event loop whenever SIGHUP arrives.
+
+    Args:
+        reload: Zero-argument reload function
+
+    Returns:
+        Function removing the handler again
+    """
+    sig = getattr(signal, "SIGHUP", None)
+    if sig is None or threading.current_thread() is not threading.main_thread():
+        return lambda: None  # Not available on this platform or thread
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(sig, reload)
+    return lambda: loop.remove_signal_handler(sig)
+
+
+class LoopLagMonitor:
+    """Measure event loop lag by timing a periodic sleep.
+
+    A sleep that wakes up late means the loop was busy (or waiting for the
+    GIL) for that long; every connection's I/O was held up by as much.
+    """
+
+    def __init__(self, interval: float = 0.1):
+        """Initialize monitor.
+
+        Args:
+            interval: Seconds between measurements
+        """
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start measuring on the running loop."""
+        if self._task is None and self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - start - self.interval))
+
+    async def stop(self):
+        """Stop measuring."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
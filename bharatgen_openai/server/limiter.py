@@ -0,0 +1,100 @@
+"""Adaptive upstream concurrency limit."""
+
+import math
+import threading
+from typing import Optional
+
+
+class GradientLimiter:
+    """Concurrency limit that follows observed queueing delay.
+
+    A gradient algorithm in the style of Netflix's concurrency-limits
+    Gradient: the lowest recent delay until the upstream's first event is
+    the "no queueing" baseline, and each new sample is compared with it.
+    The signal has to grow with load and little else; time to the first
+    visible token doesn't qualify, because hidden thinking before it
+    varies per prompt. The baseline drifts up slowly, so it follows real
+    latency changes (longer prompts, a slower replica) instead of sticking
+    to one lucky sample.
+
+    - While samples stay within ``tolerance`` times the baseline, the limit
+      grows by a small queue allowance (``log10(limit) + 1``) per sample,
+      only while the limit is actually being used.
+    - When latency rises, the limit shrinks in proportion (at most halving
+      per sample), before the upstream's own queue builds up.
+    - Failed or timed-out completions shrink the limit by ``backoff``.
+
+    Updates are smoothed, so one slow answer doesn't collapse the limit.
+    """
+
+    def __init__(
+        self,
+        initial_limit: float = 16,
+        min_limit: float = 1,
+        max_limit: float = 256,
+        smoothing: float = 0.1,
+        tolerance: float = 1.25,
+        long_window: int = 100,
+        backoff: float = 0.9,
+    ):
+        """Initialize limiter.
+
+        Args:
+            initial_limit: Starting concurrency limit
+            min_limit: Lower bound of the limit
+            max_limit: Upper bound of the limit
+            smoothing: Weight of each new limit estimate (0-1)
+            tolerance: Latency inflation over the baseline that counts as healthy
+            long_window: Samples over which the baseline may drift up by ~1%
+            backoff: Factor applied to the limit on failures
+        """
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.smoothing = smoothing
+        self.tolerance = tolerance
+        self.backoff = backoff
+        self._drift = 1 + 0.01 / long_window
+        self._limit = float(min(max(initial_limit, min_limit), max_limit))
+        self._baseline: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit."""
+        return int(min(self._limit, self.max_limit))
+
+    @property
+    def baseline(self) -> Optional[float]:
+        """Baseline latency in seconds (None before the first sample)."""
+        return self._baseline
+
+    def on_sample(self, latency: float, inflight: int):
+        """Update the limit with the latency of a finished completion.
+
+        Args:
+            latency: Seconds from dispatch to the first upstream event
+            inflight: Completions in flight when the sample was taken
+        """
+        if latency <= 0:
+            return
+        with self._lock:
+            if self._baseline is None:
+                self._baseline = latency
+            else:
+                self._baseline = min(self._baseline * self._drift, latency)
+
+            gradient = max(0.5, min(1.0, self.tolerance * self._baseline / latency))
+            if gradient == 1.0 and inflight < self._limit / 2:
+                return  # Demand is below the limit, so this says nothing about capacity
+            estimate = self._limit * gradient + math.log10(self._limit) + 1
+            self._update(estimate)
+
+    def on_failure(self):
+        """Shrink the limit after an upstream error or timeout."""
+        with self._lock:
+            self._update(self._limit * self.backoff, smoothed=False)
+
+    def _update(self, estimate: float, smoothed: bool = True):
+        if smoothed:
+            estimate = (1 - self.smoothing) * self._limit + self.smoothing * estimate
+        self._limit = min(max(estimate, self.min_limit), self.max_limit)
@@ -0,0 +1,151 @@
+"""On-demand CPU profiling and memory tracing for the running server.
+
+Both tools cost nothing while idle: the sampler thread only exists for the
+duration of a profile, and tracemalloc is only enabled between an explicit
+start and stop.
+"""
+
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Optional
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another one is running."""
+
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler across all threads.
+
+    Output uses the collapsed ("folded") stack format understood by
+    flamegraph.pl, speedscope and inferno: one ``frame;frame;frame count``
+    line per unique stack.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def profile(self, seconds: float, interval: float = 0.005) -> str:
+        """Sample every thread's stack for a while (blocks the caller).
+
+        Args:
+            seconds: Profile duration
+            interval: Seconds between samples
+
+        Returns:
+            Collapsed stacks, one per line
+
+        Raises:
+            ProfilerBusyError: If a profile is already running
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusyError("A profile is already running")
+        try:
+            return self._sample(seconds, interval)
+        finally:
+            self._lock.release()
+
+    def _sample(self, seconds: float, interval: float) -> str:
+        stacks: Counter = Counter()
+        own_id = threading.get_ident()
+        names = {}
+        deadline = time.monotonic() + seconds
+
+        while time.monotonic() < deadline:
+            for thread in threading.enumerate():
+                names[thread.ident] = thread.name
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+                    )
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                stacks[";".join(reversed(stack))] += 1
+            time.sleep(interval)
+
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common())
+
+
+class MemoryTracer:
+    """tracemalloc snapshots with diffs against the previous snapshot."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._previous: Optional[tracemalloc.Snapshot] = None
+
+    def start(self, frames: int = 1) -> dict:
+        """Start tracing allocations.
+
+        Args:
+            frames: Number of frames stored per allocation traceback
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(frames)
+            self._previous = self._take_snapshot()
+            return self.status()
+
+    def stop(self) -> dict:
+        """Stop tracing and drop stored snapshots."""
+        with self._lock:
+            tracemalloc.stop()
+            self._previous = None
+            return self.status()
+
+    def status(self) -> dict:
+        """Get tracing state and traced memory."""
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": tracemalloc.is_tracing(),
+            "traced_bytes": current,
+            "peak_bytes": peak,
+        }
+
+    def _take_snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def snapshot_diff(self, limit: int = 25, key_type: str = "lineno") -> dict:
+        """Take a snapshot and diff it against the previous one.
+
+        Args:
+            limit: Max number of entries returned
+            key_type: Grouping key ('lineno', 'filename' or 'traceback')
+
+        Returns:
+            Status plus the top allocation differences, largest growth first
+
+        Raises:
+            RuntimeError: If tracing hasn't been started
+        """
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                raise RuntimeError("Memory tracing is not started")
+            snapshot = self._take_snapshot()
+            stats = snapshot.compare_to(self._previous, key_type)
+            self._previous = snapshot
+
+        return {
+            **self.status(),
+            "diff": [
+                {
+                    "location": str(stat.traceback),
+                    "size_diff": stat.size_diff,
+                    "size": stat.size,
+                    "count_diff": stat.count_diff,
+                    "count": stat.count,
+                }
+                for stat in stats[:limit]
+            ],
+        }
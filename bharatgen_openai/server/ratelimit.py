@@ -0,0 +1,381 @@
+"""Per-key token-bucket rate limits shared across server replicas.
+
+Each replica decides locally, from its own token buckets, so admission
+never waits on the network. A background thread periodically exchanges
+consumption with a shared backend and debits what other replicas used
+from the local buckets. Between syncs the replicas together can overshoot
+a limit by at most what the others admit in one sync interval.
+"""
+
+import os
+import threading
+import time
+import uuid
+from typing import Dict, Iterable, Optional, Tuple
+
+from ..metrics import REGISTRY
+
+RATE_LIMITED = REGISTRY.counter(
+    "bharatgen_rate_limited_total",
+    "Requests rejected by a per-key rate limit",
+    ["limit"],
+)
+RATE_LIMIT_SYNC_ERRORS = REGISTRY.counter(
+    "bharatgen_rate_limit_sync_errors_total",
+    "Failed exchanges with the shared rate limit backend",
+)
+
+REQUESTS = "requests"
+TOKENS = "tokens"
+
+# (key id, limit kind)
+_Key = Tuple[str, str]
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a key is over one of its limits."""
+
+    def __init__(self, limit: str, retry_after: float):
+        super().__init__(f"Rate limit exceeded for {limit}, retry in {retry_after:.1f} s")
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+class TokenBucket:
+    """Token bucket that may go negative when debited after the fact."""
+
+    def __init__(self, rate: float, capacity: float):
+        """Initialize a full bucket.
+
+        Args:
+            rate: Tokens added per second
+            capacity: Max tokens (burst size)
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until ``amount`` tokens are available (after refill)."""
+        missing = amount - self.tokens
+        return missing / self.rate if missing > 0 else 0.0
+
+
+class MemoryBackend:
+    """In-process stand-in for the shared backend.
+
+    Enough for a single replica and for tests: several RateLimiter
+    instances sharing one MemoryBackend behave like separate replicas.
+    """
+
+    def __init__(self):
+        self._totals: Dict[_Key, float] = {}
+        self._batches: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def exchange(
+        self, deltas: Dict[_Key, float], keys: Iterable[_Key], replica: str = "", batch: int = 0
+    ) -> Dict[_Key, float]:
+        """Add local consumption and read the cluster-wide totals.
+
+        A replica retries a failed exchange with the same batch number, so
+        the deltas are added only if that batch wasn't applied already.
+
+        Args:
+            deltas: Consumption since the last exchange
+            keys: Counters whose totals are wanted
+            replica: Id of the sending replica
+            batch: Number of the replica's batch of deltas
+
+        Returns:
+            Cumulative consumption per counter (a counter may restart from 0)
+        """
+        with self._lock:
+            if self._batches.get(replica) != batch:
+                self._batches[replica] = batch
+                for key, amount in deltas.items():
+                    self._totals[key] = self._totals.get(key, 0.0) + amount
+            return {key: self._totals.get(key, 0.0) for key in keys}
+
+
+# KEYS[1]: the replica's last applied batch; KEYS[2..]: counters
+# ARGV[1]: batch number, ARGV[2]: TTL, ARGV[3..]: delta per counter
+_EXCHANGE_SCRIPT = """
+local fresh = redis.call('GET', KEYS[1]) ~= ARGV[1]
+if fresh then
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+end
+local totals = {}
+for i = 2, #KEYS do
+    local delta = tonumber(ARGV[i + 1])
+    if fresh and delta ~= 0 then
+        totals[i - 1] = redis.call('INCRBYFLOAT', KEYS[i], ARGV[i + 1])
+        redis.call('EXPIRE', KEYS[i], ARGV[2])
+    else
+        totals[i - 1] = redis.call('GET', KEYS[i]) or '0'
+    end
+end
+return totals
+"""
+
+
+class RedisBackend:
+    """Shared counters in Redis (needs ``pip install redis``).
+
+    Counters expire after ``ttl`` seconds without consumption (by then
+    every bucket has refilled); replicas treat a counter that went
+    backwards as restarted. Each exchange runs as one Lua script, so its
+    deltas land all together or not at all, and a retried batch is not
+    added twice.
+    """
+
+    def __init__(self, url: str, prefix: str = "bharatgen:ratelimit:", ttl: int = 120, timeout: float = 1.0):
+        """Initialize backend.
+
+        Args:
+            url: Redis URL (e.g. ``redis://localhost:6379/0``)
+            prefix: Key prefix of the counters
+            ttl: Seconds an idle counter is kept
+            timeout: Socket timeout of each exchange
+
+        Raises:
+            RuntimeError: If the redis package isn't installed
+        """
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("The redis rate limit backend needs the 'redis' package") from e
+        self.client = redis.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.prefix = prefix
+        self.ttl = ttl
+        self._exchange = self.client.register_script(_EXCHANGE_SCRIPT)
+
+    def exchange(
+        self, deltas: Dict[_Key, float], keys: Iterable[_Key], replica: str = "", batch: int = 0
+    ) -> Dict[_Key, float]:
+        """Add local consumption and read the cluster-wide totals (one round trip, atomic)."""
+        keys = list(keys)
+        values = self._exchange(
+            keys=[f"{self.prefix}batch:{replica}"] + [f"{self.prefix}{key[0]}:{key[1]}" for key in keys],
+            args=[batch, self.ttl] + [repr(float(deltas.get(key, 0.0))) for key in keys],
+        )
+        return {key: float(value) for key, value in zip(keys, values)}
+
+
+class RateLimiter:
+    """Requests/second and tokens/minute limits per API key.
+
+    The request bucket is charged on admission. Token usage is only known
+    once a completion finishes, so it is charged afterwards and admission
+    just requires a positive token balance: a key that overdraws waits
+    until the bucket refills.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 0.0,
+        burst: Optional[float] = None,
+        tokens_per_minute: float = 0.0,
+        backend=None,
+        sync_interval: float = 1.0,
+        idle_timeout: float = 600.0,
+    ):
+        """Initialize limiter.
+
+        Args:
+            requests_per_second: Sustained requests per key (0 disables)
+            burst: Request bucket size (default: twice the rate, at least 1)
+            tokens_per_minute: Prompt + completion tokens per key (0 disables)
+            backend: Shared backend (MemoryBackend or RedisBackend); None
+                keeps limits per replica
+            sync_interval: Seconds between backend exchanges
+            idle_timeout: Seconds after which a full, unused bucket is dropped
+        """
+        self.backend = backend
+        self.sync_interval = sync_interval
+        self.idle_timeout = idle_timeout
+        self._buckets: Dict[_Key, TokenBucket] = {}
+        self._unsynced: Dict[_Key, float] = {}
+        self._seen: Dict[_Key, float] = {}
+        self._used_at: Dict[_Key, float] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._backend_failing = False
+        self._replica = uuid.uuid4().hex[:12]
+        self._batch = 0
+        # Deltas of an exchange that failed, resent as the same batch
+        self._retry: Optional[Dict[_Key, float]] = None
+        self.configure(requests_per_second, burst, tokens_per_minute)
+
+    def configure(self, requests_per_second: float, burst: Optional[float], tokens_per_minute: float):
+        """Change the limits; existing buckets keep their balance.
+
+        Args:
+            requests_per_second: Sustained requests per key (0 disables)
+            burst: Request bucket size (default: twice the rate, at least 1)
+            tokens_per_minute: Prompt + completion tokens per key (0 disables)
+        """
+        if burst is None:
+            burst = max(1.0, 2 * requests_per_second)
+        limits = {
+            REQUESTS: (requests_per_second, burst) if requests_per_second > 0 else None,
+            TOKENS: (tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute > 0 else None,
+        }
+        with self._lock:
+            self._limits = limits
+            for key, bucket in list(self._buckets.items()):
+                limit = limits[key[1]]
+                if limit is None:
+                    del self._buckets[key]
+                    self._seen.pop(key, None)
+                else:
+                    bucket.rate, bucket.capacity = limit
+                    bucket.tokens = min(bucket.tokens, bucket.capacity)
+
+    @property
+    def enabled(self) -> bool:
+        return any(self._limits.values())
+
+    def _bucket(self, key: _Key) -> Optional[TokenBucket]:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            limit = self._limits[key[1]]
+            if limit is None:
+                return None
+            bucket = self._buckets[key] = TokenBucket(*limit)
+        return bucket
+
+    def check(self, key: str):
+        """Admit one request for ``key`` or raise.
+
+        Args:
+            key: API key id
+
+        Raises:
+            RateLimitExceeded: If the key is over a limit
+        """
+        now = time.monotonic()
+        with self._lock:
+            requests = self._bucket((key, REQUESTS))
+            tokens = self._bucket((key, TOKENS))
+            if tokens is not None:
+                tokens.refill(now)
+                if tokens.tokens <= 0:
+                    RATE_LIMITED.inc(limit=TOKENS)
+                    raise RateLimitExceeded("tokens per minute", tokens.wait_time(1))
+            if requests is not None:
+                requests.refill(now)
+                if requests.tokens < 1:
+                    RATE_LIMITED.inc(limit=REQUESTS)
+                    raise RateLimitExceeded("requests per second", requests.wait_time(1))
+                requests.tokens -= 1
+                self._charged((key, REQUESTS), 1, now)
+
+    def consume_tokens(self, key: str, tokens: int):
+        """Charge the tokens of a finished completion.
+
+        Args:
+            key: API key id
+            tokens: Prompt + completion tokens
+        """
+        if tokens <= 0:
+            return
+        with self._lock:
+            bucket = self._bucket((key, TOKENS))
+            if bucket is None:
+                return
+            now = time.monotonic()
+            bucket.refill(now)
+            bucket.tokens -= tokens
+            self._charged((key, TOKENS), tokens, now)
+
+    def _charged(self, key: _Key, amount: float, now: float):
+        self._unsynced[key] = self._unsynced.get(key, 0.0) + amount
+        self._used_at[key] = now
+
+    def sync(self):
+        """Exchange consumption with the backend and debit other replicas' use."""
+        now = time.monotonic()
+        with self._lock:
+            # Full buckets nobody used for a while carry no information
+            for key, bucket in list(self._buckets.items()):
+                bucket.refill(now)
+                if bucket.tokens >= bucket.capacity and now - self._used_at.get(key, now) > self.idle_timeout:
+                    del self._buckets[key]
+                    self._seen.pop(key, None)
+                    self._used_at.pop(key, None)
+            if self._retry is not None:
+                # The failed batch may have landed before the error; resend it
+                # unchanged so the backend can tell, and send newer use next time
+                deltas = self._retry
+            else:
+                deltas, self._unsynced = self._unsynced, {}
+                self._batch += 1
+            keys = list(self._buckets)
+        if self.backend is None or not keys:
+            return
+
+        try:
+            totals = self.backend.exchange(deltas, keys, self._replica, self._batch)
+        except Exception as e:
+            RATE_LIMIT_SYNC_ERRORS.inc()
+            if not self._backend_failing:
+                print(f"Rate limit sync failed, limiting per replica until it recovers: {e}")
+            self._backend_failing = True
+            self._retry = deltas
+            return
+        self._retry = None
+        if self._backend_failing:
+            print("Rate limit sync recovered")
+        self._backend_failing = False
+
+        with self._lock:
+            for key, total in totals.items():
+                seen = self._seen.get(key)
+                self._seen[key] = total
+                bucket = self._buckets.get(key)
+                if bucket is None or (seen is not None and total < seen):
+                    continue  # Dropped meanwhile, or the shared counter restarted
+                others = total - (seen or 0.0) - deltas.get(key, 0.0)
+                if seen is None:
+                    # First exchange: older use can at most have emptied the bucket
+                    others = min(others, bucket.capacity)
+                if others > 0:
+                    bucket.refill(now)
+                    bucket.tokens -= others
+                    self._used_at[key] = now
+
+    def _run(self):
+        while not self._stop.wait(self.sync_interval):
+            self.sync()
+
+    def start(self):
+        """Start periodic syncing in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="rate-limit-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop periodic syncing."""
+        self._stop.set()
+
+
+def create_rate_limit_backend_from_env():
+    """Create the backend configured by BHARATGEN_RATE_LIMIT_BACKEND.
+
+    ``redis`` uses BHARATGEN_REDIS_URL; ``memory`` (the default) keeps
+    limits per replica.
+
+    Returns:
+        Backend instance, or None for per-replica limits
+    """
+    kind = os.getenv("BHARATGEN_RATE_LIMIT_BACKEND", "memory").lower()
+    if kind == "redis":
+        return RedisBackend(os.getenv("BHARATGEN_REDIS_URL", "redis://localhost:6379/0"))
+    return None
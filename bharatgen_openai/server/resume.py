@@ -0,0 +1,198 @@
+"""Resumable SSE streams.
+
+A streamed completion is produced by a task that keeps running when its
+client disconnects. The stream's events are kept in a bounded ring buffer,
+and each data event carries an ``id:`` naming the stream and its position,
+so a client that reconnects with ``Last-Event-ID`` picks up where it left
+off instead of starting a new upstream job. A stream nobody follows is
+cancelled after a grace period; a finished one is kept for the same time.
+"""
+
+import asyncio
+import uuid
+from collections import deque
+from itertools import islice
+from typing import AsyncIterator, Deque, Dict, Optional, Tuple
+
+from ..metrics import REGISTRY
+from ..models import ErrorResponse
+
+STREAM_RESUMES = REGISTRY.counter(
+    "bharatgen_stream_resumes_total",
+    "Reconnects with Last-Event-ID, by whether the stream could be resumed",
+    ["result"],
+)
+STREAMS_ABANDONED = REGISTRY.counter(
+    "bharatgen_streams_abandoned_total",
+    "Streams cancelled because no client reattached within the grace period",
+)
+
+
+class StreamExpiredError(Exception):
+    """The stream is unknown, expired, or no longer holds the events after Last-Event-ID."""
+
+
+class ResumableStream:
+    """One completion's SSE events, produced independently of its readers."""
+
+    def __init__(self, key_id: str, buffer_size: int, grace: float):
+        self.id = uuid.uuid4().hex[:24]
+        self.key_id = key_id
+        self.grace = grace
+        # (position, SSE event text), oldest first
+        self._events: Deque[Tuple[int, str]] = deque(maxlen=buffer_size)
+        self._next = 0  # Position of the next event
+        self.done = False
+        self.task: Optional[asyncio.Task] = None
+        self._followers = 0
+        self._abandon_timer: Optional[asyncio.TimerHandle] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def _produce(self, events: AsyncIterator[str]):
+        """Buffer the events of an SSE generator, numbering its data events."""
+        try:
+            async for text in events:
+                if text.startswith("data:"):
+                    text = f"id: {self.id}:{self._next}\n{text}"
+                self._events.append((self._next, text))
+                self._next += 1
+                self._notify()
+        finally:
+            self.done = True
+            if self._abandon_timer is not None:
+                self._abandon_timer.cancel()
+            self._notify()
+
+    def _detached(self):
+        """Start the grace period once the last reader is gone."""
+        if self._followers == 0 and not self.done:
+            self._abandon_timer = asyncio.get_running_loop().call_later(self.grace, self._abandon)
+
+    def _abandon(self):
+        if self._followers == 0 and self.task is not None and not self.task.done():
+            STREAMS_ABANDONED.inc()
+            self.task.cancel()
+
+    def holds(self, position: int) -> bool:
+        """Whether the events from ``position`` on are all still buffered."""
+        return position >= (self._events[0][0] if self._events else self._next)
+
+    async def follow(self, after: Optional[int] = None, heartbeat: Optional[float] = None) -> AsyncIterator[str]:
+        """Yield the stream's SSE events after a position, live until it ends.
+
+        Args:
+            after: Position of the last event the client has (None for all)
+            heartbeat: Yield an SSE comment after this many seconds without
+                an event (None never does)
+
+        Yields:
+            SSE formatted events
+        """
+        position = 0 if after is None else after + 1
+        self._followers += 1
+        if self._abandon_timer is not None:
+            self._abandon_timer.cancel()
+            self._abandon_timer = None
+        try:
+            while True:
+                if not self.holds(position):
+                    # This reader fell further behind than the buffer reaches
+                    error = ErrorResponse.create(
+                        message="Stream reader fell behind; events were dropped",
+                        type="internal_error",
+                        code="stream_lagged",
+                    )
+                    yield f"data: {error.model_dump_json()}\n\n"
+                    return
+                # Copied first: the producer appends while this generator is suspended
+                first = self._events[0][0] if self._events else self._next
+                for _, text in list(islice(self._events, position - first, None)):
+                    yield text
+                position = self._next
+                if self.done:
+                    return
+                try:
+                    await asyncio.wait_for(self._changed.wait(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+        finally:
+            self._followers -= 1
+            self._detached()
+
+
+class StreamStore:
+    """Streams that clients can reattach to, by id."""
+
+    def __init__(self, grace: float = 30.0, buffer_size: int = 4096):
+        """Initialize store.
+
+        Args:
+            grace: Seconds a stream keeps running without a reader, and
+                seconds a finished stream stays resumable
+            buffer_size: Events kept per stream; a reader further behind
+                than this can't resume
+        """
+        self.grace = grace
+        self.buffer_size = buffer_size
+        self._streams: Dict[str, ResumableStream] = {}
+
+    def start(self, key_id: str, events: AsyncIterator[str]) -> ResumableStream:
+        """Produce an SSE generator's events on a task of their own.
+
+        Args:
+            key_id: Id of the API key allowed to resume the stream
+            events: SSE generator, run to the end even if readers leave
+                (unless none attaches within the grace period)
+
+        Returns:
+            The stream; follow it to read the events
+        """
+        stream = ResumableStream(key_id, self.buffer_size, self.grace)
+        self._streams[stream.id] = stream
+        stream.task = asyncio.create_task(stream._produce(events))
+        stream.task.add_done_callback(
+            lambda _: asyncio.get_running_loop().call_later(self.grace, self._streams.pop, stream.id, None)
+        )
+        # Cancelled unless a reader attaches in time
+        stream._detached()
+        return stream
+
+    def resume(self, last_event_id: str, key_id: str) -> Tuple[ResumableStream, int]:
+        """Find the stream a ``Last-Event-ID`` belongs to.
+
+        Args:
+            last_event_id: Id of the last event the client received
+            key_id: Id of the API key reconnecting
+
+        Returns:
+            Tuple of the stream and the position to follow it after
+
+        Raises:
+            StreamExpiredError: If the stream can't be resumed from there
+        """
+        stream_id, _, position = last_event_id.strip().partition(":")
+        stream = self._streams.get(stream_id)
+        if (
+            stream is None
+            or stream.key_id != key_id
+            or not position.isdigit()
+            or int(position) >= stream._next
+            or not stream.holds(int(position) + 1)
+        ):
+            STREAM_RESUMES.inc(result="expired")
+            raise StreamExpiredError(
+                f"Stream of event '{last_event_id}' expired; send the request again without Last-Event-ID"
+            )
+        STREAM_RESUMES.inc(result="resumed")
+        return stream, int(position)
+
+    async def close(self):
+        """Cancel running streams and wait for them to stop."""
+        tasks = [stream.task for stream in self._streams.values() if stream.task is not None and not stream.task.done()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,602 @@
+"""Model registry and per-model upstream routing."""
+
+import asyncio
+import bisect
+import hashlib
+import json
+import math
+import threading
+import time
+from collections import deque
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional, Tuple
+
+import requests
+from pydantic import BaseModel, Field
+
+from ..backends import ChatBackend, create_backend
+from ..metrics import REGISTRY
+from ..transport import Estimation
+from .limiter import GradientLimiter
+
+MODEL_INFLIGHT = REGISTRY.gauge(
+    "bharatgen_model_inflight",
+    "Completions in flight per model endpoint",
+    ["model", "endpoint"],
+)
+MODEL_REJECTED = REGISTRY.counter(
+    "bharatgen_model_rejected_total",
+    "Completions rejected because every endpoint of the model was at capacity",
+    ["model"],
+)
+CONCURRENCY_LIMIT = REGISTRY.gauge(
+    "bharatgen_upstream_concurrency_limit",
+    "Current concurrency limit per model endpoint (adaptive or configured)",
+    ["model", "endpoint"],
+)
+ADMISSION_QUEUE = REGISTRY.gauge(
+    "bharatgen_admission_queue_depth",
+    "Completions waiting locally for an endpoint slot",
+    ["model"],
+)
+ADMISSION_WAIT = REGISTRY.histogram(
+    "bharatgen_admission_wait_seconds",
+    "Time completions waited locally for an endpoint slot",
+    ["model"],
+)
+AFFINITY_ROUTED = REGISTRY.counter(
+    "bharatgen_affinity_routing_total",
+    "Prefix-affinity routing decisions: preferred replica (hit), next replica "
+    "on the hash ring (spill) or least-loaded (fallback)",
+    ["model", "result"],
+)
+
+ROUTING_POLICIES = ("least_loaded", "prefix_affinity")
+# Virtual nodes per endpoint on the consistent-hash ring
+RING_REPLICAS = 64
+
+
+def _hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+def prefix_key(messages: List[dict]) -> int:
+    """Hash of a conversation's system prompt and first user turn.
+
+    Later turns resend the same opening, so every turn of a conversation
+    gets the same key; the first turn alone is hashed because including
+    more would change the key between the first and second request.
+
+    Args:
+        messages: Message dicts with 'role' and 'content'
+
+    Returns:
+        64-bit key
+    """
+    parts = []
+    for message in messages:
+        parts.append(f"{message['role']}\0{message.get('content') or ''}")
+        if message["role"] == "user":
+            break
+    return _hash("\0\0".join(parts))
+
+
+class ModelNotFoundError(LookupError):
+    """Raised when a request names a model that isn't configured."""
+
+
+class ModelOverloadedError(Exception):
+    """Raised when every endpoint of a model is at capacity."""
+
+
+class ModelConfig(BaseModel):
+    """Configuration of one served model."""
+
+    id: str
+    endpoints: List[str] = Field(min_length=1)
+    api_name: str = "chat_fn_1"
+    aliases: List[str] = []
+    defaults: Dict[str, Any] = {}
+    max_concurrency: int = Field(default=0, ge=0)  # Per endpoint; 0 means unlimited
+    adaptive: Optional[bool] = None  # Adaptive limit per endpoint (registry default if unset)
+    transport: Optional[str] = None
+    routing: Optional[Literal["least_loaded", "prefix_affinity"]] = None  # Registry default if unset
+    backend: Optional[str] = None  # 'gradio' or 'openai' (registry default if unset)
+    upstream_model: Optional[str] = None  # Name an OpenAI-compatible upstream serves (default: id)
+    owned_by: str = "bharatgen"
+    created: int = 1706745600
+
+
+class Endpoint:
+    """One upstream (Gradio app or inference server) serving a model."""
+
+    def __init__(
+        self,
+        url: str,
+        client: ChatBackend,
+        max_concurrency: int = 0,
+        limiter: Optional[GradientLimiter] = None,
+        settings: Optional[dict] = None,
+    ):
+        self.url = url
+        self.client = client
+        # Backend settings the client was created with, to tell whether a reload changed them
+        self.settings = settings
+        self.max_concurrency = max_concurrency
+        self.limiter = limiter
+        self.inflight = 0
+        # Futures of requests waiting for a slot here (guarded by the route lock)
+        self.waiters: deque = deque()
+
+    def capacity(self) -> int:
+        """Current concurrency limit (0 means unlimited)."""
+        if self.limiter is None:
+            return self.max_concurrency
+        return self.limiter.limit
+
+    def has_capacity(self) -> bool:
+        capacity = self.capacity()
+        return not capacity or self.inflight < capacity
+
+    def load(self, queued: int = 0) -> float:
+        """Fraction of capacity in use (raw count when unlimited).
+
+        Args:
+            queued: Jobs waiting in the upstream's own queue, which includes
+                traffic that doesn't go through this server
+        """
+        capacity = self.capacity()
+        busy = self.inflight + queued
+        return busy / capacity if capacity else float(busy)
+
+
+class Lease:
+    """A claimed slot on an endpoint; release it when the completion ends."""
+
+    def __init__(self, route: "ModelRoute", endpoint: Endpoint):
+        self.route = route
+        self.endpoint = endpoint
+        self.acquired_at = time.perf_counter()
+        self._released = False
+
+    @property
+    def client(self) -> ChatBackend:
+        return self.endpoint.client
+
+    def release(self, first_event_at: Optional[float] = None, failed: bool = False):
+        """Free the slot and feed the outcome to the endpoint's limiter.
+
+        Safe to call more than once; only the first call counts.
+
+        Args:
+            first_event_at: perf_counter time of the first upstream data
+                event, if any
+            failed: Whether the upstream failed or timed out
+        """
+        if self._released:
+            return
+        self._released = True
+        latency = None if first_event_at is None else first_event_at - self.acquired_at
+        self.route._release(self.endpoint, latency, failed)
+
+
+class ModelRoute:
+    """Endpoints serving one model, with least-loaded or prefix-affinity selection.
+
+    With prefix affinity, each conversation prefers the endpoint its key
+    maps to on a consistent-hash ring, so replicas can reuse the prompt
+    prefix they cached on earlier turns. Loads are bounded as in
+    consistent hashing with bounded loads: an endpoint is skipped while it
+    has more than ``load_factor`` times the average load, and the next one
+    on the ring is tried.
+    """
+
+    def __init__(
+        self,
+        config: ModelConfig,
+        endpoints: List[Endpoint],
+        lock: Optional[threading.Lock] = None,
+        routing: str = "least_loaded",
+        load_factor: float = 1.25,
+    ):
+        self.config = config
+        self.endpoints = endpoints
+        # Shared with the registry: endpoints outlive routes across reloads
+        self._lock = lock or threading.Lock()
+        self.waiting = 0
+        self.routing = routing
+        self.load_factor = load_factor
+        # The ring only depends on endpoint URLs, so keys keep their endpoint across reloads
+        ring = sorted(
+            (_hash(f"{endpoint.url}#{i}"), index)
+            for index, endpoint in enumerate(endpoints)
+            for i in range(RING_REPLICAS)
+        )
+        self._ring_hashes = [point for point, _ in ring]
+        self._ring_endpoints = [endpoints[index] for _, index in ring]
+
+    def affinity_key(self, messages: List[dict]) -> Optional[int]:
+        """Routing key of a request (None unless this model uses prefix affinity)."""
+        if self.routing != "prefix_affinity" or len(self.endpoints) < 2:
+            return None
+        return prefix_key(messages)
+
+    def _ring_order(self, key: int) -> Iterator[Endpoint]:
+        """Distinct endpoints in ring order, starting at ``key``."""
+        start = bisect.bisect(self._ring_hashes, key)
+        seen = set()
+        for i in range(len(self._ring_endpoints)):
+            endpoint = self._ring_endpoints[(start + i) % len(self._ring_endpoints)]
+            if endpoint.url not in seen:
+                seen.add(endpoint.url)
+                yield endpoint
+                if len(seen) == len(self.endpoints):
+                    return
+
+    def _affinity_choice(
+        self, key: int, candidates: List[Endpoint], available: List[Endpoint], depths: Dict[str, int]
+    ) -> Tuple[Optional[Endpoint], str]:
+        """First endpoint on the ring with capacity and a load within the bound.
+
+        Returns:
+            The endpoint (None to fall back to least-loaded) and whether it
+            was the preferred one (``hit``), a later one (``spill``) or none
+            (``fallback``)
+        """
+        loads = {e.url: e.inflight + depths.get(e.url, 0) for e in candidates}
+        bound = math.ceil(self.load_factor * (sum(loads.values()) + 1) / len(candidates))
+        usable = {e.url for e in available}
+        first = True
+        for endpoint in self._ring_order(key):
+            if endpoint.url not in loads:
+                continue  # Unhealthy: the next one on the ring is preferred
+            if endpoint.url in usable and loads[endpoint.url] < bound:
+                return endpoint, "hit" if first else "spill"
+            first = False
+        return None, "fallback"
+
+    def _candidates(self, is_healthy: Optional[Callable[[str], bool]]) -> List[Endpoint]:
+        if is_healthy is None:
+            return self.endpoints
+        return [e for e in self.endpoints if is_healthy(e.url)] or self.endpoints
+
+    def _try_acquire(
+        self,
+        candidates: List[Endpoint],
+        queue_depth: Optional[Callable[[str], int]] = None,
+        key: Optional[int] = None,
+    ) -> Optional[Lease]:
+        # Read outside the route lock; depths come from other threads' caches
+        depths = {e.url: queue_depth(e.url) for e in candidates} if queue_depth else {}
+        result = None
+        with self._lock:
+            available = [e for e in candidates if e.has_capacity()]
+            if not available:
+                return None
+            endpoint = None
+            if key is not None:
+                endpoint, result = self._affinity_choice(key, candidates, available, depths)
+            if endpoint is None:
+                endpoint = min(available, key=lambda e: e.load(depths.get(e.url, 0)))
+            endpoint.inflight += 1
+        MODEL_INFLIGHT.inc(model=self.config.id, endpoint=endpoint.url)
+        if result is not None:
+            AFFINITY_ROUTED.inc(model=self.config.id, result=result)
+        return Lease(self, endpoint)
+
+    def acquire(
+        self,
+        is_healthy: Optional[Callable[[str], bool]] = None,
+        queue_depth: Optional[Callable[[str], int]] = None,
+        key: Optional[int] = None,
+    ) -> Lease:
+        """Claim a slot on the least-loaded endpoint with free capacity.
+
+        Healthy endpoints are preferred; when none is known to be healthy
+        (e.g. before the first probe) all endpoints are candidates. Jobs
+        waiting in an upstream's Gradio queue count towards its load.
+
+        Args:
+            is_healthy: Upstream health check by base URL
+            queue_depth: Upstream queue size by base URL
+            key: Affinity key (see affinity_key); None routes by load only
+
+        Returns:
+            Lease on the chosen endpoint
+
+        Raises:
+            ModelOverloadedError: If every candidate endpoint is full
+        """
+        lease = self._try_acquire(self._candidates(is_healthy), queue_depth, key)
+        if lease is None:
+            MODEL_REJECTED.inc(model=self.config.id)
+            raise ModelOverloadedError(f"Model {self.config.id!r} is at capacity")
+        return lease
+
+    async def acquire_waiting(
+        self,
+        is_healthy: Optional[Callable[[str], bool]] = None,
+        timeout: float = 30.0,
+        max_waiting: int = 256,
+        queue_depth: Optional[Callable[[str], int]] = None,
+        key: Optional[int] = None,
+    ) -> Lease:
+        """Claim a slot, queueing locally while every endpoint is full.
+
+        Args:
+            is_healthy: Upstream health check by base URL
+            timeout: Max seconds to wait for a slot
+            max_waiting: Max requests queued for this model; beyond that
+                requests are shed right away
+            queue_depth: Upstream queue size by base URL
+            key: Affinity key (see affinity_key); None routes by load only
+
+        Returns:
+            Lease on the chosen endpoint
+
+        Raises:
+            ModelOverloadedError: If the queue is full or the wait timed out
+        """
+        candidates = self._candidates(is_healthy)
+        lease = self._try_acquire(candidates, queue_depth, key)
+        if lease is not None:
+            return lease
+        if self.waiting >= max_waiting or timeout <= 0:
+            MODEL_REJECTED.inc(model=self.config.id)
+            raise ModelOverloadedError(f"Model {self.config.id!r} is at capacity")
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + timeout
+        self.waiting += 1
+        ADMISSION_QUEUE.inc(model=self.config.id)
+        try:
+            while True:
+                waiter = (loop, loop.create_future())
+                with self._lock:
+                    for endpoint in candidates:
+                        endpoint.waiters.append(waiter)
+                # A slot may have freed up before the waiter was registered
+                lease = self._try_acquire(candidates, queue_depth, key)
+                if lease is None:
+                    try:
+                        await asyncio.wait_for(waiter[1], deadline - loop.time())
+                    except asyncio.TimeoutError:
+                        pass
+                    lease = self._try_acquire(candidates, queue_depth, key)
+                with self._lock:
+                    for endpoint in candidates:
+                        try:
+                            endpoint.waiters.remove(waiter)
+                        except ValueError:
+                            pass
+                if lease is not None:
+                    ADMISSION_WAIT.observe(loop.time() - start, model=self.config.id)
+                    return lease
+                if loop.time() >= deadline:
+                    MODEL_REJECTED.inc(model=self.config.id)
+                    raise ModelOverloadedError(
+                        f"Model {self.config.id!r} is at capacity (waited {timeout:g} s)"
+                    )
+        finally:
+            self.waiting -= 1
+            ADMISSION_QUEUE.dec(model=self.config.id)
+
+    def _release(self, endpoint: Endpoint, latency: Optional[float] = None, failed: bool = False):
+        with self._lock:
+            inflight = endpoint.inflight
+            endpoint.inflight -= 1
+            waiters = list(endpoint.waiters)
+        if endpoint.limiter is not None:
+            if failed:
+                endpoint.limiter.on_failure()
+            elif latency is not None:
+                endpoint.limiter.on_sample(latency, inflight)
+        MODEL_INFLIGHT.dec(model=self.config.id, endpoint=endpoint.url)
+        CONCURRENCY_LIMIT.set(endpoint.capacity(), model=self.config.id, endpoint=endpoint.url)
+
+        # Waiters retry for the freed slot(s); a raised limit can free more than one
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(_wake, future)
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class ModelRegistry:
+    """Routing table from model ids (and aliases) to endpoint pools."""
+
+    def __init__(
+        self,
+        configs: List[ModelConfig],
+        session: requests.Session,
+        transport: str = "call",
+        idle_timeout: Optional[float] = 45.0,
+        adaptive: bool = False,
+        on_estimation: Optional[Callable[[str, Estimation], None]] = None,
+        backend: str = "gradio",
+        upstream_api_key: Optional[str] = None,
+        routing: str = "least_loaded",
+        affinity_load_factor: float = 1.25,
+        parse_pool=None,
+    ):
+        """Initialize registry.
+
+        Args:
+            configs: Served models; the first one is listed first
+            session: Pooled HTTP session shared by all endpoints
+            transport: Default Gradio transport ('call' or 'queue')
+            idle_timeout: Max seconds of upstream silence
+            adaptive: Whether endpoints use an adaptive concurrency limit
+                unless their model config says otherwise
+            on_estimation: Called with an endpoint URL and each queue
+                estimation its queue transport receives
+            backend: Default backend ('gradio' or 'openai')
+            upstream_api_key: Bearer token for OpenAI-compatible upstreams
+            routing: Default routing policy ('least_loaded' or 'prefix_affinity')
+            affinity_load_factor: With prefix affinity, max load of an
+                endpoint relative to the average before conversations
+                spill to the next one
+            parse_pool: ParsePool shared by the Gradio endpoints (None
+                parses on the threads reading responses)
+
+        Raises:
+            ValueError: If the routing policy is unknown
+        """
+        if routing not in ROUTING_POLICIES:
+            raise ValueError(f"Unknown routing policy {routing!r} (expected one of {', '.join(ROUTING_POLICIES)})")
+        self.session = session
+        self.transport = transport
+        self.idle_timeout = idle_timeout
+        self.adaptive = adaptive
+        self.on_estimation = on_estimation
+        self.backend = backend
+        self.upstream_api_key = upstream_api_key
+        self.routing = routing
+        self.affinity_load_factor = max(1.0, affinity_load_factor)
+        self.parse_pool = parse_pool
+        self.routes: Dict[str, ModelRoute] = {}
+        self._names: Dict[str, ModelRoute] = {}
+        self._lock = threading.Lock()
+        self.update(configs)
+
+    def _settings(self, config: ModelConfig) -> dict:
+        """Backend name and constructor options for endpoints of ``config``."""
+        backend = config.backend or self.backend
+        if backend == "gradio":
+            options = {
+                "transport": config.transport or self.transport,
+                "api_name": config.api_name,
+                "parse_pool": self.parse_pool,
+            }
+        else:
+            options = {"upstream_model": config.upstream_model, "api_key": self.upstream_api_key}
+        return {"backend": backend, "defaults": config.defaults, **options}
+
+    def _endpoint(self, config: ModelConfig, url: str) -> Endpoint:
+        """Reuse the current endpoint for ``url`` if its client settings are unchanged."""
+        settings = self._settings(config)
+        route = self.routes.get(config.id)
+        for endpoint in route.endpoints if route else []:
+            if endpoint.url == url and endpoint.settings == settings:
+                endpoint.max_concurrency = config.max_concurrency
+                endpoint.limiter = self._limiter(config, endpoint.limiter)
+                return endpoint
+        options = dict(settings)
+        client = create_backend(
+            options.pop("backend"), url, config.id, self.session, idle_timeout=self.idle_timeout, **options
+        )
+        if client.queue_transport is not None and self.on_estimation is not None:
+            client.queue_transport.on_estimation = partial(self.on_estimation, url)
+        return Endpoint(url, client, config.max_concurrency, self._limiter(config), settings)
+
+    def _limiter(self, config: ModelConfig, current: Optional[GradientLimiter] = None) -> Optional[GradientLimiter]:
+        """Limiter for an endpoint of ``config``, keeping the learned one if any."""
+        if not (self.adaptive if config.adaptive is None else config.adaptive):
+            return None
+        max_limit = config.max_concurrency or 256
+        if current is None:
+            return GradientLimiter(initial_limit=min(16, max_limit), max_limit=max_limit)
+        current.max_limit = max_limit
+        return current
+
+    def update(self, configs: List[ModelConfig]):
+        """Replace the routing table.
+
+        Endpoints whose settings didn't change are kept, so in-flight
+        completions keep counting against their capacity; requests already
+        routed finish on the endpoint they were sent to.
+
+        Args:
+            configs: Served models; the first one is listed first
+
+        Raises:
+            ValueError: If no model is configured or a name is used twice
+        """
+        if not configs:
+            raise ValueError("At least one model must be configured")
+        seen = set()
+        for config in configs:
+            for name in [config.id, *config.aliases]:
+                if name in seen:
+                    raise ValueError(f"Model name {name!r} is configured twice")
+                seen.add(name)
+
+        routes: Dict[str, ModelRoute] = {}
+        names: Dict[str, ModelRoute] = {}
+        with self._lock:
+            for config in configs:
+                endpoints = [self._endpoint(config, url) for url in config.endpoints]
+                route = ModelRoute(
+                    config,
+                    endpoints,
+                    self._lock,
+                    routing=config.routing or self.routing,
+                    load_factor=self.affinity_load_factor,
+                )
+                routes[config.id] = route
+                for name in [config.id, *config.aliases]:
+                    names[name] = route
+            self.routes, self._names = routes, names
+        for route in routes.values():
+            for endpoint in route.endpoints:
+                CONCURRENCY_LIMIT.set(endpoint.capacity(), model=route.config.id, endpoint=endpoint.url)
+
+    def get(self, model: str) -> ModelRoute:
+        """Look up a model by id or alias.
+
+        Raises:
+            ModelNotFoundError: If the model isn't configured
+        """
+        route = self._names.get(model)
+        if route is None:
+            raise ModelNotFoundError(f"The model '{model}' does not exist")
+        return route
+
+    def configs(self) -> List[ModelConfig]:
+        """Configured models, in order."""
+        return [route.config for route in self.routes.values()]
+
+    def endpoint_urls(self) -> List[str]:
+        """All distinct upstream base URLs."""
+        urls = []
+        for route in self.routes.values():
+            for endpoint in route.endpoints:
+                if endpoint.url not in urls:
+                    urls.append(endpoint.url)
+        return urls
+
+    def probe_paths(self) -> Dict[str, Tuple[str, Optional[str]]]:
+        """Health check and queue status paths of each distinct upstream."""
+        paths = {}
+        for route in self.routes.values():
+            for endpoint in route.endpoints:
+                client = endpoint.client
+                paths.setdefault(endpoint.url, (client.health_path, client.queue_status_path))
+        return paths
+
+
+def load_model_configs(path: Optional[str], default_model: str, default_base_url: str) -> List[ModelConfig]:
+    """Load model configs from a JSON file.
+
+    The file holds ``{"models": [...]}`` (or just the list), each entry
+    matching ModelConfig. Without a file, a single model is served from
+    the default base URL.
+
+    Args:
+        path: JSON file path, or None
+        default_model: Model id when no file is given
+        default_base_url: Upstream URL when no file is given
+
+    Returns:
+        Model configs
+    """
+    if not path:
+        return [ModelConfig(id=default_model, endpoints=[default_base_url])]
+    with open(path) as f:
+        raw = json.load(f)
+    if isinstance(raw, dict):
+        raw = raw.get("models", [])
+    return [ModelConfig(**entry) for entry in raw]
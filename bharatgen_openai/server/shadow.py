@@ -0,0 +1,221 @@
+"""Shadow traffic: mirror sampled completions to a candidate upstream.
+
+A sampled request is sent again to the shadow backend on a dedicated
+thread pool as the primary completion is dispatched. The shadow
+answer is read and discarded; its latency, time to first token and length
+are paired with the primary's when both have finished. The primary never
+waits on the shadow: when the shadow pool is busy, the sample is dropped.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Deque, Dict, Hashable, List, NamedTuple, Optional, Tuple
+
+from ..backends import ChatBackend
+from ..metrics import REGISTRY
+
+SHADOW_REQUESTS = REGISTRY.counter(
+    "bharatgen_shadow_requests_total",
+    "Completions mirrored to the shadow upstream",
+    ["result"],
+)
+SHADOW_INFLIGHT = REGISTRY.gauge(
+    "bharatgen_shadow_inflight",
+    "Shadow completions in flight",
+)
+
+
+class Outcome(NamedTuple):
+    """How one side of a mirrored request went."""
+
+    latency: float  # Seconds from dispatch to the end of the answer
+    ttft: Optional[float]  # Seconds from dispatch to the first token
+    completion_tokens: int
+    failed: bool
+
+
+def _summarize(values: List[float]) -> dict:
+    """p50, p95 and mean of some values (nearest rank)."""
+    if not values:
+        return {"p50": None, "p95": None, "mean": None}
+    ordered = sorted(values)
+
+    def rank(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+    return {"p50": rank(0.5), "p95": rank(0.95), "mean": round(sum(ordered) / len(ordered), 3)}
+
+
+def _compare(pairs: List[Tuple[float, float]]) -> dict:
+    """Both sides' distributions plus the median per-request shadow/primary ratio."""
+    ratios = [shadow / primary for primary, shadow in pairs if primary > 0]
+    return {
+        "primary": _summarize([primary for primary, _ in pairs]),
+        "shadow": _summarize([shadow for _, shadow in pairs]),
+        "shadow_vs_primary": _summarize(ratios)["p50"],
+    }
+
+
+class ShadowMirror:
+    """Fire-and-forget mirroring of sampled completions, with a comparison report."""
+
+    def __init__(
+        self,
+        backend: ChatBackend,
+        sample_rate: float = 0.0,
+        max_concurrency: int = 4,
+        window: int = 1000,
+    ):
+        """Initialize mirror.
+
+        Args:
+            backend: Shadow upstream
+            sample_rate: Fraction of completions to mirror (0 disables)
+            max_concurrency: Max shadow completions in flight; samples
+                beyond it are dropped
+            window: Paired samples kept per model for the report
+        """
+        self.backend = backend
+        self.sample_rate = sample_rate
+        self.max_concurrency = max_concurrency
+        self.window = window
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="shadow")
+        self._inflight = 0
+        # Primary request (its trace) -> model and the outcomes known so far
+        self._pending: Dict[Hashable, dict] = {}
+        self._pairs: Dict[str, Deque[Tuple[Outcome, Outcome]]] = {}
+        self._recent: Deque[Tuple[str, Outcome, Outcome]] = deque(maxlen=100)
+        self._lock = threading.Lock()
+
+    def mirror(self, key: Hashable, model: str, messages: List[dict], params: dict) -> bool:
+        """Maybe send a copy of a dispatched request to the shadow upstream.
+
+        Only takes a lock and submits to the shadow pool; never blocks.
+
+        Args:
+            key: Identifies the primary request in record_primary (its trace)
+            model: Model id of the primary request
+            messages: Request messages (not modified)
+            params: Generation parameters the client set
+
+        Returns:
+            Whether the request was mirrored
+        """
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return False
+        with self._lock:
+            if self._inflight >= self.max_concurrency:
+                SHADOW_REQUESTS.inc(result="dropped")
+                return False
+            self._inflight += 1
+            self._pending[key] = {"model": model}
+            SHADOW_INFLIGHT.set(self._inflight)
+        self._executor.submit(self._run, key, model, messages, params)
+        return True
+
+    def _run(self, key: Hashable, model: str, messages: List[dict], params: dict):
+        start = time.perf_counter()
+        ttft = None
+        completion_tokens = 0
+        failed = False
+        try:
+            for chunk in self.backend.create(messages=messages, model=model, stream=True, **params):
+                if ttft is None and chunk.choices[0].delta.content:
+                    ttft = time.perf_counter() - start
+                if chunk.usage is not None:
+                    completion_tokens = chunk.usage.completion_tokens
+        except Exception:
+            failed = True
+        latency = time.perf_counter() - start
+        with self._lock:
+            self._inflight -= 1
+            SHADOW_INFLIGHT.set(self._inflight)
+        SHADOW_REQUESTS.inc(result="error" if failed else "ok")
+        self._complete(key, "shadow", Outcome(latency, ttft, completion_tokens, failed))
+
+    def record_primary(self, key: Hashable, outcome: Outcome):
+        """Report how the primary completion went (ignored unless it was mirrored).
+
+        Args:
+            key: Key passed to mirror
+            outcome: Primary latency, time to first token and length
+        """
+        self._complete(key, "primary", outcome)
+
+    def _complete(self, key: Hashable, side: str, outcome: Outcome):
+        with self._lock:
+            entry = self._pending.get(key)
+            if entry is None:
+                return
+            entry[side] = outcome
+            if "primary" in entry and "shadow" in entry:
+                del self._pending[key]
+                pairs = self._pairs.get(entry["model"])
+                if pairs is None:
+                    pairs = self._pairs[entry["model"]] = deque(maxlen=self.window)
+                pairs.append((entry["primary"], entry["shadow"]))
+                self._recent.append((entry["model"], entry["primary"], entry["shadow"]))
+
+    def report(self, recent: int = 20) -> dict:
+        """Compare primary and shadow per model over the recent window.
+
+        Latency and time to first token are in milliseconds, counted from
+        each side's dispatch, so local admission waits aren't included.
+        Distributions only use requests that succeeded on both sides.
+
+        Args:
+            recent: Latest paired requests to list individually (max 100)
+
+        Returns:
+            Report dict
+        """
+        with self._lock:
+            pairs = {model: list(samples) for model, samples in self._pairs.items()}
+            latest = list(self._recent)[-recent:] if recent > 0 else []
+            inflight = self._inflight
+
+        models = {}
+        for model, samples in pairs.items():
+            ok = [(p, s) for p, s in samples if not p.failed and not s.failed]
+            models[model] = {
+                "samples": len(samples),
+                "primary_errors": sum(p.failed for p, _ in samples),
+                "shadow_errors": sum(s.failed for _, s in samples),
+                "latency_ms": _compare([(p.latency * 1000, s.latency * 1000) for p, s in ok]),
+                "ttft_ms": _compare([
+                    (p.ttft * 1000, s.ttft * 1000) for p, s in ok if p.ttft is not None and s.ttft is not None
+                ]),
+                "completion_tokens": _compare([(p.completion_tokens, s.completion_tokens) for p, s in ok]),
+            }
+
+        return {
+            "backend": self.backend.name,
+            "upstream": self.backend.base_url,
+            "sample_rate": self.sample_rate,
+            "max_concurrency": self.max_concurrency,
+            "inflight": inflight,
+            "models": models,
+            "recent": [
+                {
+                    "model": model,
+                    **{
+                        side: {
+                            "latency_ms": round(outcome.latency * 1000, 1),
+                            "ttft_ms": None if outcome.ttft is None else round(outcome.ttft * 1000, 1),
+                            "completion_tokens": outcome.completion_tokens,
+                            "failed": outcome.failed,
+                        }
+                        for side, outcome in (("primary", p), ("shadow", s))
+                    },
+                }
+                for model, p, s in latest
+            ],
+        }
+
+    def close(self):
+        """Stop mirroring and abandon queued shadow requests."""
+        self.sample_rate = 0.0
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,231 @@
+"""Background upstream prober and readiness state."""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import requests
+
+from ..metrics import REGISTRY
+from ..transport import Estimation
+
+UPSTREAM_QUEUE_SIZE = REGISTRY.gauge(
+    "bharatgen_upstream_queue_size",
+    "Jobs waiting in each upstream's Gradio queue",
+    ["upstream"],
+)
+UPSTREAM_QUEUE_ETA = REGISTRY.gauge(
+    "bharatgen_upstream_queue_eta_seconds",
+    "Gradio's estimate of the wait in each upstream's queue",
+    ["upstream"],
+)
+
+
+# Gradio's cheap info endpoint and queue status endpoint
+GRADIO_PROBE_PATHS = ("/info", "/queue/status")
+
+
+class UpstreamProber:
+    """Warm up and periodically probe upstreams.
+
+    Probes go through the client's pooled session, so warm-up leaves
+    connections (TCP + TLS) open for the first real requests. Results are
+    cached; readiness checks only read the cache.
+
+    Each probe of a Gradio upstream also reads its queue status;
+    estimation messages received by queue-transport jobs update it in
+    between.
+    """
+
+    def __init__(
+        self,
+        session: requests.Session,
+        base_urls: List[str],
+        interval: float = 15.0,
+        timeout: float = 5.0,
+        warm_connections: int = 4,
+    ):
+        """Initialize prober.
+
+        Args:
+            session: Pooled session shared with the client
+            base_urls: Upstream base URLs to probe (as Gradio apps until
+                set_base_urls gives their probe paths)
+            interval: Seconds between probes
+            timeout: Probe request timeout
+            warm_connections: Concurrent probes per upstream at startup
+        """
+        self.session = session
+        self.base_urls = list(base_urls)
+        self.interval = interval
+        self.timeout = timeout
+        self.warm_connections = warm_connections
+        self._status: Dict[str, dict] = {
+            url: {"healthy": False, "latency_ms": None, "checked_at": None, "error": "not probed yet"}
+            for url in self.base_urls
+        }
+        self._queues: Dict[str, dict] = {}
+        self._paths: Dict[str, Tuple[str, Optional[str]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def probe(self, base_url: str) -> dict:
+        """Probe one upstream with a cheap call and cache the result.
+
+        Args:
+            base_url: Upstream base URL
+
+        Returns:
+            Probe result
+        """
+        health_path, queue_path = self._paths.get(base_url, GRADIO_PROBE_PATHS)
+        start = time.perf_counter()
+        try:
+            response = self.session.get(f"{base_url}{health_path}", timeout=self.timeout)
+            response.close()
+            healthy = response.ok
+            error = None if healthy else f"HTTP {response.status_code}"
+        except requests.RequestException as e:
+            healthy = False
+            error = str(e)
+
+        result = {
+            "healthy": healthy,
+            "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+            "checked_at": time.time(),
+            "error": error,
+        }
+        with self._lock:
+            if base_url in self._status:  # Not removed by a reload meanwhile
+                self._status[base_url] = result
+        if healthy and queue_path:
+            self.probe_queue(base_url, queue_path)
+        return result
+
+    def probe_queue(self, base_url: str, path: str = "/queue/status"):
+        """Read an upstream's Gradio queue status; failures are ignored.
+
+        Args:
+            base_url: Gradio API base URL
+            path: Queue status path
+        """
+        try:
+            response = self.session.get(f"{base_url}{path}", timeout=self.timeout)
+            data = response.json() if response.ok else None
+            response.close()
+        except (requests.RequestException, ValueError):
+            return
+        if isinstance(data, dict):
+            self.record_queue(
+                base_url, Estimation(None, data.get("queue_size"), data.get("queue_eta"))
+            )
+
+    def record_queue(self, base_url: str, estimation: Estimation):
+        """Store the latest queue estimate of an upstream.
+
+        Called from probes and from queue-transport reader threads.
+
+        Args:
+            base_url: Gradio API base URL
+            estimation: Estimate carrying the upstream's queue size and ETA
+        """
+        if estimation.queue_size is None:
+            return
+        with self._lock:
+            if base_url not in self._status:
+                return
+            self._queues[base_url] = {
+                "queue_size": estimation.queue_size,
+                "queue_eta": estimation.eta,
+                "updated_at": time.time(),
+            }
+        UPSTREAM_QUEUE_SIZE.set(estimation.queue_size, upstream=base_url)
+        if estimation.eta is not None:
+            UPSTREAM_QUEUE_ETA.set(estimation.eta, upstream=base_url)
+
+    def queue_depth(self, base_url: str) -> int:
+        """Jobs waiting in an upstream's queue (0 when unknown or stale)."""
+        with self._lock:
+            queue = self._queues.get(base_url)
+        if queue is None or time.time() - queue["updated_at"] >= 3 * self.interval + self.timeout:
+            return 0
+        return queue["queue_size"]
+
+    def warm_up(self, base_urls: Optional[List[str]] = None):
+        """Open several pooled connections per upstream concurrently.
+
+        Args:
+            base_urls: Upstreams to warm up (default: all)
+        """
+        urls = self.base_urls if base_urls is None else base_urls
+        if not urls:
+            return
+        count = max(1, self.warm_connections)
+        with ThreadPoolExecutor(max_workers=count * len(urls)) as executor:
+            for url in urls:
+                for _ in range(count):
+                    executor.submit(self.probe, url)
+
+    def _run(self):
+        self.warm_up()
+        while not self._stop.wait(self.interval):
+            for url in list(self.base_urls):
+                self.probe(url)
+
+    def start(self):
+        """Start warm-up and periodic probing in a daemon thread."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="upstream-prober", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop periodic probing."""
+        self._stop.set()
+
+    def set_base_urls(
+        self, base_urls: List[str], probe_paths: Optional[Dict[str, Tuple[str, Optional[str]]]] = None
+    ):
+        """Replace the probed upstreams, warming up new ones in the background.
+
+        Args:
+            base_urls: Upstream base URLs to probe from now on
+            probe_paths: Health check path and queue status path (None if
+                the upstream has no Gradio queue) per URL; URLs without an
+                entry are probed as Gradio apps
+        """
+        with self._lock:
+            self._paths = dict(probe_paths or {})
+            added = [url for url in base_urls if url not in self._status]
+            self._status = {
+                url: self._status.get(url)
+                or {"healthy": False, "latency_ms": None, "checked_at": None, "error": "not probed yet"}
+                for url in base_urls
+            }
+            self._queues = {url: q for url, q in self._queues.items() if url in self._status}
+            self.base_urls = list(base_urls)
+        if added and self._thread is not None:
+            threading.Thread(
+                target=self.warm_up, args=(added,), name="upstream-warm-up", daemon=True
+            ).start()
+
+    def status(self) -> Dict[str, dict]:
+        """Get cached probe results (and queue estimates, if known) per upstream."""
+        with self._lock:
+            return {
+                url: {**result, **({"queue": dict(self._queues[url])} if url in self._queues else {})}
+                for url, result in self._status.items()
+            }
+
+    def is_healthy(self, base_url: str) -> bool:
+        """Whether an upstream's last probe succeeded and is recent."""
+        with self._lock:
+            result = self._status.get(base_url)
+        if result is None or not result["healthy"]:
+            return False
+        return time.time() - result["checked_at"] < 3 * self.interval + self.timeout
+
+    def is_ready(self) -> bool:
+        """Whether at least one upstream is healthy."""
+        return any(self.is_healthy(url) for url in self.base_urls)
@@ -0,0 +1,264 @@
+"""Per-key usage ledger with write-behind batching.
+
+Requests only update in-memory counters; a background thread upserts them
+into SQLite in one transaction per flush, so recording never waits on
+disk. Usage is kept per API key id, model and hour.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..metrics import REGISTRY
+
+USAGE_FLUSHES = REGISTRY.counter(
+    "bharatgen_usage_flushes_total",
+    "Usage ledger flushes to the local store",
+    ["result"],
+)
+USAGE_PENDING = REGISTRY.gauge(
+    "bharatgen_usage_pending_rows",
+    "Usage rows recorded in memory and not yet flushed",
+)
+
+BUCKET_SECONDS = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    key_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    period INTEGER NOT NULL,
+    requests INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    prompt_tokens INTEGER NOT NULL,
+    completion_tokens INTEGER NOT NULL,
+    latency_sum REAL NOT NULL,
+    latency_max REAL NOT NULL,
+    PRIMARY KEY (key_id, model, period)
+)
+"""
+
+_UPSERT = """
+INSERT INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (key_id, model, period) DO UPDATE SET
+    requests = requests + excluded.requests,
+    errors = errors + excluded.errors,
+    prompt_tokens = prompt_tokens + excluded.prompt_tokens,
+    completion_tokens = completion_tokens + excluded.completion_tokens,
+    latency_sum = latency_sum + excluded.latency_sum,
+    latency_max = MAX(latency_max, excluded.latency_max)
+"""
+
+# Row order: requests, errors, prompt_tokens, completion_tokens, latency_sum, latency_max
+_Key = Tuple[str, str, int]
+
+
+def api_key_id(api_key: str) -> str:
+    """Stable id for an API key, so the ledger never stores keys themselves."""
+    return "key_" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+
+
+class UsageLedger:
+    """Usage counters per API key and model, flushed to SQLite in batches.
+
+    The database is opened by ``start`` (or the first flush or query), so
+    creating a ledger doesn't touch the disk.
+    """
+
+    def __init__(self, path: str = "usage.db", flush_interval: float = 5.0):
+        """Initialize ledger (the store opens with ``start``).
+
+        Args:
+            path: SQLite database file (``:memory:`` keeps nothing on disk)
+            flush_interval: Seconds between background flushes
+        """
+        self.path = path
+        self.flush_interval = flush_interval
+        self._pending: Dict[_Key, list] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open the store and create the table on first use (call with _db_lock held)."""
+        if self._db is None:
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            try:
+                with db:
+                    db.execute(_SCHEMA)
+            except sqlite3.Error:
+                db.close()
+                raise
+            self._db = db
+        return self._db
+
+    def record(
+        self,
+        key: str,
+        model: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        latency: float = 0.0,
+        failed: bool = False,
+    ):
+        """Add one request to the in-memory counters.
+
+        Args:
+            key: API key id (see api_key_id)
+            model: Model id
+            prompt_tokens: Prompt tokens of the request
+            completion_tokens: Completion tokens of the request
+            latency: Seconds the request took
+            failed: Whether the request failed
+        """
+        bucket = (key, model, int(time.time()) // BUCKET_SECONDS * BUCKET_SECONDS)
+        with self._lock:
+            row = self._pending.get(bucket)
+            if row is None:
+                row = self._pending[bucket] = [0, 0, 0, 0, 0.0, 0.0]
+            row[0] += 1
+            row[1] += int(failed)
+            row[2] += prompt_tokens
+            row[3] += completion_tokens
+            row[4] += latency
+            row[5] = max(row[5], latency)
+            pending = len(self._pending)
+        USAGE_PENDING.set(pending)
+
+    def flush(self) -> int:
+        """Write pending counters to the store in one transaction.
+
+        Counters are kept for the next flush if the write fails.
+
+        Returns:
+            Number of rows written
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        rows = [(*bucket, *row) for bucket, row in pending.items()]
+        try:
+            with self._db_lock:
+                db = self._connection()
+                with db:
+                    db.executemany(_UPSERT, rows)
+        except sqlite3.Error as e:
+            print(f"Usage ledger flush failed, retrying later: {e}")
+            USAGE_FLUSHES.inc(result="error")
+            self._merge_back(pending)
+            return 0
+        USAGE_FLUSHES.inc(result="ok")
+        with self._lock:
+            USAGE_PENDING.set(len(self._pending))
+        return len(rows)
+
+    def _merge_back(self, pending: Dict[_Key, list]):
+        with self._lock:
+            for bucket, old in pending.items():
+                row = self._pending.get(bucket)
+                if row is None:
+                    self._pending[bucket] = old
+                else:
+                    self._pending[bucket] = [a + b for a, b in zip(row[:5], old[:5])] + [max(row[5], old[5])]
+
+    def query(
+        self,
+        key: Optional[str] = None,
+        model: Optional[str] = None,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        group_by: Optional[str] = None,
+    ) -> List[dict]:
+        """Aggregate usage, including counters not flushed yet.
+
+        Usage is bucketed by hour, so ``start`` and ``end`` select whole hours.
+
+        Args:
+            key: Only this API key id
+            model: Only this model
+            start: Unix time of the first hour included
+            end: Unix time before which usage is included
+            group_by: Also split by ``hour`` or ``day`` (UTC)
+
+        Returns:
+            One dict per key id and model (and period), with request, error
+            and token counts and average/max latency
+
+        Raises:
+            ValueError: If group_by isn't supported
+        """
+        periods = {None: None, "hour": "period", "day": "period - period % 86400"}
+        if group_by not in periods:
+            raise ValueError(f"Unsupported group_by: {group_by}")
+        self.flush()
+
+        conditions, params = [], []
+        for column, op, value in (
+            ("key_id", "=", key),
+            ("model", "=", model),
+            ("period", ">=", None if start is None else int(start) // BUCKET_SECONDS * BUCKET_SECONDS),
+            ("period", "<", end),
+        ):
+            if value is not None:
+                conditions.append(f"{column} {op} ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        period = periods[group_by]
+        columns = "key_id, model" + (f", {period}" if period else "")
+        sql = (
+            f"SELECT {columns}, SUM(requests), SUM(errors), SUM(prompt_tokens), "
+            f"SUM(completion_tokens), SUM(latency_sum), MAX(latency_max) "
+            f"FROM usage {where} GROUP BY {columns} ORDER BY {columns}"
+        )
+        with self._db_lock:
+            rows = self._connection().execute(sql, params).fetchall()
+
+        results = []
+        for row in rows:
+            if period:
+                (key_value, model_value, period_value), counts = row[:3], row[3:]
+            else:
+                (key_value, model_value), counts, period_value = row[:2], row[2:], None
+            requests, errors, prompt_tokens, completion_tokens, latency_sum, latency_max = counts
+            result = {"key_id": key_value, "model": model_value}
+            if period_value is not None:
+                result["period_start"] = period_value
+            result.update(
+                requests=requests,
+                errors=errors,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                total_tokens=prompt_tokens + completion_tokens,
+                avg_latency_ms=round(latency_sum / requests * 1000, 1) if requests else None,
+                max_latency_ms=round(latency_max * 1000, 1),
+            )
+            results.append(result)
+        return results
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        """Open the store and start background flushing in a daemon thread."""
+        with self._db_lock:
+            self._connection()
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="usage-flush", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """Stop background flushing, write what's left and close the store."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,171 @@
+"""Multi-turn chat over one WebSocket connection.
+
+The connection authenticates once and then carries any number of turns,
+several of them concurrently. Client frames are JSON objects:
+
+- ``{"type": "chat", "id": "t1", "conversation": "c1", "model": "...",
+  "content": "Hi"}`` starts a turn. ``content`` is appended to the
+  conversation the server keeps for this connection; ``messages`` instead
+  replaces that history. ``temperature``, ``max_tokens``, ``top_p``,
+  ``include_reasoning`` and ``reasoning_effort`` work as in
+  ``/v1/chat/completions``.
+- ``{"type": "cancel", "id": "t1"}`` stops a turn.
+- ``{"type": "reset", "conversation": "c1"}`` forgets a conversation.
+- ``{"type": "ping"}`` is answered with ``{"type": "pong"}``.
+
+The server answers with ``ChatCompletionChunk`` objects that carry an
+extra ``turn`` field, and with ``{"type": ..., "turn": ...}`` frames for
+queue positions. Every turn ends with exactly one ``done``, ``error`` or
+``cancelled`` frame.
+"""
+
+import asyncio
+import json
+import uuid
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from ..models import ChatCompletionRequest, ErrorResponse
+
+# Runs one turn: gets the request and a per-turn send function, returns the
+# assistant's full answer
+TurnRunner = Callable[[ChatCompletionRequest, Callable[[dict], Awaitable[None]]], Awaitable[str]]
+
+
+class ChatSocket:
+    """One authenticated WebSocket connection carrying many chat turns."""
+
+    def __init__(
+        self,
+        websocket: WebSocket,
+        run_turn: TurnRunner,
+        describe_error: Callable[[Exception], ErrorResponse],
+        max_turns: int = 8,
+    ):
+        """Initialize connection state.
+
+        Args:
+            websocket: Accepted and authenticated WebSocket
+            run_turn: Streams one completion through the send function it gets
+            describe_error: Maps a failed turn's exception to an error body
+            max_turns: Max concurrent turns on this connection
+        """
+        self.websocket = websocket
+        self.run_turn = run_turn
+        self.describe_error = describe_error
+        self.max_turns = max_turns
+        self.conversations: Dict[str, List[dict]] = {}
+        self.turns: Dict[str, asyncio.Task] = {}
+        self.busy: Set[str] = set()
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, frame: dict):
+        """Send one JSON frame; frames of concurrent turns don't interleave."""
+        async with self._send_lock:
+            await self.websocket.send_text(json.dumps(frame))
+
+    async def send_error(self, turn: Optional[str], message: str, code: str, type: str = "invalid_request_error"):
+        error = ErrorResponse.create(message=message, type=type, code=code)
+        await self.send({"type": "error", "turn": turn, **error.model_dump()})
+
+    async def run(self):
+        """Handle client frames until the connection closes; then cancel open turns."""
+        try:
+            while True:
+                text = await self.websocket.receive_text()
+                try:
+                    frame = json.loads(text)
+                except json.JSONDecodeError:
+                    frame = None
+                if not isinstance(frame, dict):
+                    await self.send_error(None, "Frames must be JSON objects", "invalid_frame")
+                    continue
+                await self.handle(frame)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for task in self.turns.values():
+                task.cancel()
+            await asyncio.gather(*self.turns.values(), return_exceptions=True)
+
+    async def handle(self, frame: dict):
+        """Dispatch one client frame."""
+        kind = frame.get("type")
+        if kind == "chat":
+            await self.start_turn(frame)
+        elif kind == "cancel":
+            task = self.turns.get(str(frame.get("id")))
+            if task is not None:
+                task.cancel()
+        elif kind == "reset":
+            conversation = str(frame.get("conversation", "default"))
+            if conversation in self.busy:
+                await self.send_error(None, f"Conversation {conversation!r} has a turn running", "conversation_busy")
+            else:
+                self.conversations.pop(conversation, None)
+        elif kind == "ping":
+            await self.send({"type": "pong"})
+        else:
+            await self.send_error(None, f"Unknown frame type: {kind}", "invalid_frame")
+
+    async def start_turn(self, frame: dict):
+        """Validate a chat frame and run it as a background task."""
+        turn = str(frame.get("id") or f"turn-{uuid.uuid4().hex[:12]}")
+        conversation = str(frame.get("conversation", "default"))
+        if turn in self.turns:
+            return await self.send_error(turn, f"Turn {turn!r} is already running", "duplicate_turn")
+        if len(self.turns) >= self.max_turns:
+            return await self.send_error(
+                turn, f"At most {self.max_turns} turns can run at once", "too_many_turns"
+            )
+        if conversation in self.busy:
+            return await self.send_error(
+                turn, f"Conversation {conversation!r} has a turn running", "conversation_busy"
+            )
+
+        if "messages" in frame:
+            messages = frame["messages"]
+        elif isinstance(frame.get("content"), str):
+            messages = self.conversations.get(conversation, []) + [
+                {"role": "user", "content": frame["content"]}
+            ]
+        else:
+            return await self.send_error(turn, "A chat frame needs 'content' or 'messages'", "invalid_frame")
+        body = {name: frame[name] for name in ("model", "temperature", "max_tokens", "top_p", "include_reasoning", "reasoning_effort") if name in frame}
+        try:
+            request = ChatCompletionRequest(**body, messages=messages, stream=True)
+        except ValidationError as e:
+            return await self.send_error(turn, f"Validation error: {str(e)}", "invalid_request")
+
+        self.busy.add(conversation)
+        self.turns[turn] = asyncio.create_task(self._run_turn(turn, conversation, request))
+
+    async def _run_turn(self, turn: str, conversation: str, request: ChatCompletionRequest):
+        async def send(frame: dict):
+            await self.send({**frame, "turn": turn})
+
+        try:
+            content = await self.run_turn(request, send)
+            # The answer becomes part of the conversation only once it's complete
+            self.conversations[conversation] = [
+                message.model_dump() for message in request.messages
+            ] + [{"role": "assistant", "content": content}]
+            end = {"type": "done", "turn": turn}
+        except asyncio.CancelledError:
+            end = {"type": "cancelled", "turn": turn}
+        except Exception as e:
+            end = {"type": "error", "turn": turn, **self.describe_error(e).model_dump()}
+        finally:
+            self.turns.pop(turn, None)
+            self.busy.discard(conversation)
+        # Sent last, so the turn id and conversation are free again once it arrives
+        await self._send_quietly(end)
+
+    async def _send_quietly(self, frame: dict):
+        """Send a frame unless the connection is already gone."""
+        try:
+            await self.send(frame)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
@@ -0,0 +1,187 @@
+"""Byte-level Server-Sent Events decoder."""
+
+import re
+from functools import partial
+from typing import Iterator, List, NamedTuple, Optional
+
+
+# Line terminators per the SSE spec: CRLF, LF or a lone CR
+_LINE_END = re.compile(rb"\r\n|\n|\r")
+
+
+class SSEEvent(NamedTuple):
+    """A dispatched SSE event."""
+
+    event: str
+    data: str
+    id: Optional[str]
+    size: int  # Bytes of the raw frame, including terminators
+
+
+class SSEDecoder:
+    """Incremental SSE decoder working on raw bytes.
+
+    Frames are split on the undecoded buffer, and only complete lines are
+    decoded. A line terminator byte can never occur inside a multi-byte
+    UTF-8 sequence, so characters split across network reads are never
+    corrupted. Multi-line ``data:`` fields are joined with newlines as the
+    spec requires; ``event:``, ``id:`` and ``retry:`` are honoured.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.last_event_id: Optional[str] = None
+        self.retry: Optional[int] = None
+        self._event = ""
+        self._data: List[str] = []
+        self._size = 0
+        self._scanned = 0  # Bytes of the buffer known to hold no line end
+        self._started = False
+
+    def feed(self, chunk: bytes) -> List[SSEEvent]:
+        """Feed raw bytes and return the events completed by them.
+
+        Args:
+            chunk: Bytes read from the stream
+
+        Returns:
+            Dispatched events, in order
+        """
+        buffer = self.buffer
+        buffer += chunk
+        if not self._started:
+            if len(buffer) < 3 and b"\xef\xbb\xbf".startswith(bytes(buffer)):
+                return []
+            if buffer.startswith(b"\xef\xbb\xbf"):
+                del buffer[:3]
+            self._started = True
+
+        events = []
+        pos = 0
+        end = len(buffer)
+        # Don't rescan the start of a long line on every read
+        search_from = self._scanned
+        with memoryview(buffer) as view:
+            while pos < end:
+                match = _LINE_END.search(buffer, search_from)
+                if match is None:
+                    search_from = end
+                    break
+                line_end, next_pos = match.span()
+                if next_pos == end and next_pos - line_end == 1 and buffer[line_end] == 0x0D:
+                    search_from = line_end
+                    break  # Lone CR at the end may be the first half of CRLF
+                self._size += next_pos - pos
+                event = self._process_line(view[pos:line_end])
+                if event is not None:
+                    events.append(event)
+                pos = search_from = next_pos
+        self._scanned = search_from - pos
+        if pos:
+            del buffer[:pos]
+        return events
+
+    def _process_line(self, line: memoryview) -> Optional[SSEEvent]:
+        if not line:
+            return self._dispatch()
+        if line[0] == 0x3A:  # ':' comment
+            return None
+
+        text = str(line, "utf-8", "replace")
+        field, sep, value = text.partition(":")
+        if sep and value.startswith(" "):
+            value = value[1:]
+
+        if field == "data":
+            self._data.append(value)
+        elif field == "event":
+            self._event = value
+        elif field == "id":
+            if "\0" not in value:
+                self.last_event_id = value
+        elif field == "retry":
+            if value.isdigit():
+                self.retry = int(value)
+        return None
+
+    def _dispatch(self) -> Optional[SSEEvent]:
+        size, self._size = self._size, 0
+        if not self._data:
+            self._event = ""
+            return None
+        event = SSEEvent(
+            event=self._event or "message",
+            data="\n".join(self._data),
+            id=self.last_event_id,
+            size=size,
+        )
+        self._event = ""
+        self._data = []
+        return event
+
+
+def iter_response_chunks(response, chunk_size: int = 65536) -> Iterator[bytes]:
+    """Read a streaming response in large chunks without waiting to fill them.
+
+    Uses urllib3's ``read1`` (returns whatever is available, up to
+    ``chunk_size``) and falls back to small ``iter_content`` reads when the
+    underlying response doesn't support it. requests opens the raw stream
+    without content decoding, so ``read1`` is asked to undo any
+    ``Content-Encoding`` (gzip, deflate) itself.
+
+    Args:
+        response: Streaming requests.Response
+        chunk_size: Max bytes per read
+
+    Yields:
+        Raw byte chunks
+    """
+    raw = getattr(response, "raw", None)
+    read1 = getattr(raw, "read1", None)
+    if read1 is None:
+        yield from response.iter_content(chunk_size=512)
+        return
+    if hasattr(raw, "decode_content"):  # urllib3 response
+        read1 = partial(read1, decode_content=True)
+
+    while True:
+        chunk = read1(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+    release_conn = getattr(raw, "release_conn", None)
+    if release_conn is not None:
+        release_conn()
+
+
+def iter_sse_batches(response, chunk_size: int = 65536) -> Iterator[List[SSEEvent]]:
+    """Decode the SSE events of a streaming response, grouped by network read.
+
+    Args:
+        response: Streaming requests.Response
+        chunk_size: Max bytes per read
+
+    Yields:
+        Non-empty lists of the SSEEvent objects each read completed
+    """
+    decoder = SSEDecoder()
+    for chunk in iter_response_chunks(response, chunk_size):
+        events = decoder.feed(chunk)
+        if events:
+            yield events
+
+
+def iter_sse_events(response, chunk_size: int = 65536) -> Iterator[SSEEvent]:
+    """Decode the SSE events of a streaming response.
+
+    Args:
+        response: Streaming requests.Response
+        chunk_size: Max bytes per read
+
+    Yields:
+        SSEEvent objects
+    """
+    decoder = SSEDecoder()
+    for chunk in iter_response_chunks(response, chunk_size):
+        yield from decoder.feed(chunk)
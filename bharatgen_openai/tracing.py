@@ -0,0 +1,381 @@
+"""Per-request tracing with phase timings.
+
+A ``RequestTrace`` collects the time spent in each phase of a completion
+(auth, validation, admission, the upstream POST, parsing, serialization) plus
+point-in-time marks such as the first SSE byte, the first upstream data event
+and the first visible token.
+Finished traces are handed to a pluggable exporter.
+"""
+
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+import uuid
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Optional
+
+import requests
+
+
+# Phase names (also used as Server-Timing metric names)
+AUTH = "auth"
+VALIDATION = "validation"
+ADMISSION = "admission"
+UPSTREAM_POST = "upstream_post"
+FIRST_BYTE = "first_byte"
+FIRST_EVENT = "first_event"  # First upstream data event (not a heartbeat or queue update)
+FIRST_TOKEN = "first_token"
+PARSE = "parse"
+SERIALIZE = "serialize"
+
+# Client-supplied request ids are echoed in headers and logs; others are replaced
+REQUEST_ID_PATTERN = re.compile(r"[A-Za-z0-9._-]{1,128}")
+
+
+class RequestTrace:
+    """Timings for a single request."""
+
+    def __init__(self, request_id: Optional[str] = None, exporter: Optional["SpanExporter"] = None):
+        """Initialize a trace.
+
+        Args:
+            request_id: Request ID (generated if not provided or not
+                matching REQUEST_ID_PATTERN)
+            exporter: Exporter that receives the trace on finish
+        """
+        if request_id is None or not REQUEST_ID_PATTERN.fullmatch(request_id):
+            request_id = f"req-{uuid.uuid4().hex[:24]}"
+        self.request_id = request_id
+        # Always unique, unlike a client-supplied request id
+        self.trace_id = uuid.uuid4().hex
+        self.exporter = exporter
+        self.attributes: Dict[str, object] = {}
+        self.start_time = time.time()
+        self.start = time.perf_counter()
+        self.spans: List[tuple] = []
+        self.totals: Dict[str, float] = {}
+        self.marks: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def record(self, name: str, start: float, end: float):
+        """Record a span from perf_counter timestamps."""
+        with self._lock:
+            self.spans.append((name, start - self.start, end - start))
+            self.totals[name] = self.totals.get(name, 0.0) + (end - start)
+
+    @contextmanager
+    def span(self, name: str):
+        """Time a block as a span."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter())
+
+    def add(self, name: str, duration: float):
+        """Accumulate time into a phase without recording a separate span.
+
+        Used for phases that run many times per request (parse, serialize).
+        """
+        with self._lock:
+            self.totals[name] = self.totals.get(name, 0.0) + duration
+
+    def mark(self, name: str):
+        """Record the first time a point event happens, relative to request start."""
+        if name not in self.marks:
+            self.marks[name] = time.perf_counter() - self.start
+
+    def summary(self) -> Dict[str, float]:
+        """Get phase durations and marks in milliseconds."""
+        with self._lock:
+            result = {name: round(total * 1000, 3) for name, total in self.totals.items()}
+        for name, offset in self.marks.items():
+            result[name] = round(offset * 1000, 3)
+        result["total"] = round((time.perf_counter() - self.start) * 1000, 3)
+        return result
+
+    def server_timing(self) -> str:
+        """Format the summary as a Server-Timing header value."""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.summary().items())
+
+    def to_dict(self) -> dict:
+        """Serialize the trace for exporters."""
+        with self._lock:
+            spans = [
+                {
+                    "name": name,
+                    "offset_ms": round(offset * 1000, 3),
+                    "duration_ms": round(duration * 1000, 3),
+                }
+                for name, offset, duration in self.spans
+            ]
+        return {
+            "request_id": self.request_id,
+            "trace_id": self.trace_id,
+            "start_time": self.start_time,
+            "attributes": self.attributes,
+            "spans": spans,
+            "summary": self.summary(),
+        }
+
+    def finish(self):
+        """Finish the trace and export it (only once)."""
+        if self._finished:
+            return
+        self._finished = True
+        if self.exporter is not None:
+            self.exporter.export(self.to_dict())
+
+
+class NullTrace:
+    """Trace that records nothing, used when no trace is passed."""
+
+    request_id = None
+
+    def record(self, name: str, start: float, end: float):
+        pass
+
+    def span(self, name: str):
+        return nullcontext()
+
+    def add(self, name: str, duration: float):
+        pass
+
+    def mark(self, name: str):
+        pass
+
+
+NULL_TRACE = NullTrace()
+
+
+class SpanExporter:
+    """Base class for trace exporters."""
+
+    def export(self, trace: dict):
+        """Export a finished trace."""
+        raise NotImplementedError
+
+    def start(self):
+        """Start background work (called at startup; export also starts it)."""
+
+    def close(self):
+        """Flush pending traces (called at shutdown)."""
+
+
+class JSONLWriter:
+    """Append JSON records to a file from a background thread.
+
+    Traces finish on the event loop, so callers only queue the record and
+    the thread does the encoding and file I/O.
+    """
+
+    _STOP = object()
+
+    def __init__(self, path: str, max_pending: int = 10000):
+        """Initialize writer.
+
+        Args:
+            path: Path of the JSONL file
+            max_pending: Max queued records; more are dropped
+        """
+        self.path = path
+        self._queue: queue.Queue = queue.Queue(maxsize=max_pending)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the writer thread (the first write also does)."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="jsonl-writer", daemon=True)
+                self._thread.start()
+
+    def write(self, record: dict) -> bool:
+        """Queue a record; returns False if it was dropped."""
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(record)
+            return True
+        except queue.Full:
+            return False  # Drop rather than block the request
+
+    def close(self, timeout: float = 5.0):
+        """Write what's queued and stop the thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            records = [self._queue.get()]
+            while records[-1] is not self._STOP:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = records[-1] is self._STOP
+            if stop:
+                records.pop()
+            if records:
+                try:
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.writelines(json.dumps(record, ensure_ascii=False) + "\n" for record in records)
+                except (OSError, TypeError, ValueError) as e:
+                    print(f"Can't write to {self.path}: {e}")
+            if stop:
+                return
+
+
+class JSONLSpanExporter(SpanExporter):
+    """Append each finished trace as one JSON line to a local file."""
+
+    def __init__(self, path: str):
+        """Initialize exporter.
+
+        Args:
+            path: Path of the JSONL file
+        """
+        self.path = path
+        self._writer = JSONLWriter(path)
+
+    def export(self, trace: dict):
+        self._writer.write(trace)
+
+    def start(self):
+        self._writer.start()
+
+    def close(self):
+        self._writer.close()
+
+
+class OTLPSpanExporter(SpanExporter):
+    """Send traces to an OTLP/HTTP (JSON) collector from a background thread."""
+
+    _STOP = object()
+
+    def __init__(self, endpoint: str, service_name: str = "bharatgen-openai", batch_size: int = 64):
+        """Initialize exporter.
+
+        Args:
+            endpoint: Collector traces URL (e.g. http://localhost:4318/v1/traces)
+            service_name: Value of the service.name resource attribute
+            batch_size: Max traces per POST
+        """
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the sender thread (the first export also does)."""
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="otlp-exporter", daemon=True)
+                self._thread.start()
+
+    def export(self, trace: dict):
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            pass  # Drop rather than block the request
+
+    def close(self, timeout: float = 5.0):
+        """Send what's queued and stop the thread."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(self._STOP)
+            self._thread.join(timeout)
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size and batch[-1] is not self._STOP:
+                try:
+                    batch.append(self._queue.get(timeout=1.0))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is self._STOP
+            if stop:
+                batch.pop()
+            if not batch:
+                continue
+            try:
+                requests.post(self.endpoint, json=self._to_otlp(batch), timeout=5)
+            except requests.RequestException:
+                pass
+
+    def _to_otlp(self, traces: List[dict]) -> dict:
+        """Convert traces to an OTLP ExportTraceServiceRequest."""
+        spans = []
+        for trace in traces:
+            trace_id = trace["trace_id"]
+            root_id = secrets.token_hex(8)
+            start_ns = int(trace["start_time"] * 1e9)
+            end_ns = start_ns + int(trace["summary"]["total"] * 1e6)
+            attributes = [{"key": "request_id", "value": {"stringValue": trace["request_id"]}}]
+            attributes += [
+                {"key": key, "value": {"stringValue": str(value)}}
+                for key, value in trace["attributes"].items()
+            ]
+            spans.append({
+                "traceId": trace_id,
+                "spanId": root_id,
+                "name": "chat.completion",
+                "kind": 2,
+                "startTimeUnixNano": str(start_ns),
+                "endTimeUnixNano": str(end_ns),
+                "attributes": attributes,
+                "events": [
+                    {"name": name, "timeUnixNano": str(start_ns + int(trace["summary"][name] * 1e6))}
+                    for name in (FIRST_BYTE, FIRST_EVENT, FIRST_TOKEN)
+                    if name in trace["summary"]
+                ],
+            })
+            for span in trace["spans"]:
+                span_start = start_ns + int(span["offset_ms"] * 1e6)
+                spans.append({
+                    "traceId": trace_id,
+                    "spanId": secrets.token_hex(8),
+                    "parentSpanId": root_id,
+                    "name": span["name"],
+                    "kind": 1,
+                    "startTimeUnixNano": str(span_start),
+                    "endTimeUnixNano": str(span_start + int(span["duration_ms"] * 1e6)),
+                })
+        return {
+            "resourceSpans": [{
+                "resource": {
+                    "attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]
+                },
+                "scopeSpans": [{"scope": {"name": "bharatgen_openai"}, "spans": spans}],
+            }]
+        }
+
+
+def create_exporter_from_env() -> Optional[SpanExporter]:
+    """Create the exporter configured by BHARATGEN_TRACE_EXPORTER.
+
+    Supported values are ``jsonl`` (BHARATGEN_TRACE_FILE) and ``otlp``
+    (BHARATGEN_OTLP_ENDPOINT). Anything else disables exporting.
+
+    Returns:
+        Exporter instance, or None
+    """
+    kind = os.getenv("BHARATGEN_TRACE_EXPORTER", "").lower()
+    if kind == "jsonl":
+        return JSONLSpanExporter(os.getenv("BHARATGEN_TRACE_FILE", "traces.jsonl"))
+    if kind == "otlp":
+        return OTLPSpanExporter(
+            os.getenv("BHARATGEN_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+        )
+    return None
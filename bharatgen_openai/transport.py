@@ -0,0 +1,441 @@
+"""Multiplexed transport over Gradio's session queue protocol.
+
+The default ``/call/{api_name}`` protocol needs one POST plus one dedicated
+SSE connection per completion. The queue protocol instead joins jobs with
+``POST /queue/join`` under a shared session hash and delivers every job's
+messages over a single ``GET /queue/data`` stream. ``GradioQueueTransport``
+keeps that stream open while any job is pending and routes each message to
+its job by event id.
+"""
+
+import json
+import queue
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, NamedTuple, Optional, Tuple, Union
+
+import requests
+from urllib3.exceptions import ReadTimeoutError
+
+from .sse import iter_sse_events
+
+
+class UpstreamError(Exception):
+    """Raised when the Gradio upstream reports a failed job."""
+
+
+class UpstreamTimeoutError(UpstreamError):
+    """Raised when an upstream stream stays silent past the idle timeout."""
+
+
+class Estimation(NamedTuple):
+    """Queue position Gradio reports for a job before it starts."""
+
+    rank: Optional[int]  # Jobs ahead of this one
+    queue_size: Optional[int]  # Jobs waiting in the upstream queue
+    eta: Optional[float]  # Estimated seconds until the job starts
+
+    @classmethod
+    def from_message(cls, message: dict) -> "Estimation":
+        return cls(message.get("rank"), message.get("queue_size"), message.get("rank_eta"))
+
+
+def apply_edit(target: Any, path: list, action: str, value: Any) -> Any:
+    """Apply one Gradio diff edit to a value.
+
+    Args:
+        target: Value to edit (mutated in place where possible)
+        path: Keys/indices leading to the edited element
+        action: 'replace', 'append', 'add' or 'delete'
+        value: Edit value
+
+    Returns:
+        Edited value
+    """
+    if not path:
+        if action == "replace":
+            return value
+        if action == "append":
+            return target + value
+        raise ValueError(f"Unsupported root edit: {action}")
+
+    current = target
+    for key in path[:-1]:
+        current = current[key]
+    last = path[-1]
+
+    if action == "replace":
+        current[last] = value
+    elif action == "append":
+        current[last] += value
+    elif action == "add":
+        if isinstance(current, list):
+            current.insert(int(last), value)
+        else:
+            current[last] = value
+    elif action == "delete":
+        if isinstance(current, list):
+            del current[int(last)]
+        else:
+            del current[last]
+    else:
+        raise ValueError(f"Unsupported edit: {action}")
+    return target
+
+
+def apply_diff(value: Any, diff: list) -> Any:
+    """Apply a list of ``[action, path, value]`` edits."""
+    for action, path, edit_value in diff:
+        value = apply_edit(value, path, action, edit_value)
+    return value
+
+
+def _is_timeout(error: BaseException) -> bool:
+    """Whether an exception (or its cause chain) is a read timeout."""
+    while error is not None:
+        if isinstance(error, (requests.Timeout, ReadTimeoutError, TimeoutError)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class QueueJob:
+    """A job submitted through GradioQueueTransport."""
+
+    def __init__(self, event_id: str, messages: queue.Queue, transport: Optional["GradioQueueTransport"] = None):
+        self.event_id = event_id
+        self.messages = messages
+        self.transport = transport
+        self.bytes_received = 0
+        self.estimation: Optional[Estimation] = None
+        self.finished = False
+
+    def iter_messages(self) -> Iterator[dict]:
+        """Yield this job's raw queue messages until it completes."""
+        while True:
+            message, size = self.messages.get()
+            self.bytes_received += size
+            if message.get("msg") in ("process_completed", "unexpected_error"):
+                self.finished = True
+            yield message
+            if self.finished:
+                return
+
+    def close(self):
+        """Abandon the job if it hasn't finished: cancel it upstream.
+
+        Safe to call more than once, like closing a streaming response.
+        """
+        if self.finished:
+            return
+        self.finished = True
+        if self.transport is not None:
+            self.transport.cancel(self.event_id)
+
+    def iter_data(self, estimations: bool = False) -> Iterator[Union[list, Estimation]]:
+        """Yield full output data for each generation step.
+
+        The queue protocol sends the first generation in full and later ones
+        as diffs; diffs are applied to the previous output here, so only the
+        new bytes are received and JSON-decoded per event.
+
+        Args:
+            estimations: Also yield an Estimation whenever the job's queue
+                position changes
+
+        Raises:
+            UpstreamError: If the job fails upstream
+        """
+        output = None
+        for message in self.iter_messages():
+            msg = message.get("msg")
+            if msg == "estimation":
+                self.estimation = Estimation.from_message(message)
+                if estimations:
+                    yield self.estimation
+            elif msg == "process_generating":
+                data = message.get("output", {}).get("data")
+                if data is None:
+                    continue
+                if output is None:
+                    output = data
+                else:
+                    output = [apply_diff(old, diff) for old, diff in zip(output, data)]
+                yield output
+            elif msg == "process_completed":
+                result = message.get("output", {})
+                if not message.get("success", True) or "error" in result:
+                    raise UpstreamError(result.get("error") or "Upstream job failed")
+                if result.get("data") is not None:
+                    yield result["data"]
+            elif msg == "unexpected_error":
+                error = UpstreamTimeoutError if message.get("timeout") else UpstreamError
+                raise error(message.get("message") or "Unexpected upstream error")
+
+
+class GradioQueueTransport:
+    """Submit jobs via /queue/join and demultiplex one shared /queue/data stream."""
+
+    # Wait before reopening a data stream that closed without news for any
+    # job, doubling up to the max while Gradio keeps doing that
+    MIN_REOPEN_DELAY = 0.05
+    MAX_REOPEN_DELAY = 2.0
+
+    def __init__(
+        self,
+        base_url: str,
+        session: requests.Session,
+        api_name: str = "chat_fn_1",
+        fn_index: Optional[int] = None,
+        timeout: Optional[Tuple[float, Optional[float]]] = None,
+        on_estimation: Optional[Callable[[Estimation], None]] = None,
+        job_timeout: Optional[float] = 600.0,
+    ):
+        """Initialize transport.
+
+        Args:
+            base_url: Base URL of Gradio API (e.g. https://x.gradio.live/gradio_api)
+            session: Pooled HTTP session
+            api_name: Gradio API name of the chat function
+            fn_index: Dependency index of the chat function (looked up from
+                the app config if not provided)
+            timeout: (connect, read) timeouts for upstream requests; the
+                read timeout bounds silence on the shared stream, which
+                Gradio heartbeats keep alive
+            on_estimation: Called (on the reader thread) with every queue
+                estimation received for this upstream
+            job_timeout: Seconds a job may take, queueing included, before
+                it fails and its late messages are ignored; None waits forever
+        """
+        self.base_url = base_url
+        self.session = session
+        self.api_name = api_name
+        self.fn_index = fn_index
+        self.timeout = timeout
+        self.on_estimation = on_estimation
+        self.job_timeout = job_timeout
+        self.session_hash = uuid.uuid4().hex[:11]
+        self._jobs: Dict[str, queue.Queue] = {}
+        self._claimed: set = set()
+        self._completed: set = set()
+        # Claimed event id -> monotonic time it fails at
+        self._deadlines: Dict[str, float] = {}
+        # Event ids that timed out or were cancelled; their messages are dropped
+        self._forgotten: set = set()
+        self._next_expiry = 0.0
+        self._inflight = 0
+        self._lock = threading.Lock()
+        # Set when a job joins, so a backed-off reader reopens the stream at once
+        self._joined = threading.Event()
+        self._reader: Optional[threading.Thread] = None
+
+    def _resolve_fn_index(self) -> int:
+        """Find the chat function's dependency index in the Gradio config."""
+        if self.fn_index is None:
+            root = self.base_url.removesuffix("/gradio_api")
+            config = self.session.get(f"{root}/config", timeout=30).json()
+            for i, dependency in enumerate(config.get("dependencies", [])):
+                if dependency.get("api_name") == self.api_name:
+                    self.fn_index = dependency.get("id", i)
+                    break
+            else:
+                raise UpstreamError(f"Gradio app has no API named {self.api_name!r}")
+        return self.fn_index
+
+    def submit(self, data: list) -> QueueJob:
+        """Join the queue with a new job.
+
+        Args:
+            data: Input data for the chat function
+
+        Returns:
+            QueueJob receiving this job's messages
+        """
+        fn_index = self._resolve_fn_index()
+        with self._lock:
+            self._inflight += 1
+        try:
+            response = self.session.post(
+                f"{self.base_url}/queue/join",
+                json={
+                    "data": data,
+                    "event_data": None,
+                    "fn_index": fn_index,
+                    "trigger_id": None,
+                    "session_hash": self.session_hash,
+                },
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            event_id = response.json()["event_id"]
+        except Exception:
+            with self._lock:
+                self._inflight -= 1
+            raise
+
+        with self._lock:
+            # Messages (even completion) may already have arrived for this event
+            messages = self._jobs.setdefault(event_id, queue.Queue())
+            if event_id in self._completed:
+                self._completed.discard(event_id)
+                del self._jobs[event_id]
+            else:
+                self._claimed.add(event_id)
+                if self.job_timeout is not None:
+                    self._deadlines[event_id] = time.monotonic() + self.job_timeout
+            self._joined.set()
+            if self._reader is None:
+                self._reader = threading.Thread(
+                    target=self._read, name="gradio-queue-reader", daemon=True
+                )
+                self._reader.start()
+        return QueueJob(event_id, messages, self)
+
+    def cancel(self, event_id: str):
+        """Stop waiting for a job and ask Gradio to cancel it.
+
+        The job is forgotten at once, so it no longer counts as in flight
+        or keeps the data stream open; its late messages are dropped. The
+        cancel request is sent on a background thread, best effort.
+
+        Args:
+            event_id: Event id of a job returned by submit
+        """
+        with self._lock:
+            if event_id not in self._claimed:
+                return  # Already completed, timed out or failed
+            self._forget(event_id)
+        threading.Thread(
+            target=self._send_cancel, args=(event_id,), name="gradio-queue-cancel", daemon=True
+        ).start()
+
+    def _send_cancel(self, event_id: str):
+        try:
+            self.session.post(
+                f"{self.base_url}/cancel",
+                json={"session_hash": self.session_hash, "fn_index": self.fn_index, "event_id": event_id},
+                timeout=self.timeout,
+            ).close()
+        except requests.RequestException:
+            pass  # The job still finishes upstream; its output is ignored
+
+    def _forget(self, event_id: str) -> Optional[queue.Queue]:
+        """Drop a claimed job that won't be waited for (call with the lock held).
+
+        Returns:
+            The job's message queue, if it still had one
+        """
+        self._deadlines.pop(event_id, None)
+        self._claimed.discard(event_id)
+        self._forgotten.add(event_id)
+        self._inflight -= 1
+        return self._jobs.pop(event_id, None)
+
+    def _dispatch(self, message: dict, size: int = 0):
+        """Route a message to its job's queue.
+
+        Args:
+            message: Decoded queue message
+            size: Bytes the message took on the wire
+        """
+        event_id = message.get("event_id")
+        if event_id is None:
+            return  # Session-level message (heartbeat, close_stream)
+        if message.get("msg") == "estimation" and self.on_estimation is not None:
+            self.on_estimation(Estimation.from_message(message))
+        completed = message.get("msg") in ("process_completed", "unexpected_error")
+        with self._lock:
+            if event_id in self._forgotten:
+                if completed:
+                    self._forgotten.discard(event_id)
+                return
+            messages = self._jobs.setdefault(event_id, queue.Queue())
+            if completed:
+                self._inflight -= 1
+                self._deadlines.pop(event_id, None)
+                if event_id in self._claimed:
+                    self._claimed.discard(event_id)
+                    del self._jobs[event_id]
+                else:
+                    self._completed.add(event_id)  # submit() hasn't registered it yet
+        messages.put((message, size))
+
+    def _expire_jobs(self):
+        """Fail and forget jobs past their deadline (checked about once a second).
+
+        A job whose completion never arrives would otherwise keep the data
+        stream open, and count as in flight, for good.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now < self._next_expiry:
+                return
+            self._next_expiry = now + 1.0
+            expired = [event_id for event_id, deadline in self._deadlines.items() if deadline <= now]
+            stale = [self._forget(event_id) for event_id in expired]
+        error = {"msg": "unexpected_error", "message": "Upstream job didn't finish in time", "timeout": True}
+        for messages in stale:
+            if messages is not None:
+                messages.put((error, 0))
+
+    def _fail_all(self, error: str, timeout: bool = False):
+        """Fail every pending job after the shared stream broke.
+
+        Args:
+            error: Error message passed to the jobs
+            timeout: Whether the stream broke because it went silent
+        """
+        with self._lock:
+            jobs, self._jobs = self._jobs, {}
+            # Jobs still joining keep their count and start a new reader
+            self._inflight = max(0, self._inflight - len(self._claimed))
+            self._claimed.clear()
+            self._completed.clear()
+            self._deadlines.clear()
+            self._forgotten.clear()
+        for messages in jobs.values():
+            messages.put(({"msg": "unexpected_error", "message": error, "timeout": timeout}, 0))
+
+    def _read(self):
+        """Read the shared data stream while jobs are pending.
+
+        Gradio closes the stream once the session has no pending events, so
+        it is reopened whenever jobs joined in the meantime. A stream that
+        closes without a message for any job is reopened after a growing
+        delay (cut short when a job joins), not in a tight loop.
+        """
+        delay = 0.0
+        try:
+            while True:
+                self._expire_jobs()
+                with self._lock:
+                    if self._inflight <= 0:
+                        self._reader = None
+                        return
+                if delay and self._joined.wait(delay):
+                    delay = 0.0
+                self._joined.clear()
+                response = self.session.get(
+                    f"{self.base_url}/queue/data",
+                    params={"session_hash": self.session_hash},
+                    stream=True,
+                    timeout=self.timeout,
+                )
+                response.raise_for_status()
+                delivered = False
+                with response:
+                    for event in iter_sse_events(response):
+                        message = json.loads(event.data)
+                        if message.get("msg") == "close_stream":
+                            break
+                        delivered = delivered or message.get("event_id") is not None
+                        self._dispatch(message, event.size)
+                        self._expire_jobs()
+                        if self._inflight <= 0:
+                            break  # Every job completed or timed out
+                delay = 0.0 if delivered else min(max(2 * delay, self.MIN_REOPEN_DELAY), self.MAX_REOPEN_DELAY)
+        except Exception as e:
+            with self._lock:
+                self._reader = None
+            self._fail_all(f"Queue stream failed: {e}", timeout=_is_timeout(e))
@@ -0,0 +1,101 @@
+"""Shared fixtures: a local stand-in for upstream HTTP servers."""
+
+import gzip
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict
+
+import pytest
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Dispatches each request to the route registered for its path."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self._dispatch()
+
+    def do_POST(self):
+        length = int(self.headers.get("content-length", 0))
+        self.body = json.loads(self.rfile.read(length)) if length else None
+        self._dispatch()
+
+    def _dispatch(self):
+        self.server.requests.append((self.command, self.path, getattr(self, "body", None)))
+        route = self.server.routes.get(self.path.split("?")[0])
+        if route is None:
+            self.send_json({"detail": "Not Found"}, status=404)
+            return
+        route(self)
+
+    def send_json(self, payload, status: int = 200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("content-type", "application/json")
+        self.send_header("content-length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_sse(self, frames: list, encoding: str = None, delay: float = 0.0, hang: float = 0.0):
+        """Stream SSE frames (strings, sent as-is), then close the connection.
+
+        Args:
+            frames: Raw frames, e.g. ``"data: {...}\\n\\n"``
+            encoding: 'gzip' to compress the stream
+            delay: Seconds between frames
+            hang: Seconds to stay silent after the last frame
+        """
+        self.send_response(200)
+        self.send_header("content-type", "text/event-stream")
+        self.send_header("connection", "close")
+        if encoding == "gzip":
+            self.send_header("content-encoding", "gzip")
+        self.end_headers()
+        compressor = gzip.GzipFile(fileobj=self.wfile, mode="wb") if encoding == "gzip" else None
+        try:
+            for frame in frames:
+                if compressor is not None:
+                    compressor.write(frame.encode())
+                    compressor.flush()
+                else:
+                    self.wfile.write(frame.encode())
+                self.wfile.flush()
+                if delay:
+                    time.sleep(delay)
+            if compressor is not None:
+                compressor.close()
+            if hang:
+                time.sleep(hang)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        self.close_connection = True
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.routes: Dict[str, Callable[[StandInHandler], None]] = {}
+        self.requests: list = []
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+@pytest.fixture
+def stand_in():
+    """A running StandInServer; register handlers in ``stand_in.routes``."""
+    server = StandInServer()
+    thread = threading.Thread(target=server.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -0,0 +1,43 @@
+import json
+
+from bharatgen_openai.server.capture import TrafficCapture
+from bharatgen_openai.tracing import RequestTrace
+
+
+def test_sampled_requests_are_written_redacted_in_the_background(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    capture = TrafficCapture(str(path), sample_rate=1.0)
+    exporter = capture.wrap(None)
+
+    for i in range(3):
+        trace = RequestTrace(exporter=exporter)
+        request = {"model": "param-17b", "messages": [{"role": "user", "content": f"mail me at user{i}@example.com"}]}
+        assert capture.sample(trace, "key_a", request)
+        trace.attributes.update(status=200, prompt_tokens=5, completion_tokens=9)
+        trace.finish()
+    exporter.close()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [record["request"]["messages"][0]["content"] for record in records] == ["mail me at <email>"] * 3
+    assert {(record["key_id"], record["status"], record["error"]) for record in records} == {("key_a", 200, None)}
+
+
+def test_concurrent_requests_with_the_same_request_id_are_both_captured(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    capture = TrafficCapture(str(path), sample_rate=1.0)
+    exporter = capture.wrap(None)
+
+    # Clients choose x-request-id, so two requests in flight can share one
+    first, second = RequestTrace("retry-1", exporter), RequestTrace("retry-1", exporter)
+    assert capture.sample(first, "key_a", {"model": "m", "messages": [{"role": "user", "content": "first"}]})
+    assert capture.sample(second, "key_b", {"model": "m", "messages": [{"role": "user", "content": "second"}]})
+    second.finish()
+    first.finish()
+    exporter.close()
+
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [(record["key_id"], record["request"]["messages"][0]["content"]) for record in records] == [
+        ("key_b", "second"),
+        ("key_a", "first"),
+    ]
+    assert {record["request_id"] for record in records} == {"retry-1"}
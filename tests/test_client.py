@@ -0,0 +1,31 @@
+import pytest
+
+from bharatgen_openai.backends import GradioBackend, OpenAICompatibleBackend, create_session
+from bharatgen_openai.client import BharatGenOpenAI, Chat
+
+
+def test_chat_takes_a_backend():
+    backend = OpenAICompatibleBackend("http://vllm:8000/v1", "param-17b")
+    assert Chat(backend).completions is backend
+
+
+def test_chat_still_takes_base_url_and_model():
+    session = create_session()
+    with pytest.warns(DeprecationWarning):
+        chat = Chat("http://gradio/gradio_api", "param-17b", session, "queue", 30.0)
+
+    backend = chat.completions
+    assert isinstance(backend, GradioBackend)
+    assert (backend.base_url, backend.model, backend.session, backend.transport) == (
+        "http://gradio/gradio_api",
+        "param-17b",
+        session,
+        "queue",
+    )
+    assert backend.timeout[1] == 30.0
+
+
+def test_client_picks_the_backend():
+    client = BharatGenOpenAI("http://vllm:8000/v1", backend="openai", api_key="secret")
+    assert isinstance(client.chat.completions, OpenAICompatibleBackend)
+    assert client.chat.completions.headers == {"Authorization": "Bearer secret"}
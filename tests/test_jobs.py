@@ -0,0 +1,168 @@
+import asyncio
+
+import pytest
+
+from bharatgen_openai.models import ErrorResponse
+from bharatgen_openai.server import jobs as jobs_module
+from bharatgen_openai.server.jobs import JobNotFoundError, JobStore, JobStoreFullError
+
+
+def frame(content: str, finish_reason=None, usage=None) -> dict:
+    return {
+        "id": "chatcmpl-1",
+        "created": 1,
+        "model": "m",
+        "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": finish_reason}],
+        "usage": usage,
+    }
+
+
+def answer(*parts: str):
+    async def run(send):
+        await send({"type": "queue", "rank": 0, "queue_size": 1, "eta": None})
+        for part in parts:
+            await send(frame(part))
+        usage = {"prompt_tokens": 1, "completion_tokens": len(parts), "total_tokens": 1 + len(parts)}
+        await send(frame("", "stop", usage))
+        return "".join(parts)
+
+    return run
+
+
+async def blocked(send):
+    await asyncio.Event().wait()
+
+
+def describe(e: Exception) -> ErrorResponse:
+    return ErrorResponse.create(message=str(e), type="upstream_error")
+
+
+def test_completed_job_has_its_result_and_can_be_followed():
+    async def main():
+        store = JobStore()
+        job = store.submit("key-1", "m", answer("नम", "स्ते"), describe)
+        await job.task
+
+        assert job.status == "completed"
+        assert job.result().choices[0].message.content == "नमस्ते"
+        assert job.to_dict()["queue"] is None
+        assert [f["choices"][0]["delta"]["content"] async for f in job.follow(start=1)] == ["स्ते", ""]
+
+    asyncio.run(main())
+
+
+def test_followers_get_frames_live_with_heartbeats():
+    async def main():
+        release = asyncio.Event()
+
+        async def run(send):
+            await send(frame("a"))
+            await release.wait()
+            await send(frame("", "stop", {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}))
+
+        store = JobStore()
+        job = store.submit("key-1", "m", run, describe)
+        received = []
+        async for item in job.follow(heartbeat=0.05):
+            received.append(None if item is None else item["choices"][0]["delta"]["content"])
+            if item is None:
+                release.set()
+
+        assert received[0] == "a"
+        assert None in received
+        assert received[-1] == ""
+        assert job.status == "completed"
+
+    asyncio.run(main())
+
+
+def test_failed_and_cancelled_jobs():
+    async def fail(send):
+        raise RuntimeError("upstream broke")
+
+    async def main():
+        store = JobStore()
+        failed = store.submit("key-1", "m", fail, describe)
+        running = store.submit("key-1", "m", blocked, describe)
+        await asyncio.sleep(0)
+
+        assert store.cancel(running.id, "key-1") is running
+        await asyncio.gather(failed.task, running.task)
+
+        assert failed.status == "failed"
+        assert failed.error == {"message": "upstream broke", "type": "upstream_error"}
+        assert failed.result() is None
+        assert running.status == "cancelled"
+
+    asyncio.run(main())
+
+
+def test_job_cancelled_before_it_starts_finishes():
+    async def main():
+        store = JobStore()
+        job = store.submit("key-1", "m", blocked, describe)
+        store.cancel(job.id, "key-1")
+
+        assert [item async for item in job.follow()] == []
+        assert job.status == "cancelled"
+        assert job.finished_at is not None
+
+    asyncio.run(main())
+
+
+def test_jobs_belong_to_their_key():
+    async def main():
+        store = JobStore()
+        job = store.submit("key-1", "m", answer("a"), describe)
+        await job.task
+
+        assert store.get(job.id, "key-1") is job
+        with pytest.raises(JobNotFoundError):
+            store.get(job.id, "key-2")
+        with pytest.raises(JobNotFoundError):
+            store.cancel(job.id, "key-2")
+
+    asyncio.run(main())
+
+
+def test_finished_jobs_expire_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(jobs_module.time, "monotonic", lambda: now[0])
+
+    async def main():
+        store = JobStore(ttl=60)
+        finished = store.submit("key-1", "m", answer("a"), describe)
+        running = store.submit("key-1", "m", blocked, describe)
+        await finished.task
+
+        now[0] += 59
+        assert store.get(finished.id, "key-1") is finished
+        now[0] += 2
+        with pytest.raises(JobNotFoundError):
+            store.get(finished.id, "key-1")
+        # Unfinished jobs never expire; expired ones are dropped on the next submit
+        assert store.get(running.id, "key-1") is running
+        store.submit("key-1", "m", answer("b"), describe)
+        assert finished.id not in store._jobs
+
+        await store.close()
+
+    asyncio.run(main())
+
+
+def test_full_store_evicts_finished_jobs_before_refusing():
+    async def main():
+        store = JobStore(max_jobs=2)
+        finished = store.submit("key-1", "m", answer("a"), describe)
+        running = store.submit("key-1", "m", blocked, describe)
+        await finished.task
+
+        replacement = store.submit("key-1", "m", blocked, describe)
+        assert list(store._jobs) == [running.id, replacement.id]
+        with pytest.raises(JobStoreFullError):
+            store.submit("key-1", "m", blocked, describe)
+
+        await store.close()
+        assert running.status == replacement.status == "cancelled"
+
+    asyncio.run(main())
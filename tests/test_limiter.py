@@ -0,0 +1,58 @@
+import pytest
+
+from bharatgen_openai.server.limiter import GradientLimiter
+
+
+def test_limit_grows_while_latency_is_healthy_and_the_limit_is_used():
+    limiter = GradientLimiter(initial_limit=10)
+    for _ in range(50):
+        limiter.on_sample(0.2, inflight=limiter.limit)
+    assert limiter.limit > 10
+
+
+def test_limit_holds_while_demand_is_below_it():
+    limiter = GradientLimiter(initial_limit=10)
+    for _ in range(50):
+        limiter.on_sample(0.2, inflight=2)
+    assert limiter.limit == 10
+
+
+def test_limit_shrinks_when_latency_rises():
+    limiter = GradientLimiter(initial_limit=32)
+    limiter.on_sample(0.2, inflight=32)
+    start = limiter.limit
+    for _ in range(20):
+        limiter.on_sample(1.0, inflight=32)  # 5x the baseline: gradient clamps at 0.5
+    assert limiter.limit < start / 2
+    assert limiter.baseline == pytest.approx(0.2, rel=0.01)
+
+
+def test_one_slow_sample_only_nudges_the_limit():
+    limiter = GradientLimiter(initial_limit=32)
+    limiter.on_sample(0.2, inflight=32)
+    limiter.on_sample(10.0, inflight=32)
+    assert limiter.limit >= 30
+
+
+def test_limit_stays_within_bounds():
+    limiter = GradientLimiter(initial_limit=4, min_limit=2, max_limit=8)
+    for _ in range(200):
+        limiter.on_sample(0.2, inflight=8)
+    assert limiter.limit == 8
+    for _ in range(200):
+        limiter.on_failure()
+    assert limiter.limit == 2
+
+
+def test_failure_backs_off_without_smoothing():
+    limiter = GradientLimiter(initial_limit=20, backoff=0.5)
+    limiter.on_failure()
+    assert limiter.limit == 10
+
+
+def test_baseline_drifts_up_towards_slower_latency():
+    limiter = GradientLimiter(long_window=10)
+    limiter.on_sample(0.1, inflight=0)
+    for _ in range(1000):
+        limiter.on_sample(0.5, inflight=0)
+    assert 0.1 < limiter.baseline <= 0.5
@@ -0,0 +1,36 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from bharatgen_openai.metrics import Registry
+from bharatgen_openai.server import app as app_module
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    counter = registry.counter("test_requests_total", "Requests", ["upstream"])
+    counter.inc(upstream='http://a/"x"\\y\nz')
+
+    assert 'test_requests_total{upstream="http://a/\\"x\\"\\\\y\\nz"} 1.0' in registry.render().splitlines()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_KEYS", {"metrics-key"})
+    monkeypatch.setattr(app_module, "ADMIN_KEYS", {"admin-key"})
+    return TestClient(app_module.app)
+
+
+@pytest.mark.parametrize("key, status", [("metrics-key", 200), ("admin-key", 200), ("sk-test-key", 401)])
+def test_metrics_need_a_metrics_or_admin_key(client, key, status):
+    response = client.get("/metrics", headers={"Authorization": f"Bearer {key}"})
+    assert response.status_code == status
+
+
+def test_metrics_without_credentials_are_refused(client):
+    assert client.get("/metrics").status_code in (401, 403)
+
+
+def test_metrics_are_disabled_without_keys(client, monkeypatch):
+    monkeypatch.setattr(app_module, "METRICS_KEYS", set())
+    monkeypatch.setattr(app_module, "ADMIN_KEYS", set())
+    assert client.get("/metrics", headers={"Authorization": "Bearer anything"}).status_code == 404
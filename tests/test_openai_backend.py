@@ -0,0 +1,122 @@
+import json
+
+import pytest
+
+from bharatgen_openai.backends import OpenAICompatibleBackend
+from bharatgen_openai.transport import UpstreamError, UpstreamTimeoutError
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+
+
+def chunk(content=None, reasoning=None, finish=None, usage=None) -> str:
+    delta = {}
+    if content is not None:
+        delta["content"] = content
+    if reasoning is not None:
+        delta["reasoning_content"] = reasoning
+    data = {"choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+    if usage is not None:
+        data = {"choices": [], "usage": usage}
+    return f"data: {json.dumps(data)}\n\n"
+
+
+DONE = "data: [DONE]\n\n"
+
+
+@pytest.fixture
+def upstream(stand_in):
+    """Serve ``upstream.frames`` from the stand-in's /v1/chat/completions."""
+    stand_in.frames = []
+    stand_in.hang = 0.0
+    stand_in.routes["/v1/chat/completions"] = lambda handler: handler.send_sse(stand_in.frames, hang=stand_in.hang)
+    return stand_in
+
+
+def backend(upstream, **options) -> OpenAICompatibleBackend:
+    return OpenAICompatibleBackend(f"{upstream.url}/v1", "param-17b", **options)
+
+
+def test_stream_passes_deltas_through(upstream):
+    upstream.frames = [chunk("नमस्ते"), chunk("! Hello"), chunk(finish="stop"), DONE]
+
+    chunks = list(backend(upstream).create(MESSAGES, stream=True))
+
+    assert chunks[0].choices[0].delta.role == "assistant"
+    assert [c.choices[0].delta.content for c in chunks[1:-1]] == ["नमस्ते", "! Hello"]
+    assert chunks[-1].choices[0].finish_reason == "stop"
+    assert chunks[-1].usage is not None
+
+
+def test_done_ends_the_stream(upstream):
+    upstream.frames = [chunk("answer"), chunk(finish="stop"), DONE, chunk("after done")]
+
+    completion = backend(upstream).create(MESSAGES)
+
+    assert completion.choices[0].message.content == "answer"
+
+
+@pytest.mark.parametrize("upstream_reason, reason", [("stop", "stop"), ("length", "length"), ("abort", "stop")])
+def test_finish_reason_mapping(upstream, upstream_reason, reason):
+    upstream.frames = [chunk("answer"), chunk(finish=upstream_reason), DONE]
+
+    completion = backend(upstream).create(MESSAGES)
+
+    assert completion.choices[0].finish_reason == reason
+
+
+def test_stream_ending_without_finish_reason_fails(upstream):
+    upstream.frames = [chunk("partial")]
+
+    with pytest.raises(UpstreamError, match="ended before completing"):
+        list(backend(upstream).create(MESSAGES, stream=True))
+
+
+def test_upstream_error_event_raises(upstream):
+    upstream.frames = [chunk("partial"), 'data: {"error": {"message": "CUDA out of memory"}}\n\n']
+
+    with pytest.raises(UpstreamError, match="CUDA out of memory"):
+        list(backend(upstream).create(MESSAGES, stream=True))
+
+
+def test_idle_upstream_times_out(upstream):
+    upstream.frames = [chunk("partial")]
+    upstream.hang = 2.0
+
+    with pytest.raises(UpstreamTimeoutError):
+        list(backend(upstream, idle_timeout=0.3).create(MESSAGES, stream=True))
+
+
+def test_requests_and_reports_upstream_usage(upstream):
+    usage = {"prompt_tokens": 11, "completion_tokens": 7, "completion_tokens_details": {"reasoning_tokens": 3}}
+    upstream.frames = [chunk("answer"), chunk(finish="stop"), chunk(usage=usage), DONE]
+
+    completion = backend(upstream).create(MESSAGES)
+
+    payload = upstream.requests[-1][2]
+    assert payload["stream"] is True
+    assert payload["stream_options"] == {"include_usage": True}
+    assert (completion.usage.prompt_tokens, completion.usage.completion_tokens) == (11, 7)
+    assert completion.usage.completion_tokens_details.reasoning_tokens == 3
+
+
+def test_thinking_budget_ends_the_generation(upstream):
+    # "minimal" allows 128 thinking tokens; each delta is ~50 tokens
+    thought = "think " * 33
+    upstream.frames = [chunk(reasoning=thought) for _ in range(10)] + [chunk("answer"), chunk(finish="stop"), DONE]
+
+    chunks = list(backend(upstream).create(MESSAGES, stream=True, include_reasoning=True, reasoning_effort="minimal"))
+
+    assert upstream.requests[-1][2]["max_tokens"] == 512
+    assert [c.choices[0].delta.reasoning_content for c in chunks[1:-1]] == [thought] * 3
+    assert chunks[-1].choices[0].finish_reason == "length"
+
+
+@pytest.mark.parametrize("effort, reasoning_tokens", [(None, None), ("high", 25)])
+def test_estimated_usage_counts_thinking_only_with_an_effort(upstream, effort, reasoning_tokens):
+    upstream.frames = [chunk(reasoning="x" * 100), chunk("y" * 40), chunk(finish="stop"), DONE]
+
+    completion = backend(upstream).create(MESSAGES, reasoning_effort=effort)
+
+    details = completion.usage.completion_tokens_details
+    assert completion.usage.completion_tokens == 10 + (reasoning_tokens or 0)
+    assert (details and details.reasoning_tokens) == reasoning_tokens
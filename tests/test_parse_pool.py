@@ -0,0 +1,56 @@
+import queue
+
+import pytest
+
+from bharatgen_openai.parse_pool import ParsePool, parse_batch, release_stream
+from bharatgen_openai.parser import GradioResponseParser, HtmlUpdate
+from bharatgen_openai.transport import QueueJob
+
+def chat(html: str) -> list:
+    return [[{"role": "user", "content": "hi"}, {"role": "assistant", "content": [{"type": "text", "text": html}]}], ""]
+
+
+def edit(action: str, text: str) -> dict:
+    return {"msg": "process_generating", "event_id": "e1", "output": {"data": [[[action, [1, "content", 0, "text"], text]], []]}}
+
+
+def queue_job() -> QueueJob:
+    messages = [
+        {"msg": "process_generating", "event_id": "e1", "output": {"data": chat("<p>")}},
+        edit("append", "नमस्ते"),
+        edit("append", "! Hello"),
+        # Upstream rewrites the answer instead of extending it
+        edit("replace", "<p>Hi there"),
+        edit("append", ", friend</p>"),
+        {"msg": "process_completed", "event_id": "e1", "success": True, "output": {"data": chat("<p>Hi there, friend</p>")}},
+    ]
+    inbox = queue.Queue()
+    for message in messages:
+        inbox.put((message, 10))
+    return QueueJob("e1", inbox)
+
+
+def test_html_updates_extend_or_replace_the_stream_html():
+    try:
+        assert parse_batch("s1", [HtmlUpdate("<p>नम", appended=False)], False).content == "नम"
+        assert parse_batch("s1", [HtmlUpdate("स्ते</p>", appended=True)], False).content == "नमस्ते"
+        assert parse_batch("s1", [HtmlUpdate("<p>Hi</p>", appended=False)], False).content == "Hi"
+    finally:
+        release_stream("s1")
+
+
+# Other tests' threads are still around when the process slot forks
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded:DeprecationWarning")
+@pytest.mark.parametrize("kind", ["thread", "process"])
+def test_pooled_queue_job_matches_parsing_in_place(kind):
+    expected = list(GradioResponseParser().parse_streaming_response(queue_job(), reasoning=True))
+    pool = ParsePool(kind, workers=1)
+    try:
+        parser = GradioResponseParser(pool)
+        pooled = list(parser.parse_streaming_response(queue_job(), reasoning=True))
+        complete = parser.parse_complete_response(queue_job())
+    finally:
+        pool.close()
+
+    assert pooled == expected
+    assert complete == "Hi there, friend"
@@ -0,0 +1,99 @@
+import pytest
+
+from bharatgen_openai.server.ratelimit import TOKENS, MemoryBackend, RateLimiter
+
+TOKENS_PER_MINUTE = 600
+
+
+def replica(backend) -> RateLimiter:
+    limiter = RateLimiter(tokens_per_minute=TOKENS_PER_MINUTE, backend=backend)
+    limiter.check("key_a")  # Creates the key's bucket, so sync exchanges it
+    return limiter
+
+
+def balance(limiter: RateLimiter) -> float:
+    return limiter._buckets[("key_a", TOKENS)].tokens
+
+
+class FlakyBackend(MemoryBackend):
+    """MemoryBackend whose next ``failures`` exchanges raise.
+
+    With ``applied``, the failing exchanges land before raising, like a
+    reply lost on the way back.
+    """
+
+    def __init__(self, failures: int, applied: bool = False):
+        super().__init__()
+        self.failures = failures
+        self.applied = applied
+
+    def exchange(self, *args):
+        if self.failures:
+            self.failures -= 1
+            if self.applied:
+                super().exchange(*args)
+            raise ConnectionError("backend down")
+        return super().exchange(*args)
+
+
+def test_other_replicas_use_is_debited():
+    backend = MemoryBackend()
+    a, b = replica(backend), replica(backend)
+    b.sync()
+
+    a.consume_tokens("key_a", 400)
+    a.sync()
+    b.sync()
+
+    assert balance(b) == pytest.approx(200, abs=1)
+    assert balance(a) == pytest.approx(200, abs=1)  # Its own use isn't debited twice
+
+
+def test_first_exchange_debits_at_most_capacity():
+    backend = MemoryBackend()
+    a = replica(backend)
+    a.consume_tokens("key_a", 5000)
+    a.sync()
+
+    b = replica(backend)
+    b.sync()
+
+    assert balance(b) == pytest.approx(0, abs=1)  # Not -4400: older use only emptied the bucket
+
+
+def test_restarted_counter_is_not_debited():
+    backend = MemoryBackend()
+    a, b = replica(backend), replica(backend)
+    b.sync()
+    a.consume_tokens("key_a", 300)
+    a.sync()
+    b.sync()
+    before = balance(b)
+
+    backend._totals.clear()  # e.g. the Redis counter expired
+    a.consume_tokens("key_a", 100)
+    a.sync()
+    b.sync()
+    assert balance(b) == pytest.approx(before, abs=1)
+
+    a.consume_tokens("key_a", 50)
+    a.sync()
+    b.sync()
+    assert balance(b) == pytest.approx(before - 50, abs=1)
+
+
+@pytest.mark.parametrize("applied", [False, True])
+def test_failed_exchange_is_retried_once(applied):
+    backend = FlakyBackend(failures=1, applied=applied)
+    a, b = replica(backend), replica(backend)
+    a.consume_tokens("key_a", 200)
+
+    a.sync()  # Fails: the 200 tokens are resent next time
+    a.consume_tokens("key_a", 50)
+    a.sync()  # Retries the failed batch alone
+    b.sync()
+    assert balance(b) == pytest.approx(TOKENS_PER_MINUTE - 200, abs=1)  # Not 400 if the first try landed
+
+    a.sync()
+    b.sync()
+    assert balance(b) == pytest.approx(TOKENS_PER_MINUTE - 250, abs=1)
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from bharatgen_openai.server.resume import StreamExpiredError, StreamStore
+
+
+async def numbered(count: int, delay: float = 0.0):
+    for i in range(count):
+        if delay:
+            await asyncio.sleep(delay)
+        yield f"data: {i}\n\n"
+
+
+async def endless(state: dict):
+    try:
+        while True:
+            await asyncio.sleep(0.01)
+            yield "data: tick\n\n"
+    finally:
+        state["closed"] = True
+
+
+def payloads(events: list) -> list:
+    return [line for event in events for line in event.splitlines() if line.startswith("data:")]
+
+
+def last_id(events: list) -> str:
+    return [event for event in events if event.startswith("id: ")][-1].splitlines()[0][len("id: "):]
+
+
+def test_a_reader_resumes_after_the_last_event_it_got():
+    async def main():
+        store = StreamStore(grace=5)
+        stream = store.start("key-1", numbered(6, delay=0.01))
+
+        received = []
+        reader = stream.follow()
+        async for event in reader:
+            received.append(event)
+            if len(received) == 2:
+                break  # The client disconnects
+        await reader.aclose()
+
+        resumed, after = store.resume(last_id(received), "key-1")
+        assert (resumed, after) == (stream, 1)
+        rest = [event async for event in resumed.follow(after)]
+
+        assert payloads(received + rest) == [f"data: {i}" for i in range(6)]
+        assert last_id(rest) == f"{stream.id}:5"
+        await store.close()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("suffix, key", [(":2", "key-2"), (":x", "key-1"), (":9", "key-1"), ("", "key-1")])
+def test_resume_is_refused_for_other_keys_and_bad_positions(suffix, key):
+    async def main():
+        store = StreamStore(grace=5)
+        stream = store.start("key-1", numbered(3))
+        await stream.task
+
+        with pytest.raises(StreamExpiredError):
+            store.resume(f"{stream.id}{suffix}", key)
+        with pytest.raises(StreamExpiredError):
+            store.resume("unknown:0", "key-1")
+
+    asyncio.run(main())
+
+
+def test_events_past_the_buffer_can_no_longer_be_resumed():
+    async def main():
+        store = StreamStore(grace=5, buffer_size=3)
+        stream = store.start("key-1", numbered(10))
+        await stream.task
+
+        with pytest.raises(StreamExpiredError):
+            store.resume(f"{stream.id}:2", "key-1")
+        resumed, after = store.resume(f"{stream.id}:6", "key-1")
+        assert payloads([event async for event in resumed.follow(after)]) == ["data: 7", "data: 8", "data: 9"]
+        # A reader that fell behind is told so instead of getting a gap
+        lagged = [event async for event in stream.follow(0)]
+        assert len(lagged) == 1 and "stream_lagged" in lagged[0]
+
+    asyncio.run(main())
+
+
+def test_stream_without_readers_is_abandoned_after_the_grace_period():
+    async def main():
+        state = {}
+        store = StreamStore(grace=0.05)
+        stream = store.start("key-1", endless(state))
+        await asyncio.sleep(0.2)
+
+        assert stream.task.cancelled()
+        assert stream.done
+        assert state["closed"]
+
+    asyncio.run(main())
+
+
+def test_followed_stream_outlives_the_grace_period():
+    async def main():
+        state = {}
+        store = StreamStore(grace=0.05)
+        stream = store.start("key-1", endless(state))
+
+        ticks = 0
+        async for _ in stream.follow():
+            ticks += 1
+            if ticks == 20:  # About four grace periods
+                break
+        assert not stream.task.done()
+        await store.close()
+        assert state["closed"]
+
+    asyncio.run(main())
+
+
+def test_finished_stream_is_evicted_after_the_grace_period():
+    async def main():
+        store = StreamStore(grace=0.05)
+        stream = store.start("key-1", numbered(2))
+        events = [event async for event in stream.follow()]
+
+        assert store.resume(last_id(events[:1]), "key-1")[0] is stream
+        await asyncio.sleep(0.15)
+        with pytest.raises(StreamExpiredError):
+            store.resume(last_id(events[:1]), "key-1")
+
+    asyncio.run(main())
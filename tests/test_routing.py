@@ -0,0 +1,107 @@
+import math
+
+import pytest
+
+from bharatgen_openai.server.routing import Endpoint, ModelConfig, ModelOverloadedError, ModelRoute, prefix_key
+
+URLS = ["http://a:7860", "http://b:7860", "http://c:7860"]
+CONVERSATION = [
+    {"role": "system", "content": "Answer briefly."},
+    {"role": "user", "content": "Namaste"},
+]
+
+
+def affinity_route(urls=URLS, max_concurrency=0, load_factor=1.25):
+    config = ModelConfig(id="m", endpoints=urls, max_concurrency=max_concurrency)
+    endpoints = [Endpoint(url, client=None, max_concurrency=max_concurrency) for url in urls]
+    return ModelRoute(config, endpoints, routing="prefix_affinity", load_factor=load_factor)
+
+
+def preferred(route, key):
+    return list(route._ring_order(key))
+
+
+def test_every_turn_of_a_conversation_has_the_same_key():
+    later_turn = CONVERSATION + [
+        {"role": "assistant", "content": "Namaste!"},
+        {"role": "user", "content": "Kaise ho?"},
+    ]
+    other = [CONVERSATION[0], {"role": "user", "content": "Hello"}]
+
+    assert prefix_key(later_turn) == prefix_key(CONVERSATION)
+    assert prefix_key(other) != prefix_key(CONVERSATION)
+
+
+def test_only_prefix_affinity_routes_have_keys():
+    config = ModelConfig(id="m", endpoints=URLS)
+    endpoints = [Endpoint(url, client=None) for url in URLS]
+
+    assert ModelRoute(config, endpoints).affinity_key(CONVERSATION) is None
+    assert affinity_route(URLS[:1]).affinity_key(CONVERSATION) is None
+    assert affinity_route().affinity_key(CONVERSATION) == prefix_key(CONVERSATION)
+
+
+def test_a_conversation_sticks_to_its_endpoint():
+    route = affinity_route()
+    key = route.affinity_key(CONVERSATION)
+
+    chosen = set()
+    for _ in range(5):
+        lease = route.acquire(key=key)
+        chosen.add(lease.endpoint.url)
+        lease.release()
+
+    assert chosen == {preferred(route, key)[0].url}
+
+
+def test_load_on_the_preferred_endpoint_is_bounded():
+    route = affinity_route()
+    key = route.affinity_key(CONVERSATION)
+    first, second, _ = preferred(route, key)
+
+    leases = [route.acquire(key=key) for _ in range(30)]
+
+    loads = {endpoint.url: endpoint.inflight for endpoint in route.endpoints}
+    assert max(loads.values()) <= math.ceil(1.25 * 30 / len(URLS))
+    assert loads[first.url] == max(loads.values())
+    # Overflow spills to the next endpoint on the ring before the last one
+    assert loads[second.url] >= loads[next(url for url in URLS if url not in (first.url, second.url))]
+    for lease in leases:
+        lease.release()
+    assert all(endpoint.inflight == 0 for endpoint in route.endpoints)
+
+
+def test_a_full_endpoint_spills_to_the_next_on_the_ring():
+    route = affinity_route(max_concurrency=1)
+    key = route.affinity_key(CONVERSATION)
+    first, second, third = preferred(route, key)
+
+    leases = [route.acquire(key=key) for _ in range(3)]
+
+    assert [lease.endpoint.url for lease in leases] == [first.url, second.url, third.url]
+    with pytest.raises(ModelOverloadedError):
+        route.acquire(key=key)
+
+
+def test_an_unhealthy_endpoint_is_skipped():
+    route = affinity_route()
+    key = route.affinity_key(CONVERSATION)
+    first, second, _ = preferred(route, key)
+
+    lease = route.acquire(is_healthy=lambda url: url != first.url, key=key)
+
+    assert lease.endpoint.url == second.url
+
+
+def test_adding_an_endpoint_only_moves_keys_to_it():
+    before = affinity_route()
+    after = affinity_route(URLS + ["http://d:7860"])
+
+    moved = 0
+    for i in range(200):
+        key = prefix_key([{"role": "user", "content": f"conversation {i}"}])
+        old, new = preferred(before, key)[0].url, preferred(after, key)[0].url
+        if old != new:
+            assert new == "http://d:7860"
+            moved += 1
+    assert 0 < moved < 200
@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+from bharatgen_openai.models import ChatCompletionRequest
+from bharatgen_openai.server import app as app_module
+from bharatgen_openai.server.shadow import Outcome, ShadowMirror
+from bharatgen_openai.tracing import RequestTrace
+
+
+class RecordingBackend:
+    """Shadow backend that notes when it was called and answers nothing."""
+
+    name = "recording"
+    base_url = "http://shadow"
+
+    def __init__(self):
+        self.called = threading.Event()
+
+    def create(self, **kwargs):
+        self.called.set()
+        return iter(())
+
+
+def test_shadow_is_sent_before_the_primary_finishes(monkeypatch):
+    backend = RecordingBackend()
+    mirror = ShadowMirror(backend, sample_rate=1.0)
+    seen_by_primary = []
+
+    def create(**kwargs):
+        # The shadow is already on its way while the primary runs
+        seen_by_primary.append(backend.called.wait(5))
+        return "primary answer"
+
+    lease = SimpleNamespace(client=SimpleNamespace(create=create), endpoint=SimpleNamespace(url="http://primary"))
+
+    async def acquire_waiting(*args, **kwargs):
+        return lease
+
+    route = SimpleNamespace(
+        config=SimpleNamespace(id="m", defaults={"temperature": 0.2}),
+        acquire_waiting=acquire_waiting,
+        affinity_key=lambda messages: None,
+    )
+    monkeypatch.setattr(app_module, "shadow", mirror)
+    monkeypatch.setattr(app_module, "registry", SimpleNamespace(get=lambda model: route))
+    request = ChatCompletionRequest(model="m", messages=[{"role": "user", "content": "hi"}])
+
+    _, response = asyncio.run(
+        app_module.open_completion("sk-test", request, RequestTrace(), check_rate_limit=False)
+    )
+
+    assert response == "primary answer"
+    assert seen_by_primary == [True]
+    mirror.close()
+
+
+def test_failed_primary_is_paired_with_its_shadow():
+    backend = RecordingBackend()
+    mirror = ShadowMirror(backend, sample_rate=1.0)
+    key = object()
+    assert mirror.mirror(key, "m", [], {})
+    mirror.record_primary(key, Outcome(latency=0.1, ttft=None, completion_tokens=0, failed=True))
+
+    deadline = time.monotonic() + 5
+    while not mirror.report()["models"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    model = mirror.report()["models"]["m"]
+    assert model["samples"] == 1
+    assert model["primary_errors"] == 1
+    mirror.close()
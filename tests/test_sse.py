@@ -0,0 +1,42 @@
+import json
+
+import pytest
+import requests
+
+from bharatgen_openai.parser import GradioResponseParser
+from bharatgen_openai.sse import SSEDecoder, iter_sse_events
+
+
+def gradio_frame(text: str, event: str = "generating") -> str:
+    data = [[{"role": "user", "content": "hi"}, {"role": "assistant", "content": [{"type": "text", "text": text}]}], ""]
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+ANSWER = ["नमस्ते", "नमस्ते! Hello", "नमस्ते! Hello there."]
+
+
+def test_decoder_keeps_characters_split_across_reads():
+    raw = "data: नमस्ते\n\n".encode()
+    decoder = SSEDecoder()
+    events = [event for i in range(len(raw)) for event in decoder.feed(raw[i:i + 1])]
+    assert [event.data for event in events] == ["नमस्ते"]
+
+
+@pytest.mark.parametrize("encoding", [None, "gzip"])
+def test_iter_sse_events_decodes_content_encoding(stand_in, encoding):
+    frames = [f"event: generating\ndata: {i}\n\n" for i in range(50)]
+    stand_in.routes["/stream"] = lambda handler: handler.send_sse(frames, encoding=encoding)
+
+    response = requests.get(f"{stand_in.url}/stream", stream=True, timeout=5)
+    assert response.headers.get("content-encoding") == encoding
+    assert [event.data for event in iter_sse_events(response)] == [str(i) for i in range(50)]
+
+
+@pytest.mark.parametrize("encoding", [None, "gzip"])
+def test_gradio_stream_parses_with_content_encoding(stand_in, encoding):
+    frames = [gradio_frame(text) for text in ANSWER[:-1]] + [gradio_frame(ANSWER[-1], event="complete")]
+    stand_in.routes["/call"] = lambda handler: handler.send_sse(frames, encoding=encoding, delay=0.01)
+
+    response = requests.get(f"{stand_in.url}/call", stream=True, timeout=5)
+    deltas = list(GradioResponseParser().parse_streaming_response(response))
+    assert "".join(deltas) == ANSWER[-1]
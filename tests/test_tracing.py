@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from bharatgen_openai.tracing import JSONLSpanExporter, OTLPSpanExporter, RequestTrace
+
+
+@pytest.mark.parametrize("header", ["abc-123", "trace.7_B", "x" * 128])
+def test_valid_request_ids_are_kept(header):
+    assert RequestTrace(request_id=header).request_id == header
+
+
+@pytest.mark.parametrize("header", ["", "x" * 129, "a b", "id\r\nset-cookie: x", "ïd", "../../etc"])
+def test_invalid_request_ids_are_replaced(header):
+    request_id = RequestTrace(request_id=header).request_id
+    assert request_id != header
+    assert request_id.startswith("req-")
+
+
+def test_jsonl_exporter_writes_queued_traces_on_close(tmp_path):
+    path = tmp_path / "traces.jsonl"
+    exporter = JSONLSpanExporter(str(path))
+    for _ in range(5):
+        RequestTrace(exporter=exporter).finish()
+    exporter.close()
+
+    assert len(path.read_text().splitlines()) == 5
+
+
+def test_otlp_exporter_sends_queued_traces_on_close(stand_in):
+    stand_in.routes["/v1/traces"] = lambda handler: handler.send_json({})
+    exporter = OTLPSpanExporter(f"{stand_in.url}/v1/traces", batch_size=2)
+    for _ in range(5):
+        RequestTrace(exporter=exporter).finish()
+    exporter.close()
+
+    spans = [
+        span
+        for _, _, body in stand_in.requests
+        for resource in body["resourceSpans"]
+        for scope in resource["scopeSpans"]
+        for span in scope["spans"]
+    ]
+    assert len(spans) == 5
+
+
+def test_exporters_start_no_thread_until_started(tmp_path, stand_in):
+    # The server forks parse pool workers after import, before it starts them
+    before = {thread.ident for thread in threading.enumerate()}
+    exporters = [JSONLSpanExporter(str(tmp_path / "traces.jsonl")), OTLPSpanExporter(f"{stand_in.url}/v1/traces")]
+    assert {thread.ident for thread in threading.enumerate()} == before
+
+    for exporter in exporters:
+        exporter.start()
+        exporter.start()
+    assert len({thread.ident for thread in threading.enumerate()} - before) == 2
+    for exporter in exporters:
+        exporter.close()
@@ -0,0 +1,219 @@
+import json
+import queue
+import time
+
+import pytest
+
+from bharatgen_openai.backends import create_session
+from bharatgen_openai.parser import GradioResponseParser
+from bharatgen_openai.transport import (
+    Estimation,
+    GradioQueueTransport,
+    QueueJob,
+    UpstreamError,
+    UpstreamTimeoutError,
+    apply_diff,
+)
+
+
+def chat(answer: str) -> list:
+    return [[{"role": "user", "content": "hi"}, {"role": "assistant", "content": [{"type": "text", "text": answer}]}], ""]
+
+
+def text(data: list) -> str:
+    return data[0][1]["content"][0]["text"]
+
+
+def test_apply_diff_edits():
+    value = {"items": [1, 2], "text": "ab"}
+    value = apply_diff(
+        value,
+        [
+            ["append", ["text"], "cd"],
+            ["add", ["items", 1], 9],
+            ["delete", ["items", 0], None],
+            ["replace", ["new"], True],
+        ],
+    )
+    assert value == {"items": [9, 2], "text": "abcd", "new": True}
+    assert apply_diff("ab", [["append", [], "c"]]) == "abc"
+    assert apply_diff("ab", [["replace", [], "x"]]) == "x"
+    with pytest.raises(ValueError):
+        apply_diff({}, [["move", ["a"], 1]])
+
+
+def job_with(messages: list) -> QueueJob:
+    inbox = queue.Queue()
+    for message in messages:
+        inbox.put((message, 10))
+    return QueueJob("e1", inbox)
+
+
+def test_queue_job_rebuilds_output_from_diffs():
+    job = job_with([
+        {"msg": "estimation", "rank": 1, "queue_size": 2, "rank_eta": 3.0},
+        {"msg": "process_generating", "output": {"data": chat("नम")}},
+        {"msg": "process_generating", "output": {"data": [[["append", [1, "content", 0, "text"], "स्ते"]], []]}},
+        {"msg": "process_completed", "success": True, "output": {"data": chat("नमस्ते!")}},
+    ])
+
+    # Output is edited in place, so read each step as it comes
+    items = [item if isinstance(item, Estimation) else text(item) for item in job.iter_data(estimations=True)]
+
+    assert items == [Estimation(1, 2, 3.0), "नम", "नमस्ते", "नमस्ते!"]
+    assert job.bytes_received == 40
+
+
+@pytest.mark.parametrize(
+    "message, error",
+    [
+        ({"msg": "process_completed", "success": False, "output": {"error": "CUDA out of memory"}}, UpstreamError),
+        ({"msg": "unexpected_error", "message": "Queue stream failed", "timeout": True}, UpstreamTimeoutError),
+    ],
+)
+def test_queue_job_raises_upstream_failures(message, error):
+    job = job_with([{"msg": "process_generating", "output": {"data": chat("a")}}, message])
+    with pytest.raises(error):
+        list(job.iter_data())
+
+
+def sse(*messages) -> list:
+    return [f"data: {json.dumps(message)}\n\n" for message in messages]
+
+
+def transport_for(stand_in, **options) -> GradioQueueTransport:
+    return GradioQueueTransport(f"{stand_in.url}/gradio_api", create_session(), fn_index=0, **options)
+
+
+def data_streams(stand_in) -> int:
+    return sum(1 for _, path, _ in stand_in.requests if path.startswith("/gradio_api/queue/data"))
+
+
+def test_jobs_are_demultiplexed_from_the_shared_stream(stand_in):
+    transport = transport_for(stand_in)
+    event_ids = iter(["e1", "e2"])
+    stand_in.routes["/gradio_api/queue/join"] = lambda handler: handler.send_json({"event_id": next(event_ids)})
+    stand_in.routes["/gradio_api/queue/data"] = lambda handler: handler.send_sse(
+        sse(
+            {"msg": "process_generating", "event_id": "e2", "output": {"data": chat("two")}},
+            {"msg": "heartbeat"},
+            {"msg": "process_completed", "event_id": "e1", "success": True, "output": {"data": chat("one")}},
+            {"msg": "process_completed", "event_id": "e2", "success": True, "output": {"data": chat("two!")}},
+            {"msg": "close_stream"},
+        ),
+        delay=0.05,
+    )
+
+    first, second = transport.submit(["a"]), transport.submit(["b"])
+
+    assert [text(data) for data in first.iter_data()] == ["one"]
+    assert [text(data) for data in second.iter_data()] == ["two", "two!"]
+    assert transport._inflight == 0
+    assert transport._jobs == {}
+
+
+def test_completion_before_join_returns_is_kept(stand_in):
+    transport = transport_for(stand_in)
+
+    def join(handler):
+        # The shared stream delivers the whole job before /queue/join answers
+        transport._dispatch({"msg": "process_generating", "event_id": "e1", "output": {"data": chat("a")}})
+        transport._dispatch({"msg": "process_completed", "event_id": "e1", "success": True, "output": {"data": chat("ab")}})
+        handler.send_json({"event_id": "e1"})
+
+    stand_in.routes["/gradio_api/queue/join"] = join
+    stand_in.routes["/gradio_api/queue/data"] = lambda handler: handler.send_sse(sse({"msg": "close_stream"}))
+
+    job = transport.submit(["a"])
+
+    assert [text(data) for data in job.iter_data()] == ["a", "ab"]
+    assert (transport._inflight, transport._jobs, transport._completed, transport._claimed) == (0, {}, set(), set())
+
+
+def test_stale_job_times_out_without_busy_looping(stand_in):
+    transport = transport_for(stand_in, job_timeout=0.5)
+    stand_in.routes["/gradio_api/queue/join"] = lambda handler: handler.send_json({"event_id": "e1"})
+    # Gradio keeps closing the stream and the job's completion never comes
+    stand_in.routes["/gradio_api/queue/data"] = lambda handler: handler.send_sse(sse({"msg": "close_stream"}))
+
+    job = transport.submit(["a"])
+    start = time.monotonic()
+    with pytest.raises(UpstreamTimeoutError, match="didn't finish in time"):
+        list(job.iter_data())
+
+    assert time.monotonic() - start < 3
+    assert data_streams(stand_in) < 15  # Backed off instead of reopening in a tight loop
+    assert transport._inflight == 0
+
+    # A late completion of the forgotten job doesn't count twice
+    transport._dispatch({"msg": "process_completed", "event_id": "e1", "success": True, "output": {}})
+    assert transport._inflight == 0
+    assert transport._forgotten == set()
+
+
+def wait_for_cancel(stand_in, timeout: float = 5.0) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        for _, path, body in stand_in.requests:
+            if path == "/gradio_api/cancel":
+                return body
+        time.sleep(0.01)
+    raise AssertionError("No cancel request")
+
+
+def serve_endless_job(stand_in):
+    stand_in.routes["/gradio_api/queue/join"] = lambda handler: handler.send_json({"event_id": "e1"})
+    stand_in.routes["/gradio_api/cancel"] = lambda handler: handler.send_json({"success": True})
+    # The job keeps generating; its completion never comes within the test
+    stand_in.routes["/gradio_api/queue/data"] = lambda handler: handler.send_sse(
+        sse(*({"msg": "process_generating", "event_id": "e1", "output": {"data": chat("x" * i)}} for i in range(1, 50))),
+        delay=0.05,
+    )
+
+
+def test_abandoned_job_is_cancelled_upstream(stand_in):
+    serve_endless_job(stand_in)
+    transport = transport_for(stand_in)
+
+    job = transport.submit(["a"])
+    items = job.iter_data()
+    assert text(next(items)) == "x"
+    items.close()
+    job.close()
+
+    assert wait_for_cancel(stand_in) == {"session_hash": transport.session_hash, "fn_index": 0, "event_id": "e1"}
+    assert (transport._inflight, transport._jobs, transport._claimed) == (0, {}, set())
+    # Its later messages are dropped, and its completion doesn't count twice
+    transport._dispatch({"msg": "process_completed", "event_id": "e1", "success": True, "output": {}})
+    assert (transport._inflight, transport._jobs, transport._forgotten) == (0, {}, set())
+
+    job.close()  # Closing again doesn't cancel again
+    time.sleep(0.1)
+    assert sum(1 for _, path, _ in stand_in.requests if path == "/gradio_api/cancel") == 1
+
+
+def test_finished_job_is_not_cancelled(stand_in):
+    stand_in.routes["/gradio_api/queue/join"] = lambda handler: handler.send_json({"event_id": "e1"})
+    stand_in.routes["/gradio_api/queue/data"] = lambda handler: handler.send_sse(
+        sse({"msg": "process_completed", "event_id": "e1", "success": True, "output": {"data": chat("a")}})
+    )
+    transport = transport_for(stand_in)
+
+    job = transport.submit(["a"])
+    list(job.iter_data())
+    job.close()
+
+    time.sleep(0.1)
+    assert all(path != "/gradio_api/cancel" for _, path, _ in stand_in.requests)
+
+
+def test_parser_cancels_the_job_when_the_reader_stops_early(stand_in):
+    serve_endless_job(stand_in)
+    transport = transport_for(stand_in)
+
+    deltas = GradioResponseParser().parse_streaming_response(transport.submit(["a"]))
+    assert next(deltas) == "x"
+    deltas.close()  # E.g. the thinking budget ran out or the client went away
+
+    assert wait_for_cancel(stand_in)["event_id"] == "e1"
+    assert transport._inflight == 0
@@ -0,0 +1,17 @@
+from bharatgen_openai.server.usage import UsageLedger
+
+
+def test_ledger_opens_its_store_on_start(tmp_path):
+    path = tmp_path / "usage.db"
+    ledger = UsageLedger(str(path))
+    assert not path.exists()
+
+    ledger.start()
+    assert path.exists()
+    ledger.record("key_a", "param-17b", prompt_tokens=3, completion_tokens=5, latency=0.2)
+    ledger.close()
+
+    reopened = UsageLedger(str(path))
+    [row] = reopened.query()
+    assert (row["key_id"], row["requests"], row["total_tokens"]) == ("key_a", 1, 8)
+    reopened.close()